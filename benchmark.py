@@ -0,0 +1,286 @@
+"""
+Throughput benchmarks for the pdf_engine operations.
+
+Generates a synthetic corpus of PDFs and images, runs every operation
+headlessly in a fresh interpreter (so peak RSS is per operation) and
+prints wall time, pages/sec, MB/sec and peak RSS as JSON. The cold
+import time of pdf_engine is reported alongside as import_pdf_engine. Runs can be
+saved as a baseline and later runs compared against it:
+
+    python benchmark.py --files 20 --pages 10 --save-baseline baseline.json
+    python benchmark.py --files 20 --pages 10 --baseline baseline.json
+
+Comparing exits with status 1 when any operation is slower than the
+baseline by more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import pdf_backend
+import pdf_engine
+
+
+# =========================
+# Synthetic Corpus
+# =========================
+def generate_corpus(directory, files=10, pages=10, page_size=pdf_engine.A4_SIZE,
+                    images_per_page=1, image_size=(600, 800), image_files=5, seed=0):
+    """Write synthetic PDFs and images to ``directory`` and describe them in corpus.json."""
+    fitz = pdf_backend.pymupdf()
+    from PIL import Image
+
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    def noise_image(size):
+        # Random pixels do not compress, so images behave like dense scans
+        return Image.frombytes("RGB", size, rng.randbytes(size[0] * size[1] * 3))
+
+    image_paths = []
+    for n in range(image_files):
+        path = os.path.join(directory, f"image_{n:03d}.jpg")
+        noise_image(image_size).save(path, quality=90)
+        image_paths.append(path)
+
+    pdf_paths = []
+    for n in range(files):
+        doc = fitz.open()
+        for page_number in range(pages):
+            page = doc.new_page(width=page_size[0], height=page_size[1])
+            page.insert_text((72, 72), f"Synthetic document {n}, page {page_number + 1}", fontsize=14)
+            for i in range(images_per_page if image_paths else 0):
+                image = image_paths[(n + page_number + i) % len(image_paths)]
+                top = 100 + i * 40
+                page.insert_image(fitz.Rect(72, top, page_size[0] - 72, min(top + 300, page_size[1] - 72)),
+                                  filename=image)
+        path = os.path.join(directory, f"document_{n:03d}.pdf")
+        doc.save(path)
+        doc.close()
+        pdf_paths.append(path)
+
+    corpus = {"pdfs": pdf_paths, "images": image_paths, "pages_per_pdf": pages}
+    with open(os.path.join(directory, "corpus.json"), "w") as f:
+        json.dump(corpus, f, indent=2)
+    return corpus
+
+
+# =========================
+# Operations
+# =========================
+# Each operation runs against the corpus and returns the number of pages
+# and input bytes it processed.
+def _size(paths):
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def bench_merge_files(corpus, out_dir):
+    inputs = corpus["pdfs"] + corpus["images"]
+    pdf_engine.merge_files(inputs, os.path.join(out_dir, "merged.pdf"))
+    return len(corpus["pdfs"]) * corpus["pages_per_pdf"] + len(corpus["images"]), _size(inputs)
+
+
+def bench_merge_files_streaming(corpus, out_dir):
+    inputs = corpus["pdfs"] + corpus["images"]
+    pdf_engine.merge_files(inputs, os.path.join(out_dir, "merged.pdf"), streaming=True)
+    return len(corpus["pdfs"]) * corpus["pages_per_pdf"] + len(corpus["images"]), _size(inputs)
+
+
+def bench_merge_pdfs(corpus, out_dir):
+    pdf_engine.merge_pdfs(corpus["pdfs"], os.path.join(out_dir, "merged.pdf"))
+    return len(corpus["pdfs"]) * corpus["pages_per_pdf"], _size(corpus["pdfs"])
+
+
+def bench_image_to_pdf_page(corpus, out_dir):
+    width, height = pdf_engine.get_target_dimensions()
+    for n, image in enumerate(corpus["images"]):
+        pdf_engine.image_to_pdf_page_high_quality(image, width, height, os.path.join(out_dir, f"{n}.pdf"))
+    return len(corpus["images"]), _size(corpus["images"])
+
+
+def _per_pdf(operation):
+    def bench(corpus, out_dir):
+        for n, pdf in enumerate(corpus["pdfs"]):
+            operation(pdf, os.path.join(out_dir, f"{n}.pdf"))
+        return len(corpus["pdfs"]) * corpus["pages_per_pdf"], _size(corpus["pdfs"])
+    return bench
+
+
+OPERATIONS = {
+    "merge_files": bench_merge_files,
+    "merge_files_streaming": bench_merge_files_streaming,
+    "merge_pdfs": bench_merge_pdfs,
+    "image_to_pdf_page": bench_image_to_pdf_page,
+    "resize_pdf": _per_pdf(lambda src, dst: pdf_engine.resize_pdf(src, dst, pdf_engine.A4_SIZE)),
+    "trim_whitespace": _per_pdf(pdf_engine.trim_whitespace),
+    "rotate_pdf": _per_pdf(lambda src, dst: pdf_engine.rotate_pdf(src, dst, 90)),
+    "remove_and_resize_pages": _per_pdf(
+        lambda src, dst: pdf_engine.remove_and_resize_pages(src, dst, [0, 1], pdf_engine.A4_SIZE)
+    ),
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss survives fork/exec on Linux, so a child would report at
+    # least its parent's peak; VmHWM belongs to this process image alone.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_operation(name, corpus_dir):
+    """Run one operation in this process and return its measurements."""
+    with open(os.path.join(corpus_dir, "corpus.json")) as f:
+        corpus = json.load(f)
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        pages, input_bytes = OPERATIONS[name](corpus, out_dir)
+        wall = time.perf_counter() - start
+    return {
+        "wall_seconds": round(wall, 4),
+        "pages": pages,
+        "input_mb": round(input_bytes / (1024 * 1024), 3),
+        "pages_per_sec": round(pages / wall, 2) if wall else None,
+        "mb_per_sec": round(input_bytes / (1024 * 1024) / wall, 3) if wall else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_isolated(name, corpus_dir):
+    """Run one operation in a fresh interpreter so peak RSS is its own."""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-operation", name, "--corpus", corpus_dir],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+sys.path.insert(0, {here!r})
+from benchmark import peak_rss_mb
+print(json.dumps({{"wall_seconds": round(seconds, 4), "peak_rss_mb": round(peak_rss_mb(), 1)}}))
+"""
+
+
+def measure_import(module, repeats=5):
+    """Best-of-``repeats`` cold import time and resulting RSS of ``module``."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeats):
+        completed = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE.format(module=module, here=here)],
+            capture_output=True, text=True, cwd=here, check=True,
+        )
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return min(runs, key=lambda run: run["wall_seconds"])
+
+
+# =========================
+# Baseline Comparison
+# =========================
+def compare(results, baseline, tolerance):
+    """Return ``{operation: wall-time ratio}`` and the operations that regressed."""
+    ratios = {}
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "wall_seconds" not in result or not before.get("wall_seconds"):
+            continue
+        ratio = result["wall_seconds"] / before["wall_seconds"]
+        ratios[name] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return ratios, regressions
+
+
+# =========================
+# Command Line Interface
+# =========================
+def _size_arg(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF engine on a synthetic corpus.")
+    parser.add_argument("--corpus", help="Corpus directory (generated into a temp dir if omitted).")
+    parser.add_argument("--files", type=int, default=10, help="Number of synthetic PDFs.")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per synthetic PDF.")
+    parser.add_argument("--page-size", type=_size_arg, default=pdf_engine.A4_SIZE, help="Page size in points, e.g. 595x842.")
+    parser.add_argument("--images-per-page", type=int, default=1, help="Images placed on each PDF page.")
+    parser.add_argument("--image-size", type=_size_arg, default=(600, 800), help="Image size in pixels, e.g. 600x800.")
+    parser.add_argument("--image-files", type=int, default=5, help="Standalone images merged alongside the PDFs.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--operations", nargs="+", choices=sorted(OPERATIONS), default=sorted(OPERATIONS))
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    parser.add_argument("--save-baseline", help="Also save the report as a baseline file.")
+    parser.add_argument("--baseline", help="Compare against a saved baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging, e.g. 0.15.")
+    parser.add_argument("--run-operation", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.run_operation:
+        print(json.dumps(run_operation(args.run_operation, args.corpus)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        corpus_dir = args.corpus or os.path.join(tmpdir, "corpus")
+        if not os.path.exists(os.path.join(corpus_dir, "corpus.json")):
+            generate_corpus(corpus_dir, args.files, args.pages, args.page_size,
+                            args.images_per_page, args.image_size, args.image_files, args.seed)
+
+        report = {
+            "corpus": {
+                "files": args.files, "pages": args.pages, "page_size": list(args.page_size),
+                "images_per_page": args.images_per_page, "image_size": list(args.image_size),
+                "image_files": args.image_files, "seed": args.seed,
+            },
+            "python": sys.version.split()[0],
+            "results": {name: run_isolated(name, corpus_dir) for name in args.operations},
+        }
+        report["results"]["import_pdf_engine"] = measure_import("pdf_engine")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline_ratio"], regressions = compare(report["results"], baseline, args.tolerance)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text + "\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
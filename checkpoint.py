@@ -0,0 +1,122 @@
+"""
+Checkpoint manifests that let an interrupted batch resume where it stopped.
+
+A Checkpoint records every finished job as one JSON line: the output, the
+operation and its parameters, and for each input its size, modification
+time and SHA-256. Re-running the same jobs with the same manifest skips
+those whose inputs still hash the same and whose output is still there
+with the size it was written with; only changed, new or missing work is
+done again. Inputs whose size and modification time are unchanged are not
+re-hashed, so checking a finished job costs one stat() per file.
+
+Lines are fsynced as they are written and a torn last line (from a crash
+mid-write) is ignored, so the manifest survives the crash it exists for.
+"""
+import json
+import os
+import threading
+import time
+
+from conversion_cache import file_digest
+from pdf_engine import atomic_output
+
+# Name used for a checkpoint kept inside a batch's output folder
+CHECKPOINT_NAME = ".pdf-batch-checkpoint.jsonl"
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.entries[record["output"]] = record
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn final line from a crash
+        self.compact()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _unchanged(self, recorded):
+        """Tell whether an input still has the content recorded for it."""
+        stat = self._stat(recorded["path"])
+        if stat is None:
+            return False
+        if stat == (recorded["size"], recorded["mtime_ns"]):
+            return True
+        # Touched or copied over: only a different content counts as a change
+        return stat[0] == recorded["size"] and file_digest(recorded["path"]) == recorded["sha256"]
+
+    def is_done(self, inputs, output, params):
+        """Tell whether ``output`` was made from exactly these ``inputs`` with ``params``."""
+        if not all(isinstance(path, (str, os.PathLike)) for path in (*inputs, output)):
+            return False
+        record = self.entries.get(os.path.abspath(output))
+        if record is None or record["params"] != params:
+            return False
+        if [entry["path"] for entry in record["inputs"]] != [os.path.abspath(path) for path in inputs]:
+            return False
+        if self._stat(output) is None or self._stat(output)[0] != record["output_size"]:
+            return False
+        return all(self._unchanged(entry) for entry in record["inputs"])
+
+    def snapshot(self, inputs):
+        """
+        Return the stat of every input, taken before a job reads them.
+
+        record() compares it with the stat after hashing, so a file that
+        changes while it is processed is not recorded as done. Returns None
+        when an input is not a file on disk and cannot be checkpointed.
+        """
+        if not all(isinstance(path, (str, os.PathLike)) for path in inputs):
+            return None
+        return [(os.path.abspath(path), self._stat(path)) for path in inputs]
+
+    def record(self, snapshot, output, params):
+        """Record ``output`` as done from the inputs in ``snapshot``; see snapshot()."""
+        if snapshot is None or not isinstance(output, (str, os.PathLike)):
+            return
+        inputs = []
+        for path, stat in snapshot:
+            if stat is None:
+                return
+            digest = file_digest(path)
+            if self._stat(path) != stat:
+                return
+            inputs.append({"path": path, "size": stat[0], "mtime_ns": stat[1], "sha256": digest})
+        output_stat = self._stat(output)
+        if output_stat is None:
+            return
+        record = {"output": os.path.abspath(output), "output_size": output_stat[0], "params": params,
+                  "inputs": inputs, "time": round(time.time(), 3)}
+        with self._lock:
+            self.entries[record["output"]] = record
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def compact(self):
+        """Rewrite the manifest with only the latest line per output."""
+        with atomic_output(self.path) as f:
+            for record in self.entries.values():
+                f.write((json.dumps(record) + "\n").encode("utf-8"))
+
+    def close(self):
+        self._file.close()
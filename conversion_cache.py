@@ -0,0 +1,122 @@
+"""
+On-disk cache for converted single-page PDFs.
+
+Entries are keyed by a SHA-256 of the source file's content plus the
+conversion parameters, so the same logo, cover image or template ODT is
+only converted once no matter what it is called or where it lives. The
+cache directory is kept under a byte limit by evicting the least recently
+used entries; a hit refreshes an entry's modification time.
+"""
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Hash a file's content; ``path`` may also be a bytes-like object or binary file."""
+    digest = hashlib.sha256()
+    if isinstance(path, (str, os.PathLike)):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    elif hasattr(path, "read") and not isinstance(path, mmap.mmap):
+        position = path.tell()
+        path.seek(0)
+        for chunk in iter(lambda: path.read(chunk_size), b""):
+            digest.update(chunk)
+        path.seek(position)
+    else:
+        digest.update(path)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path, _ in self._entries())
+
+    def _entries(self):
+        """Yield ``(path, mtime)`` for every cached entry."""
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".pdf"):
+                    yield entry.path, entry.stat().st_mtime
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pdf")
+
+    def key(self, source_path, kind, **params):
+        """Build the cache key for converting ``source_path`` with ``params``."""
+        payload = json.dumps([kind, file_digest(source_path), params], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """Return the cached bytes for ``key``, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Store ``data`` under ``key`` and evict old entries if over the limit."""
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get_or_create(self, key, create):
+        """Return cached bytes for ``key``, calling ``create()`` on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = create()
+            self.put(key, data)
+        return data
+
+    def _evict(self):
+        for path, _ in sorted(self._entries(), key=lambda entry: entry[1]):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,207 @@
+"""
+Background jobs and shared widgets for the Tk front ends.
+
+Long operations run on a background executor instead of inside button
+callbacks, so the window keeps redrawing. The worker never touches Tk: it
+pushes progress onto a queue that the Tk side drains with ``after``. A
+Cancel button sets an event that the engine checks between files; engine
+outputs are written atomically, so cancelling never leaves a half-written
+file.
+"""
+import os
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox, ttk
+
+from pdf_engine import JobCancelled, page_offsets, validate_inputs
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-job")
+    return _executor
+
+
+def run_in_background(parent, title, job, on_complete, cancellable=True):
+    """
+    Run ``job(progress, cancel)`` in the background with a progress window.
+
+    ``job`` receives a ``progress(done, total, item)`` callback and a
+    threading.Event to honour for cancellation. ``on_complete`` is called
+    on the Tk thread with the job's return value.
+    """
+    updates = queue.Queue()
+    cancel = threading.Event()
+
+    window = tk.Toplevel(parent)
+    window.title(title)
+    window.transient(parent)
+    status = tk.Label(window, text="Waiting for the previous job...", width=60, anchor="w")
+    status.pack(padx=10, pady=(10, 5))
+    bar = ttk.Progressbar(window, length=400, mode="indeterminate")
+    bar.pack(padx=10, pady=5)
+    bar.start(10)
+
+    def request_cancel():
+        cancel.set()
+        status.config(text="Cancelling...")
+        cancel_button.config(state=tk.DISABLED)
+
+    cancel_button = tk.Button(window, text="Cancel", command=request_cancel,
+                              state=tk.NORMAL if cancellable else tk.DISABLED)
+    cancel_button.pack(padx=10, pady=(5, 10))
+    window.protocol("WM_DELETE_WINDOW", request_cancel if cancellable else lambda: None)
+
+    def progress(done, total, item):
+        updates.put(("progress", done, total, item))
+
+    def work():
+        updates.put(("started",))
+        try:
+            updates.put(("done", job(progress, cancel)))
+        except JobCancelled:
+            updates.put(("cancelled",))
+        except Exception as e:
+            updates.put(("error", e))
+
+    def poll():
+        while True:
+            try:
+                kind, *payload = updates.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "started":
+                status.config(text="Working...")
+                continue
+            if kind == "progress":
+                done, total, item = payload
+                name = os.path.basename(getattr(item, "input_file", item))
+                bar.stop()
+                bar.config(mode="determinate", maximum=max(total, 1), value=done)
+                if not cancel.is_set():
+                    status.config(text=f"{done}/{total}: {name}")
+                continue
+            window.destroy()
+            if kind == "done":
+                on_complete(payload[0])
+            elif kind == "cancelled":
+                messagebox.showinfo("Cancelled", f"{title} was cancelled. No output was written.")
+            else:
+                messagebox.showerror("Error", f"{title} failed: {payload[0]}")
+            return
+        window.after(100, poll)
+
+    _get_executor().submit(work)
+    poll()
+
+
+class InputList:
+    """
+    The ordered inputs of a merge window, shown in ``listbox``.
+
+    Files are checked in the background as they are added (see
+    pdf_engine.validate_inputs); each row then shows the file's page
+    count, page size and size, or its error in red, and ``summary`` (a
+    Label) shows the totals for the whole list.
+    """
+
+    def __init__(self, parent, listbox, summary):
+        self.parent = parent
+        self.listbox = listbox
+        self.summary = summary
+        self.files = []
+        self.index = {}
+
+    def _label(self, path):
+        info = self.index.get(path)
+        return info.describe() if info is not None else f"{os.path.basename(path)} - checking..."
+
+    def _draw(self, position):
+        path = self.files[position]
+        self.listbox.delete(position)
+        self.listbox.insert(position, self._label(path))
+        info = self.index.get(path)
+        if info is not None and not info.ok:
+            self.listbox.itemconfig(position, foreground="red")
+
+    def _update_summary(self):
+        infos = [self.index[path] for path in self.files if path in self.index]
+        _, pages = page_offsets(infos)
+        size = sum(info.file_size for info in infos) / (1024 * 1024)
+        text = f"{len(self.files)} files, {pages} pages, {size:.1f} MB"
+        invalid = sum(not info.ok for info in infos)
+        if invalid:
+            text += f" - {invalid} cannot be merged"
+        if len(infos) < len(self.files):
+            text += " - checking..."
+        self.summary.config(text=text)
+
+    def add(self, paths):
+        for path in paths:
+            self.files.append(path)
+            self.listbox.insert(tk.END, self._label(path))
+        unchecked = [path for path in dict.fromkeys(paths) if path not in self.index]
+        self._update_summary()
+        if not unchecked:
+            return
+
+        def checked(infos):
+            for info in infos:
+                self.index[info.source] = info
+            checked_paths = set(unchecked)
+            for position, path in enumerate(self.files):
+                if path in checked_paths:
+                    self._draw(position)
+            self._update_summary()
+
+        run_in_background(
+            self.parent,
+            "Checking files",
+            lambda progress, cancel: validate_inputs(
+                unchecked, progress=lambda done, total, info: progress(done, total, info.source), cancel=cancel
+            ),
+            checked,
+        )
+
+    def remove_selected(self):
+        for position in self.listbox.curselection()[::-1]:
+            self.listbox.delete(position)
+            del self.files[position]
+        self._update_summary()
+
+    def move(self, offset):
+        """Move the selected rows up (-1) or down (1)."""
+        selected = self.listbox.curselection()
+        for position in selected if offset < 0 else selected[::-1]:
+            target = position + offset
+            if 0 <= target < len(self.files):
+                self.files[position], self.files[target] = self.files[target], self.files[position]
+                self._draw(position)
+                self._draw(target)
+                self.listbox.select_set(target)
+
+    def problems(self):
+        """Return the InputInfo of every listed file that cannot be merged."""
+        return [self.index[path] for path in self.files if path in self.index and not self.index[path].ok]
+
+    def fully_checked(self):
+        return all(path in self.index for path in self.files)
+
+
+def show_batch_summary(results, action, output_folder):
+    cancelled = [r for r in results if isinstance(r.error, JobCancelled)]
+    failures = [r for r in results if not r.ok and not isinstance(r.error, JobCancelled)]
+    if failures:
+        details = "\n".join(f"{r.input_file}: {r.error}" for r in failures)
+        messagebox.showerror("Error", f"Failed to {action} {len(failures)} of {len(results)} files:\n{details}")
+    elif cancelled:
+        messagebox.showinfo("Cancelled", f"Cancelled after {len(results) - len(cancelled)} of {len(results)} files.")
+    else:
+        skipped = sum(r.skipped for r in results)
+        note = f" ({skipped} unchanged files were already done and skipped)" if skipped else ""
+        messagebox.showinfo("Success", f"All files have been {action}d and saved to {output_folder}{note}.")
@@ -0,0 +1,215 @@
+"""
+Everything a merge writes in one pass: the merged document and, optionally,
+an outline item per source, split parts and a JSON page map.
+
+Pages are handed over once per source as they are loaded, and the merged
+document, the parts and the page map are all built from those same page
+objects, so nothing is parsed twice and the result is never reopened.
+
+Parts are written next to the output as ``<name>_part001.pdf`` and so on.
+A part holds at most ``split_pages`` pages and, as far as
+StreamingPdfWriter.estimate_size can tell before writing them, at most
+``split_bytes`` bytes; a page larger than that on its own gets a part to
+itself. A source may be spread over several parts, and each part's outline
+has an item for every source it holds.
+
+Every file is written atomically. A merge that fails or is cancelled also
+removes the parts it had already finished.
+
+The page map gives 1-based output pages:
+
+    {"output": "pack.pdf", "page_count": 230,
+     "sources": [{"source": "a.pdf", "title": "a", "first_page": 1, "page_count": 120, "parts": [1, 2]}, ...],
+     "parts": [{"path": "pack_part001.pdf", "first_page": 1, "page_count": 100, "file_size": 4812233}, ...],
+     "failures": [{"source": "c.pdf", "error": "..."}]}
+"""
+import json
+import os
+from contextlib import ExitStack
+
+import pdf_backend
+from pdf_engine import PdfEngineError, atomic_output
+from streaming_writer import StreamingPdfWriter
+
+# Room kept free in a size-limited part for the outline item of the source being added
+_OUTLINE_ITEM_RESERVE = 256
+
+
+class MergeOutputs:
+    def __init__(self, output_file, streaming=False, optimize=False, outline=False, split_pages=None,
+                 split_bytes=None, page_map=None):
+        if (split_pages or split_bytes) and not pdf_backend.is_path(output_file):
+            raise PdfEngineError("Split parts are written next to the output, so it must be a path.")
+        self.output_file = output_file
+        self.streaming = streaming or optimize
+        self.optimize = optimize
+        self.outline = outline
+        self.split_pages = split_pages
+        self.split_bytes = split_bytes
+        self.page_map = page_map
+        self.writer = None
+        self.page_count = 0
+        self.sources = []
+        self.parts = []
+        self.failures = []
+        self._stack = ExitStack()
+        self._output = None
+        self._part = None
+        self._part_stack = None
+        self._finished_parts = []
+        self._seen = set()
+        self._pending = 0
+        self._closed = False
+
+    def __enter__(self):
+        self._output = self._stack.enter_context(atomic_output(self.output_file))
+        self.writer = StreamingPdfWriter(self._output, self.optimize) if self.streaming else pdf_backend.new_pdf()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._abort(exc_type, exc, tb)
+            return
+        try:
+            self.close()
+        except BaseException as e:
+            self._abort(type(e), e, e.__traceback__)
+            raise
+        self._stack.close()
+
+    def _abort(self, exc_type, exc, tb):
+        if self._part_stack is not None:
+            self._part_stack.__exit__(exc_type, exc, tb)
+        for path in self._finished_parts:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._stack.__exit__(exc_type, exc, tb)
+
+    def _title(self, source):
+        if pdf_backend.is_path(source):
+            return os.path.splitext(os.path.basename(os.fspath(source)))[0]
+        return f"Document {len(self.sources) + 1}"
+
+    def add(self, source, pages, reader=None):
+        """
+        Add one source's ``pages``, in order, to the merged document and its parts.
+
+        With a pypdf ``reader`` and a non-streaming merge, the source is
+        appended through the reader instead, keeping its own outline (under
+        the source's item), links and form fields, as merge_pdfs always has.
+        """
+        title = self._title(source)
+        first = self.page_count
+        outline = self.outline and len(pages) > 0
+        if self.streaming:
+            self.writer.add_pages(pages)
+            if outline:
+                self.writer.add_outline_item(title, first)
+        elif reader is not None:
+            self.writer.append(reader, outline_item=title if outline else None)
+        else:
+            for page in pages:
+                self.writer.add_page(page)
+            if outline:
+                self.writer.add_outline_item(title, first)
+        self.page_count += len(pages)
+        entry = {"source": os.fspath(source) if pdf_backend.is_path(source) else None, "title": title,
+                 "first_page": first + 1, "page_count": len(pages), "parts": []}
+        self.sources.append(entry)
+        if self.split_pages or self.split_bytes:
+            self._add_to_parts(pages, entry)
+
+    def fail(self, source, error):
+        """Record a source that was left out of the merge in the page map."""
+        self.failures.append({"source": os.fspath(source) if pdf_backend.is_path(source) else None,
+                              "error": str(error) or type(error).__name__})
+
+    # =========================
+    # Split Parts
+    # =========================
+    def _add_to_parts(self, pages, entry):
+        chunk = []
+        for page in pages:
+            if self._part is not None and self._part_is_full(len(chunk), page):
+                self._flush(chunk, entry)
+                chunk = []
+                self._finish_part()
+            if self._part is None:
+                self._start_part()
+                if self.split_bytes:
+                    self._pending = self._part.estimate_size([page], self._seen)
+            chunk.append(page)
+        self._flush(chunk, entry)
+
+    def _part_is_full(self, chunked, page):
+        """Tell whether ``page`` must start a new part, after ``chunked`` pages waiting to be added."""
+        pages = self.parts[-1]["page_count"] + chunked
+        if self.split_pages and pages >= self.split_pages:
+            return True
+        if self.split_bytes:
+            cost = self._part.estimate_size([page], self._seen)
+            reserve = self._part.closing_size() + (_OUTLINE_ITEM_RESERVE if self.outline else 0)
+            if pages and self._part.size + self._pending + cost + reserve > self.split_bytes:
+                return True
+            self._pending += cost
+        return False
+
+    def _flush(self, chunk, entry):
+        """Add the pages of one source waiting in ``chunk`` to the current part."""
+        if not chunk:
+            return
+        first = self._part.page_count
+        # One call per source, so objects its pages share are written once
+        self._part.add_pages(chunk)
+        if self.outline:
+            self._part.add_outline_item(entry["title"], first)
+        self.parts[-1]["page_count"] += len(chunk)
+        entry["parts"].append(len(self.parts))
+        self._seen = set()
+        self._pending = 0
+
+    def _start_part(self):
+        stem, extension = os.path.splitext(os.fspath(self.output_file))
+        path = f"{stem}_part{len(self.parts) + 1:03d}{extension or '.pdf'}"
+        self._part_stack = ExitStack()
+        self._part = StreamingPdfWriter(self._part_stack.enter_context(atomic_output(path)), self.optimize)
+        first_page = self.parts[-1]["first_page"] + self.parts[-1]["page_count"] if self.parts else 1
+        self.parts.append({"path": path, "first_page": first_page, "page_count": 0, "file_size": 0})
+        self._seen = set()
+        self._pending = 0
+
+    def _finish_part(self):
+        self._part.close()
+        self.parts[-1]["file_size"] = self._part.size
+        self._part_stack.close()
+        self._finished_parts.append(self.parts[-1]["path"])
+        self._part = self._part_stack = None
+
+    # =========================
+    # Closing
+    # =========================
+    def close(self):
+        """Finish every output; they are moved into place when the ``with`` block ends."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._part is not None:
+            self._finish_part()
+        if self.streaming:
+            self.writer.close()
+        else:
+            if self.outline and self.page_count:
+                self.writer.page_mode = "/UseOutlines"
+            self.writer.write(self._output)
+        if self.page_map is not None:
+            page_map = {
+                "output": os.fspath(self.output_file) if pdf_backend.is_path(self.output_file) else None,
+                "page_count": self.page_count,
+                "sources": self.sources,
+                "parts": self.parts,
+                "failures": self.failures,
+            }
+            map_file = self._stack.enter_context(atomic_output(self.page_map))
+            map_file.write((json.dumps(page_map, indent=2) + "\n").encode("utf-8"))
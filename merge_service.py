@@ -0,0 +1,541 @@
+"""
+Local HTTP service for the engine operations.
+
+Other programs on the machine can merge, resize, rotate, trim and cut PDFs
+over HTTP instead of driving a GUI. The server is plain asyncio (no
+dependencies); the PDF work itself runs on a process pool, so a large job
+never stalls other requests.
+
+    POST   /jobs/<operation>     start a job; returns 202 and the job as JSON
+    POST   /jobs/<operation>?wait=1
+                                 run the job and stream the PDF back
+    GET    /jobs/<id>            job status and progress as JSON
+    GET    /jobs/<id>/result     stream the finished PDF
+    DELETE /jobs/<id>            cancel a job, or discard a finished one
+    GET    /health               running and queued job counts
+
+Operations are merge, merge-pdfs, resize, trim, rotate, remove and
+extract. Inputs are either uploaded as ``multipart/form-data`` (every file
+part is an input, in order; other fields are parameters) or named as
+server-side paths in a JSON body, ``{"paths": [...], "size": "595x842"}``.
+Paths are only accepted under the folders passed with ``--allow-path``.
+Parameters are ``size``, ``mode``, ``angle``, ``top``, ``bottom``, ``auto``, ``margin``,
+``pages``, ``resize_a4``, ``streaming`` and ``optimize``, as in the CLI.
+
+At most ``workers`` jobs run at once and at most ``queue_depth`` wait for a
+slot; further jobs are refused with 503 until the queue drains. Results are
+kept for ``keep_results`` seconds after a job finishes, except those of
+``?wait=1`` jobs, which are discarded once sent. Request bodies are
+streamed to disk and uploads are split out of them off the event loop, so
+a large upload never stalls other requests. Run ``python
+merge_service.py --help`` to start it.
+"""
+import asyncio
+import functools
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from urllib.parse import parse_qs, urlsplit
+
+import pdf_engine
+from pdf_engine import A4_SIZE, JobCancelled, PdfEngineError, parse_page_size
+
+OPERATIONS = ("merge", "merge-pdfs", "resize", "trim", "rotate", "remove", "extract")
+SINGLE_INPUT_OPERATIONS = ("resize", "trim", "rotate", "remove", "extract")
+CHUNK_SIZE = 256 * 1024
+MAX_HEADER_BYTES = 64 * 1024
+
+_STATUS_TEXT = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 411: "Length Required", 413: "Payload Too Large",
+    422: "Unprocessable Entity", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+# =========================
+# Worker Side
+# =========================
+_updates = None
+
+
+def _init_worker(updates):
+    global _updates
+    _updates = updates
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class CancelFlag:
+    """A cancel event shared with worker processes through a marker file."""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "cancel")
+
+    def set(self):
+        open(self.path, "w").close()
+
+    def is_set(self):
+        return os.path.exists(self.path)
+
+
+def _bool(value):
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def run_job(job_id, operation, inputs, output_file, params, cancel=None):
+    """Run one operation in a worker and return its skipped inputs as ``[path, reason]`` pairs."""
+    def progress(done, total, item):
+        if _updates is not None:
+            _updates.put((job_id, done, total, os.path.basename(str(item))))
+
+    streaming, optimize = _bool(params.get("streaming")), _bool(params.get("optimize"))
+    if operation == "merge":
+        failures = pdf_engine.merge_files(inputs, output_file, workers=1, streaming=streaming,
+                                          progress=progress, cancel=cancel, optimize=optimize)
+        return [[path, str(error)] for path, error in failures]
+    if operation == "merge-pdfs":
+        missing = pdf_engine.merge_pdfs(inputs, output_file, streaming, progress, cancel, optimize)
+        return [[path, "not found"] for path in missing]
+
+    source = inputs[0]
+    progress(0, 1, source)
+    if operation == "resize":
+        pdf_engine.resize_pdf(source, output_file, parse_page_size(params.get("size", A4_SIZE)),
+                              params.get("mode", "fit"))
+    elif operation == "trim" and _bool(params.get("auto")):
+        pdf_engine.auto_trim_pdf(source, output_file, float(params.get("margin", 10)), workers=1)
+    elif operation == "trim":
+        pdf_engine.trim_whitespace(source, output_file, float(params.get("top", 190)),
+                                   float(params.get("bottom", 190)))
+    elif operation == "rotate":
+        pdf_engine.rotate_pdf(source, output_file, int(params.get("angle", 90)))
+    else:
+        if "pages" not in params:
+            raise PdfEngineError("The pages parameter is required.")
+        resize_to = A4_SIZE if _bool(params.get("resize_a4")) else None
+        if operation == "remove":
+            pdf_engine.remove_and_resize_pages(source, output_file, params["pages"], resize_to)
+        else:
+            pdf_engine.extract_pages(source, output_file, params["pages"], resize_to)
+    progress(1, 1, output_file)
+    return []
+
+
+# =========================
+# Request Bodies
+# =========================
+def _save_upload(directory, index, filename, data):
+    # Keep the extension: it tells merge whether an input is a PDF or an image
+    safe_name = "".join(c if c.isalnum() or c in "._-" else "_" for c in os.path.basename(filename))
+    path = os.path.join(directory, f"{index:04d}_{safe_name or 'upload'}")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def split_multipart(content_type, body_path, directory):
+    """
+    Return ``(inputs, params)`` from the multipart/form-data body in ``body_path``.
+
+    The body is memory-mapped and every file part is copied from it
+    straight into its own file in ``directory``, so an upload is never
+    held in memory as a whole; only the small header block of each part is
+    parsed.
+    """
+    from email import policy
+    from email.parser import BytesParser
+
+    def headers(data):
+        return BytesParser(policy=policy.HTTP).parsebytes(data, headersonly=True)
+
+    boundary = headers(b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n").get_param("boundary")
+    if not boundary or not os.path.getsize(body_path):
+        raise _HttpError(400, "Malformed multipart body.")
+    delimiter = b"--" + boundary.encode("latin-1")
+    inputs, params = [], {}
+    with open(body_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as body:
+        position = body.find(delimiter)
+        while position >= 0 and body[position + len(delimiter):position + len(delimiter) + 2] != b"--":
+            line_end = body.find(b"\r\n", position)
+            header_end = body.find(b"\r\n\r\n", line_end) if line_end >= 0 else -1
+            end = body.find(b"\r\n" + delimiter, header_end + 4) if header_end >= 0 else -1
+            if end < 0:
+                raise _HttpError(400, "Malformed multipart body.")
+            part = headers(body[line_end + 2:header_end + 4])
+            if part.get("content-transfer-encoding", "binary").lower() not in ("binary", "7bit", "8bit"):
+                raise _HttpError(400, "Content-Transfer-Encoding is not supported in form uploads.")
+            name = part.get_param("name", header="content-disposition")
+            filename = part.get_filename()
+            with memoryview(body) as view, view[header_end + 4:end] as data:
+                if filename is None:
+                    params[name] = bytes(data).decode("utf-8", errors="replace")
+                else:
+                    inputs.append(_save_upload(directory, len(inputs), filename, data))
+            position = end + 2
+        if position < 0:
+            raise _HttpError(400, "Malformed multipart body.")
+    return inputs, params
+
+
+# =========================
+# Jobs
+# =========================
+@dataclass
+class Job:
+    id: str
+    operation: str
+    directory: str
+    inputs: list
+    params: dict
+    status: str = "queued"
+    done: int = 0
+    total: int = 0
+    item: str = None
+    error: str = None
+    failures: list = field(default_factory=list)
+    created: float = field(default_factory=time.time)
+    finished: float = None
+    task: object = field(default=None, repr=False)
+
+    @property
+    def output_file(self):
+        return os.path.join(self.directory, "result.pdf")
+
+    def to_json(self):
+        return {
+            "id": self.id, "operation": self.operation, "status": self.status,
+            "progress": {"done": self.done, "total": self.total, "item": self.item},
+            "error": self.error, "failures": self.failures,
+            "created": round(self.created, 3), "finished": self.finished and round(self.finished, 3),
+            "status_url": f"/jobs/{self.id}", "result_url": f"/jobs/{self.id}/result",
+        }
+
+
+class _HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# =========================
+# Service
+# =========================
+class MergeService:
+    def __init__(self, host="127.0.0.1", port=8765, workers=None, queue_depth=16, allowed_paths=(),
+                 max_upload_bytes=512 * 1024 * 1024, keep_results=3600, work_dir=None):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_depth = queue_depth
+        self.allowed_paths = [os.path.realpath(path) for path in allowed_paths]
+        self.max_upload_bytes = max_upload_bytes
+        self.keep_results = keep_results
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="merge-service-")
+        self.jobs = {}
+        self._server = None
+        self._executor = None
+        self._updates = None
+        self._update_thread = None
+        self._slots = None
+        self._loop = None
+        self._expire_task = None
+
+    async def start(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._updates = multiprocessing.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self._updates,))
+        self._update_thread = threading.Thread(target=self._forward_updates, daemon=True)
+        self._update_thread.start()
+        os.makedirs(self.work_dir, exist_ok=True)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._expire_task = self._loop.create_task(self._expire_results())
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._expire_task.cancel()
+        await asyncio.gather(self._expire_task, return_exceptions=True)
+        for job in self.jobs.values():
+            if job.status in ("queued", "running"):
+                CancelFlag(job.directory).set()
+        # Running jobs may take a while to see the flag; keep the loop free meanwhile
+        await self._loop.run_in_executor(None, functools.partial(self._executor.shutdown, wait=True,
+                                                                 cancel_futures=True))
+        self._updates.put(None)
+        await self._loop.run_in_executor(None, self._update_thread.join)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _forward_updates(self):
+        # Progress arrives from the workers on a multiprocessing queue
+        while True:
+            update = self._updates.get()
+            if update is None:
+                return
+            self._loop.call_soon_threadsafe(self._apply_update, *update)
+
+    def _apply_update(self, job_id, done, total, item):
+        job = self.jobs.get(job_id)
+        if job is not None and job.status == "running":
+            job.done, job.total, job.item = done, total, item
+
+    async def _expire_results(self):
+        while True:
+            await asyncio.sleep(min(60, self.keep_results))
+            cutoff = time.time() - self.keep_results
+            for job in [j for j in self.jobs.values() if j.finished and j.finished < cutoff]:
+                self._discard(job)
+
+    def _discard(self, job):
+        self.jobs.pop(job.id, None)
+        shutil.rmtree(job.directory, ignore_errors=True)
+
+    async def _run(self, job):
+        try:
+            async with self._slots:
+                job.status = "running"
+                job.failures = await self._loop.run_in_executor(
+                    self._executor, run_job, job.id, job.operation, job.inputs, job.output_file,
+                    job.params, CancelFlag(job.directory),
+                )
+                job.status = "done"
+        except (JobCancelled, asyncio.CancelledError):
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e) or type(e).__name__
+        finally:
+            job.finished = time.time()
+
+    def _create_job(self, operation, directory, inputs, params):
+        if operation not in OPERATIONS:
+            raise _HttpError(404, f"Unknown operation: {operation}")
+        if not inputs:
+            raise _HttpError(400, "No input files given.")
+        if operation in SINGLE_INPUT_OPERATIONS and len(inputs) != 1:
+            raise _HttpError(400, f"{operation} takes exactly one input file.")
+        queued = sum(1 for job in self.jobs.values() if job.status == "queued")
+        if queued >= self.queue_depth:
+            raise _HttpError(503, "Too many queued jobs; try again later.")
+        job = Job(os.path.basename(directory), operation, directory, inputs, params, total=len(inputs))
+        self.jobs[job.id] = job
+        job.task = self._loop.create_task(self._run(job))
+        return job
+
+    def _check_path(self, path):
+        real = os.path.realpath(path)
+        if not any(real == root or real.startswith(root + os.sep) for root in self.allowed_paths):
+            raise _HttpError(403, f"Path is not under an allowed folder: {path}")
+        if not os.path.isfile(real):
+            raise _HttpError(400, f"No such file: {path}")
+        return real
+
+    def _read_inputs(self, content_type, body_path, directory):
+        """Return ``(inputs, params)`` from the JSON or multipart body saved in ``body_path``."""
+        if content_type.startswith("application/json"):
+            with open(body_path, "rb") as f:
+                body = f.read()
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError as e:
+                raise _HttpError(400, f"Invalid JSON: {e}") from e
+            if not isinstance(payload, dict) or not isinstance(payload.get("paths"), list):
+                raise _HttpError(400, "Expected a JSON object with a list of paths.")
+            inputs = [self._check_path(str(path)) for path in payload.pop("paths")]
+            return inputs, payload
+
+        if content_type.startswith("multipart/form-data"):
+            return split_multipart(content_type, body_path, directory)
+
+        raise _HttpError(400, "Send multipart/form-data uploads or a JSON body with paths.")
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, _ = request_line.split(" ", 2)
+            except ValueError:
+                await self._send_json(writer, 400, {"error": "Malformed request line."})
+                return
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+            try:
+                await self._route(method.upper(), target, headers, reader, writer)
+            except _HttpError as e:
+                await self._send_json(writer, e.status, {"error": str(e)})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_body(self, headers, reader, path):
+        """Stream the request body to ``path`` in chunks."""
+        if "content-length" not in headers:
+            raise _HttpError(411, "A Content-Length header is required.")
+        value = headers["content-length"]
+        if not (value.isascii() and value.isdigit()):
+            raise _HttpError(400, f"Invalid Content-Length: {value}")
+        remaining = int(value)
+        if remaining > self.max_upload_bytes:
+            raise _HttpError(413, f"Request body is larger than {self.max_upload_bytes} bytes.")
+        with open(path, "wb") as f:
+            while remaining:
+                chunk = await reader.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ConnectionResetError("The client closed the connection mid-body.")
+                await self._loop.run_in_executor(None, f.write, chunk)
+                remaining -= len(chunk)
+
+    async def _route(self, method, target, headers, reader, writer):
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+
+        if parts == ["health"] and method == "GET":
+            statuses = [job.status for job in self.jobs.values()]
+            await self._send_json(writer, 200, {
+                "running": statuses.count("running"), "queued": statuses.count("queued"),
+                "workers": self.workers, "queue_depth": self.queue_depth,
+            })
+            return
+
+        if len(parts) == 2 and parts[0] == "jobs" and method == "POST":
+            directory = os.path.join(self.work_dir, uuid.uuid4().hex)
+            os.mkdir(directory)
+            body_path = os.path.join(directory, "body")
+            try:
+                await self._read_body(headers, reader, body_path)
+                inputs, params = await self._loop.run_in_executor(
+                    None, self._read_inputs, headers.get("content-type", ""), body_path, directory
+                )
+                os.remove(body_path)
+                job = self._create_job(parts[1], directory, inputs, params)
+            except BaseException:
+                shutil.rmtree(directory, ignore_errors=True)
+                raise
+            if not _bool(query.get("wait", ["0"])[0]):
+                await self._send_json(writer, 202, job.to_json())
+                return
+            await asyncio.shield(job.task)
+            # Nobody else knows the job's id, so its files go once it is answered
+            try:
+                if job.status != "done":
+                    await self._send_json(writer, 422 if job.status == "failed" else 409, job.to_json())
+                else:
+                    await self._send_file(writer, job)
+            finally:
+                self._discard(job)
+            return
+
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise _HttpError(404, "No such job.")
+            if len(parts) == 3 and parts[2] == "result" and method == "GET":
+                if job.status != "done":
+                    raise _HttpError(409, f"Job is {job.status}.")
+                await self._send_file(writer, job)
+            elif len(parts) == 2 and method == "GET":
+                await self._send_json(writer, 200, job.to_json())
+            elif len(parts) == 2 and method == "DELETE":
+                if job.status == "queued":
+                    # A task cancelled before it first runs never reaches its own handler
+                    job.task.cancel()
+                    job.status = "cancelled"
+                    job.finished = time.time()
+                elif job.status == "running":
+                    CancelFlag(job.directory).set()
+                else:
+                    self._discard(job)
+                await self._send_json(writer, 200, job.to_json())
+            else:
+                raise _HttpError(405, "Method not allowed.")
+            return
+
+        raise _HttpError(404, "Not found.")
+
+    def _send_head(self, writer, status, content_type, length, extra=()):
+        lines = [f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}", f"Content-Type: {content_type}",
+                 f"Content-Length: {length}", "Connection: close", *extra]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def _send_json(self, writer, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self._send_head(writer, status, "application/json", len(body))
+        writer.write(body)
+        await writer.drain()
+
+    async def _send_file(self, writer, job):
+        size = os.path.getsize(job.output_file)
+        self._send_head(writer, 200, "application/pdf", size,
+                        [f'Content-Disposition: attachment; filename="{job.operation}.pdf"'])
+        with open(job.output_file, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+
+# =========================
+# Command Line Interface
+# =========================
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve the PDF engine operations over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="Jobs run at once (default: CPU count).")
+    parser.add_argument("--queue-depth", type=int, default=16, help="Jobs allowed to wait for a worker.")
+    parser.add_argument("--allow-path", action="append", default=[],
+                        help="Folder whose files may be named as server-side paths (repeatable).")
+    parser.add_argument("--max-upload-mb", type=int, default=512)
+    parser.add_argument("--keep-results", type=int, default=3600, help="Seconds finished results are kept.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    service = MergeService(args.host, args.port, args.workers, args.queue_depth, args.allow_path,
+                           args.max_upload_mb * 1024 * 1024, args.keep_results)
+
+    async def serve():
+        await service.start()
+        print(f"Listening on http://{service.host}:{service.port}", flush=True)
+        try:
+            await service.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""
+Per-operation timings, sizes and memory for the pdf_engine operations.
+
+Instrumentation is off by default, when it costs one check per call. Once
+enabled with enable(), or through the PDF_METRICS_FILE and PDF_PROFILE_DIR
+environment variables (which worker processes inherit), every instrumented
+operation appends one JSON line to the metrics file as it finishes:
+
+    {"op": "resize_pdf", "status": "ok", "seconds": 1.27,
+     "stages": {"parse": 0.02, "transform": 0.66, "write": 0.59},
+     "bytes_read": 726036, "bytes_written": 734115, "pages": 2000,
+     "peak_rss_bytes": 81264640, "id": "3f0c...", "parent": null, "pid": 4121, "time": 1760000000.0}
+
+Time spent in a stage that is entered repeatedly (say, writing each input
+of a streaming merge) is added up. pypdf parses lazily, so parsing is
+partly counted under whichever stage first touches an object. Operations
+run inside another one (an image rendered for a merge) are recorded too,
+with ``parent`` set to the outer operation's ``id``.
+
+``peak_rss_bytes`` is the process's peak resident memory since the
+outermost running operation started; on Linux the peak is reset through
+/proc/self/clear_refs, elsewhere it is the lifetime peak of the process.
+
+prometheus_text() sums a metrics file up in the Prometheus text format,
+e.g. for node_exporter's textfile collector:
+
+    python pdf_engine.py metrics events.jsonl -o /var/lib/node_exporter/pdf_engine.prom
+
+With a profile directory every outermost operation also runs under
+cProfile, and its stats are saved as ``<dir>/<op>-<pid>-<id>.prof`` for
+pstats or snakeviz.
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+METRICS_FILE_ENV = "PDF_METRICS_FILE"
+PROFILE_DIR_ENV = "PDF_PROFILE_DIR"
+
+_recorder = None
+_current = contextvars.ContextVar("pdf_engine_operation", default=None)
+
+
+# =========================
+# Recording
+# =========================
+class Recorder:
+    """Send finished operations to a JSON lines file and/or a callback."""
+
+    def __init__(self, path=None, profile_dir=None, callback=None):
+        self.path = path
+        self.profile_dir = profile_dir
+        self.callback = callback
+        self._fd = None
+        if path:
+            self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o666)
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def emit(self, event):
+        if self._fd is not None:
+            # One write() per line, so O_APPEND keeps lines from concurrent
+            # worker processes whole
+            os.write(self._fd, (json.dumps(event) + "\n").encode())
+        if self.callback:
+            self.callback(event)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def enable(path=None, profile_dir=None, callback=None, inherit=True):
+    """
+    Start recording operations to ``path`` and/or ``callback(event)``.
+
+    ``profile_dir`` turns on a cProfile dump per outermost operation. With
+    ``inherit`` the settings are also put in the environment, so worker
+    processes started afterwards record to the same file.
+    """
+    global _recorder
+    disable()
+    _recorder = Recorder(path, profile_dir, callback)
+    if inherit:
+        for name, value in ((METRICS_FILE_ENV, path), (PROFILE_DIR_ENV, profile_dir)):
+            if value:
+                os.environ[name] = os.path.abspath(value)
+    return _recorder
+
+
+def disable():
+    """Stop recording and drop the settings enable() put in the environment."""
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+    os.environ.pop(METRICS_FILE_ENV, None)
+    os.environ.pop(PROFILE_DIR_ENV, None)
+
+
+def enabled():
+    return _recorder is not None
+
+
+# =========================
+# Operations and Stages
+# =========================
+def _size(source):
+    if isinstance(source, (str, os.PathLike)):
+        try:
+            return os.path.getsize(source)
+        except OSError:
+            return 0
+    try:
+        return memoryview(source).nbytes
+    except TypeError:
+        # A file object, whose size is not known without reading it
+        return 0
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_bytes():
+    """Return the peak resident memory of this process in bytes, or None if unknown."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Operation:
+    """Measurements for one running operation; see operation()."""
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.stages = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def add(self, **counts):
+        """Add to this operation's counters, e.g. ``add(pages=12)``."""
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+
+
+class _NullOperation:
+    """Stands in for Operation while recording is off."""
+    name = id = parent = None
+
+    def stage(self, name):
+        return nullcontext()
+
+    def add(self, **counts):
+        pass
+
+
+_NULL_OPERATION = _NullOperation()
+
+
+@contextmanager
+def operation(name, inputs=(), outputs=()):
+    """
+    Measure the block as operation ``name`` and record it when it ends.
+
+    ``inputs`` and ``outputs`` are paths (or in-memory buffers) whose sizes
+    are recorded as ``bytes_read`` when the block starts and
+    ``bytes_written`` when it ends. Yields an Operation, whose stage() and
+    add() are also reachable through the module-level functions of the same
+    name from code called inside the block.
+    """
+    recorder = _recorder
+    if recorder is None:
+        yield _NULL_OPERATION
+        return
+    parent = _current.get()
+    op = Operation(name, parent.id if parent else None)
+    op.add(bytes_read=sum(_size(source) for source in inputs))
+    token = _current.set(op)
+    profiler = None
+    if parent is None:
+        _reset_peak_rss()
+        if recorder.profile_dir:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already running in this thread
+                profiler = None
+    started = time.time()
+    start = time.perf_counter()
+    event = {"op": name, "status": "ok"}
+    try:
+        yield op
+    except BaseException as e:
+        event.update(status="error", error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _current.reset(token)
+        op.add(bytes_written=sum(_size(target) for target in outputs))
+        event.update(seconds=round(seconds, 6), stages={k: round(v, 6) for k, v in op.stages.items()},
+                     **op.counts, peak_rss_bytes=peak_rss_bytes(), id=op.id, parent=op.parent,
+                     pid=os.getpid(), time=round(started, 3))
+        try:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(os.path.join(recorder.profile_dir, f"{name}-{os.getpid()}-{op.id}.prof"))
+            recorder.emit(event)
+        except OSError as e:
+            # A full disk or a removed metrics folder must not fail the job itself
+            print(f"Could not record metrics for {name}: {e}", file=sys.stderr)
+
+
+def current():
+    """Return the innermost running Operation (a no-op stand-in when there is none)."""
+    return _current.get() or _NULL_OPERATION
+
+
+def stage(name):
+    """Time a block as stage ``name`` of the running operation, if any."""
+    op = _current.get()
+    return op.stage(name) if op is not None else nullcontext()
+
+
+def add(**counts):
+    """Add to the running operation's counters, if any."""
+    op = _current.get()
+    if op is not None:
+        op.add(**counts)
+
+
+# =========================
+# Export
+# =========================
+def read_events(path):
+    """Yield the events in a JSON lines metrics file, skipping torn lines."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and "op" in event:
+                yield event
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus_text(events, prefix="pdf_engine"):
+    """Sum ``events`` up as Prometheus text exposition format."""
+    operations = {}
+    durations = {}
+    stages = {}
+    counters = {}
+    peaks = {}
+    for event in events:
+        op = event["op"]
+        status = event.get("status", "ok")
+        operations[op, status] = operations.get((op, status), 0) + 1
+        total, count = durations.get(op, (0.0, 0))
+        durations[op] = (total + event.get("seconds", 0.0), count + 1)
+        for name, seconds in event.get("stages", {}).items():
+            stages[op, name] = stages.get((op, name), 0.0) + seconds
+        for name, value in event.items():
+            if name not in ("seconds", "peak_rss_bytes", "time", "pid") and isinstance(value, (int, float)) \
+                    and not isinstance(value, bool):
+                counters.setdefault(name, {})
+                counters[name][op] = counters[name].get(op, 0) + value
+        if event.get("peak_rss_bytes") is not None:
+            peaks[op] = max(peaks.get(op, 0), event["peak_rss_bytes"])
+
+    lines = [
+        f"# HELP {prefix}_operations_total Operations finished, by outcome.",
+        f"# TYPE {prefix}_operations_total counter",
+    ]
+    lines += [f'{prefix}_operations_total{{op="{_label(op)}",status="{_label(status)}"}} {n}'
+              for (op, status), n in sorted(operations.items())]
+    lines += [
+        f"# HELP {prefix}_operation_seconds Wall time of operations.",
+        f"# TYPE {prefix}_operation_seconds summary",
+    ]
+    for op, (total, count) in sorted(durations.items()):
+        lines.append(f'{prefix}_operation_seconds_sum{{op="{_label(op)}"}} {total:.6f}')
+        lines.append(f'{prefix}_operation_seconds_count{{op="{_label(op)}"}} {count}')
+    lines += [
+        f"# HELP {prefix}_stage_seconds_total Wall time spent in each stage of an operation.",
+        f"# TYPE {prefix}_stage_seconds_total counter",
+    ]
+    lines += [f'{prefix}_stage_seconds_total{{op="{_label(op)}",stage="{_label(name)}"}} {seconds:.6f}'
+              for (op, name), seconds in sorted(stages.items())]
+    for name, values in sorted(counters.items()):
+        lines += [
+            f"# HELP {prefix}_{name}_total Sum of {name} over operations.",
+            f"# TYPE {prefix}_{name}_total counter",
+        ]
+        lines += [f'{prefix}_{name}_total{{op="{_label(op)}"}} {value}' for op, value in sorted(values.items())]
+    lines += [
+        f"# HELP {prefix}_peak_rss_bytes Highest peak resident memory seen during an operation.",
+        f"# TYPE {prefix}_peak_rss_bytes gauge",
+    ]
+    lines += [f'{prefix}_peak_rss_bytes{{op="{_label(op)}"}} {peak}' for op, peak in sorted(peaks.items())]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(events, path, prefix="pdf_engine"):
+    """Write prometheus_text() to ``path`` atomically, as textfile collectors expect."""
+    text = prometheus_text(events, prefix)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+if os.environ.get(METRICS_FILE_ENV) or os.environ.get(PROFILE_DIR_ENV):
+    _recorder = Recorder(os.environ.get(METRICS_FILE_ENV), os.environ.get(PROFILE_DIR_ENV))
@@ -0,0 +1,194 @@
+"""
+Batch ODT to PDF conversion on a small pool of LibreOffice instances.
+
+Starting LibreOffice dominates the cost of converting one document, so
+OdtBatchConverter hands each instance several files per invocation and
+runs a few instances side by side. Every instance slot keeps its own user
+profile for the converter's lifetime: instances do not fight over the
+default profile, and later invocations skip first-start profile setup.
+
+If an invocation crashes or runs past its timeout (``timeout`` seconds per
+file in the call), its process group is killed. Files that did not
+produce a PDF are then retried one per invocation, so one bad document
+only fails itself.
+"""
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import metrics
+from pdf_engine import BatchResult, JobCancelled, atomic_output
+
+
+class OdtBatchConverter:
+    def __init__(self, command="libreoffice", instances=2, files_per_call=16, timeout=120, cache=None):
+        self.command = command
+        self.instances = instances
+        self.files_per_call = files_per_call
+        self.timeout = timeout
+        self.cache = cache
+        self._profiles = [tempfile.mkdtemp(prefix="odt-profile-") for _ in range(instances)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        for profile in self._profiles:
+            shutil.rmtree(profile, ignore_errors=True)
+        self._profiles = []
+
+    def _run(self, slot, odt_files, output_dir):
+        """Convert ``odt_files`` in one invocation; return an error message or None."""
+        profile_url = "file://" + os.path.abspath(self._profiles[slot])
+        args = [
+            self.command, f"-env:UserInstallation={profile_url}", "--headless",
+            "--convert-to", "pdf", "--outdir", output_dir, *odt_files,
+        ]
+        process = subprocess.Popen(
+            args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True
+        )
+        try:
+            _, stderr = process.communicate(timeout=self.timeout * len(odt_files))
+        except subprocess.TimeoutExpired:
+            # LibreOffice's launcher forks soffice.bin, so kill the whole group
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, 9)
+            else:
+                process.kill()
+            process.communicate()
+            return f"Conversion timed out after {self.timeout}s per file."
+        if process.returncode != 0:
+            return f"Converter exited with status {process.returncode}: {stderr.decode(errors='replace').strip()}"
+        return None
+
+    def convert(self, odt_files, output_dir=None, progress=None, cancel=None):
+        """
+        Convert ``odt_files`` to PDF and return one BatchResult per file.
+
+        PDFs go to ``output_dir``, or next to each ODT when it is None.
+        ``progress(done, total, result)`` is called from the worker threads
+        as files finish. Once ``cancel`` is set no further invocations are
+        started and the remaining files get a JobCancelled error.
+        """
+        odt_files = list(odt_files)
+        total = len(odt_files)
+        results = {}
+        lock = threading.Lock()
+
+        def output_for(odt):
+            folder = output_dir or os.path.dirname(os.path.abspath(odt))
+            return os.path.join(folder, os.path.splitext(os.path.basename(odt))[0] + ".pdf")
+
+        def finish(odt, error):
+            result = BatchResult(odt, output_for(odt), error)
+            with lock:
+                results[odt] = result
+                done = len(results)
+            if error is None and self.cache is not None:
+                try:
+                    with open(result.output_file, "rb") as pdf_file:
+                        self.cache.put(self.cache.key(odt, "odt-to-pdf"), pdf_file.read())
+                except OSError:
+                    # The PDF is already in place; a missed cache entry only
+                    # costs a later conversion
+                    pass
+            if progress:
+                progress(done, total, result)
+
+        by_folder = {}
+        cache_hits = 0
+        for odt in dict.fromkeys(odt_files):
+            if not os.path.exists(odt):
+                finish(odt, FileNotFoundError(f"The file {odt} does not exist."))
+                continue
+            if self.cache is not None:
+                data = self.cache.get(self.cache.key(odt, "odt-to-pdf"))
+                if data is not None:
+                    with atomic_output(output_for(odt)) as pdf_file:
+                        pdf_file.write(data)
+                    cache_hits += 1
+                    finish(odt, None)
+                    continue
+            by_folder.setdefault(os.path.dirname(output_for(odt)), []).append(odt)
+
+        chunks = queue.Queue()
+        for folder, files in by_folder.items():
+            os.makedirs(folder, exist_ok=True)
+            for start in range(0, len(files), self.files_per_call):
+                chunks.put((folder, files[start:start + self.files_per_call]))
+
+        def mtime(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return None
+
+        def convert_chunk(slot, op, folder, files):
+            if cancel is not None and cancel.is_set():
+                for odt in files:
+                    finish(odt, JobCancelled("Job cancelled."))
+                return
+            before = {odt: mtime(output_for(odt)) for odt in files}
+            try:
+                with op.stage("libreoffice"):
+                    error = self._run(slot, files, folder)
+            except Exception as e:
+                # The converter could not be started at all (e.g. it is not
+                # on PATH), so retrying the files one by one would not help
+                for odt in files:
+                    finish(odt, RuntimeError(f"Could not run {self.command}: {e}"))
+                return
+            op.add(libreoffice_runs=1)
+            for odt in files:
+                after = mtime(output_for(odt))
+                if after is not None and after != before[odt]:
+                    finish(odt, None)
+                elif len(files) > 1:
+                    chunks.put((folder, [odt]))
+                else:
+                    finish(odt, RuntimeError(error or "Converter produced no PDF."))
+
+        def worker(slot, op):
+            while True:
+                item = chunks.get()
+                if item is None:
+                    break
+                try:
+                    convert_chunk(slot, op, *item)
+                except Exception as e:
+                    # Never leave a file without a result, or convert() would
+                    # not be able to report it
+                    with lock:
+                        for odt in item[1]:
+                            results.setdefault(odt, BatchResult(odt, output_for(odt), RuntimeError(str(e))))
+                finally:
+                    chunks.task_done()
+
+        pending = [odt for files in by_folder.values() for odt in files]
+        with metrics.operation("convert_odt_batch", pending, [output_for(odt) for odt in pending]) as op:
+            op.add(documents=len(pending), cache_hits=cache_hits)
+            threads = [threading.Thread(target=worker, args=(slot, op), daemon=True)
+                       for slot in range(self.instances)]
+            for thread in threads:
+                thread.start()
+            chunks.join()
+            for _ in threads:
+                chunks.put(None)
+            for thread in threads:
+                thread.join()
+
+        return [results[odt] for odt in odt_files]
+
+    def convert_directory(self, directory, output_dir=None, progress=None, cancel=None):
+        """Convert every ``.odt`` file directly inside ``directory``."""
+        odt_files = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(".odt")
+        )
+        return self.convert(odt_files, output_dir, progress, cancel)
@@ -0,0 +1,335 @@
+"""
+The single PDF object backend used by the engine.
+
+Everything that reads or writes PDF objects goes through pypdf, via these
+helpers, so pages and objects can be passed freely between operations.
+pypdf is imported on first use, which keeps ``import pdf_engine`` cheap for
+short-lived CLI runs and worker processes. PyMuPDF and Pillow are likewise
+only imported inside the functions that render or rasterize.
+
+A source may be a path, a bytes-like object (bytes, bytearray, memoryview,
+mmap) or a binary file object; in-memory sources are read in place rather
+than copied, and large files are memory-mapped instead of read in full.
+"""
+import io
+import mmap
+import os
+
+# Files at least this large are memory-mapped rather than read into memory
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+
+def is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+class _BufferReader(io.RawIOBase):
+    """A read-only binary file over any buffer, without copying the buffer."""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = (0, self._position, len(self._view))[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+
+def as_stream(source):
+    """
+    Return something pypdf and Pillow can read ``source`` from without copying it.
+
+    Paths to files of MMAP_THRESHOLD bytes or more are memory-mapped, so
+    pages are only read from disk as they are used; smaller paths and file
+    objects are returned as they are.
+    """
+    if is_path(source):
+        if os.path.getsize(source) >= MMAP_THRESHOLD:
+            with open(source, "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return source
+    if isinstance(source, bytes):
+        # BytesIO shares the bytes object's memory until it is written to
+        return io.BytesIO(source)
+    if isinstance(source, mmap.mmap) or hasattr(source, "read"):
+        return source
+    return io.BufferedReader(_BufferReader(source))
+
+
+def read_bytes(source):
+    """Return the whole content of ``source`` as bytes."""
+    if is_path(source):
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "read") and not isinstance(source, mmap.mmap):
+        source.seek(0)
+        return source.read()
+    return bytes(source)
+
+
+def header(source, size=1024):
+    """Return the first ``size`` bytes of ``source``."""
+    if is_path(source):
+        with open(source, "rb") as f:
+            return f.read(size)
+    if hasattr(source, "read") and not isinstance(source, mmap.mmap):
+        position = source.tell()
+        source.seek(0)
+        data = source.read(size)
+        source.seek(position)
+        return data
+    return bytes(memoryview(source).cast("B")[:size])
+
+
+def open_pdf(source, strict=False):
+    """Open a PDF from a path, bytes-like object or binary file object."""
+    from pypdf import PdfReader
+    stream = as_stream(source)
+    reader = PdfReader(stream, strict=strict)
+    if is_path(source) and isinstance(stream, mmap.mmap):
+        # Ours to close, as pypdf does with the files it opens itself
+        reader._stream_opened = True
+    return reader
+
+
+def close_pdf(reader):
+    """
+    Drop a reader's parsed objects and close the file open_pdf mapped for it.
+
+    The reader and the objects it parsed reference each other, so without
+    this a source stays in memory until the next full garbage collection.
+    Pages already copied elsewhere (e.g. by StreamingPdfWriter) are
+    unaffected; pages still to be used from the reader are not.
+    """
+    reader.close()
+    reader._page_id2num = None
+
+
+def with_reader(source, use):
+    """
+    Return ``use(reader)``, opening ``source`` strictly first.
+
+    A lenient reader seeks to and checks every object in the xref table
+    when it opens, which costs as much as the file is large. A strict
+    reader trusts the table, so opening is cheap; if the file turns out to
+    be damaged, ``use`` is run again on a lenient reader.
+    """
+    from pypdf.errors import PdfReadError
+    try:
+        return use(open_pdf(source, strict=True))
+    except PdfReadError:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return use(open_pdf(source))
+
+
+def new_pdf():
+    """Return an empty in-memory output document."""
+    from pypdf import PdfWriter
+    return PdfWriter()
+
+
+def rectangle(lower_left_x, lower_left_y, upper_right_x, upper_right_y):
+    from pypdf.generic import RectangleObject
+    return RectangleObject([lower_left_x, lower_left_y, upper_right_x, upper_right_y])
+
+
+def _number(value):
+    text = f"{value:.6f}".rstrip("0").rstrip(".")
+    return text if text not in ("", "-0") else "0"
+
+
+def _content_stream(data, shared):
+    """Return a content stream holding ``data``, reusing one from ``shared`` if possible."""
+    from pypdf.generic import DecodedStreamObject
+    if data not in shared:
+        shared[data] = DecodedStreamObject()
+        shared[data].set_data(data)
+    return shared[data]
+
+
+def transform_page(page, matrix, shared=None):
+    """
+    Apply the transformation ``matrix`` (a, b, c, d, e, f) to a page in place.
+
+    The page's content streams are wrapped between two tiny new streams,
+    ``q <matrix> cm`` and ``Q``, instead of being decoded and rewritten, and
+    annotation rectangles are mapped through the same matrix. Passing the
+    same ``shared`` dict for every page of a document lets pages with the
+    same matrix use the same wrapper streams.
+    """
+    from pypdf.generic import ArrayObject, FloatObject, NameObject
+
+    shared = {} if shared is None else shared
+    if "/Contents" in page:
+        raw = page.raw_get("/Contents")
+        contents = raw.get_object()
+        parts = list(contents) if isinstance(contents, ArrayObject) else [raw]
+        operands = " ".join(_number(value) for value in matrix)
+        page[NameObject("/Contents")] = ArrayObject([
+            _content_stream(f"q {operands} cm\n".encode(), shared),
+            *parts,
+            _content_stream(b"\nQ\n", shared),
+        ])
+
+    a, b, c, d, e, f = matrix
+    for annotation in page.get("/Annots", None) or ():
+        annotation = annotation.get_object()
+        if "/Rect" not in annotation:
+            continue
+        x0, y0, x1, y1 = (float(value) for value in annotation["/Rect"])
+        xs, ys = [], []
+        for x, y in ((x0, y0), (x0, y1), (x1, y0), (x1, y1)):
+            xs.append(a * x + c * y + e)
+            ys.append(b * x + d * y + f)
+        annotation[NameObject("/Rect")] = ArrayObject(
+            FloatObject(value) for value in (min(xs), min(ys), max(xs), max(ys))
+        )
+
+
+def image_page(jpeg, pixel_width, pixel_height, color_space, page_width, page_height, matrix):
+    """
+    Return a new page showing one JPEG image, placed by ``matrix``.
+
+    ``jpeg`` is embedded as it is (DCTDecode), so it is never decoded or
+    re-encoded; ``matrix`` (a, b, c, d, e, f) maps the image's unit square
+    onto the page, whose white background shows wherever it is not covered.
+    """
+    from pypdf import PageObject
+    from pypdf.generic import DictionaryObject, EncodedStreamObject, NameObject, NumberObject
+
+    image = EncodedStreamObject()
+    image._data = jpeg
+    image.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(pixel_width),
+        NameObject("/Height"): NumberObject(pixel_height),
+        NameObject("/ColorSpace"): NameObject(color_space),
+        NameObject("/BitsPerComponent"): NumberObject(8),
+        NameObject("/Filter"): NameObject("/DCTDecode"),
+    })
+    page = PageObject.create_blank_page(width=page_width, height=page_height)
+    page[NameObject("/Resources")] = DictionaryObject({
+        NameObject("/XObject"): DictionaryObject({NameObject("/Im0"): image}),
+    })
+    operands = " ".join(_number(value) for value in matrix)
+    page[NameObject("/Contents")] = _content_stream(f"q {operands} cm /Im0 Do Q".encode(), {})
+    return page
+
+
+def pymupdf():
+    """
+    Import PyMuPDF, used only where pages are rendered or re-placed.
+
+    Newer releases print a deprecation notice to stdout for the legacy
+    ``fitz`` name, so the current ``pymupdf`` name is preferred.
+    """
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf
+
+
+def open_document(source):
+    """Open a path, bytes-like object or binary file object with PyMuPDF."""
+    fitz = pymupdf()
+    if is_path(source):
+        return fitz.open(source)
+    if hasattr(source, "read") and not isinstance(source, mmap.mmap):
+        return fitz.open("pdf", read_bytes(source))
+    # PyMuPDF takes any buffer through a memoryview, but not an mmap itself
+    return fitz.open("pdf", memoryview(source))
+
+
+INHERITABLE_PAGE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+def page_count(reader):
+    """Read the page count from the page tree root without flattening it."""
+    count = reader.root_object["/Pages"].get("/Count")
+    return int(count) if count is not None else len(reader.pages)
+
+
+def iter_pages(reader, indices):
+    """
+    Yield ``(index, page)`` for the given 0-based page indices, in order.
+
+    Unlike ``reader.pages``, which resolves every page dictionary in the
+    document on first use, this walks the page tree once and skips whole
+    subtrees using their /Count, so only the selected pages (and the nodes
+    above them) are parsed. Page contents are never decoded. Inherited
+    attributes are copied onto each page, as ``reader.pages`` does.
+    """
+    from pypdf import PageObject
+    from pypdf.generic import IndirectObject, NameObject
+
+    wanted = sorted(set(indices))
+    if not wanted:
+        return
+    total = page_count(reader)
+    if wanted[0] < 0 or wanted[-1] >= total:
+        raise IndexError(f"Page index out of range for a {total}-page document.")
+    cursor = 0
+
+    def make_page(ref, node, inherited):
+        page = PageObject(reader, ref if isinstance(ref, IndirectObject) else None)
+        page.update(node)
+        for key, value in inherited.items():
+            if key not in page:
+                page[NameObject(key)] = value
+        return page
+
+    def walk(ref, first, inherited):
+        """Yield wanted pages under ``ref``, whose first page is ``first``; return its page count."""
+        nonlocal cursor
+        node = ref.get_object()
+        if "/Kids" not in node:
+            if wanted[cursor] == first:
+                yield first, make_page(ref, node, inherited)
+                cursor += 1
+            return 1
+
+        count = node.get("/Count")
+        if count is not None and wanted[cursor] >= first + count:
+            return count
+        inherited = dict(inherited)
+        for key in INHERITABLE_PAGE_ATTRIBUTES:
+            if key in node:
+                inherited[key] = node.raw_get(key)
+        kids = node["/Kids"]
+
+        if count is not None and len(kids) == count:
+            # Every kid holds exactly one page, so page n is simply kid n
+            while cursor < len(wanted) and wanted[cursor] < first + count:
+                before = cursor
+                yield from walk(kids[wanted[cursor] - first], wanted[cursor], inherited)
+                if cursor == before:
+                    raise ValueError("Malformed page tree: /Count does not match its pages.")
+            return count
+
+        position = first
+        for kid in kids:
+            if cursor >= len(wanted):
+                break
+            position += yield from walk(kid, position, inherited)
+        return count if count is not None else position - first
+
+    yield from walk(reader.root_object.raw_get("/Pages"), 0, {})
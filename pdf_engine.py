@@ -0,0 +1,1547 @@
+"""
+Headless PDF/image engine used by the Tk front ends.
+
+Nothing in here touches Tkinter: every operation takes plain arguments,
+returns its result and raises PdfEngineError (or the underlying library
+error) on failure, so it can be imported on a display-less server or
+called from batch workers. Run ``python pdf_engine.py --help`` for the CLI.
+
+Inputs may be paths, bytes-like objects (bytes, bytearray, memoryview,
+mmap) or binary file objects, and outputs paths or writable binary file
+objects, so callers holding documents in memory never touch the disk.
+Operations that write a single document return it as bytes when the
+output is None.
+"""
+import io
+import math
+import os
+import re
+import sys
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import metrics
+import pdf_backend
+
+A4_SIZE = (595, 842)
+
+
+class PdfEngineError(Exception):
+    """Raised when an engine operation cannot be completed."""
+
+
+class JobCancelled(PdfEngineError):
+    """Raised when a job is stopped through its ``cancel`` event."""
+
+
+def check_cancelled(cancel):
+    """Raise JobCancelled if ``cancel`` (a threading.Event or None) is set."""
+    if cancel is not None and cancel.is_set():
+        raise JobCancelled("Job cancelled.")
+
+
+def _fsync_directory(directory):
+    """Flush a rename in ``directory`` to disk; Windows cannot open folders, nor needs to."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _PipeOutput:
+    """A pipe or terminal that still tells how much was written, as pypdf's writer asks."""
+
+    def __init__(self, file):
+        self._file = file
+        self._position = 0
+
+    def write(self, data):
+        self._file.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        self._file.flush()
+
+
+@contextmanager
+def atomic_output(output_path):
+    """
+    Yield a binary file that replaces ``output_path`` only on success.
+
+    Data goes to a temporary file in the same folder, which is renamed over
+    the target when the block exits normally and removed otherwise, so a
+    failed or cancelled job never leaves a truncated output behind. The
+    file and then the rename are flushed to disk (fsync) before the block
+    returns, so an output recorded as finished survives a power loss too.
+    A file object given instead of a path is yielded as it is, and so is a
+    path to an existing device or pipe (``/dev/null``, a FIFO), opened for
+    writing, since renaming over it would replace it with a file. A
+    symbolic link is kept and the file it points to is replaced.
+    """
+    if not pdf_backend.is_path(output_path):
+        yield output_path
+        return
+    if os.path.exists(output_path) and not os.path.isfile(output_path):
+        with open(output_path, "wb") as output_file:
+            yield output_file if output_file.seekable() else _PipeOutput(output_file)
+        return
+    # Replace what a link points to, not the link; /dev/stdout, for one, is a link
+    directory, name = os.path.split(os.path.realpath(output_path))
+    tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.part")
+    # Unlike mkstemp's 0600, this lets the umask set the usual permissions
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        with os.fdopen(fd, "wb") as output_file:
+            yield output_file
+            output_file.flush()
+            os.fsync(output_file.fileno())
+        os.replace(tmp_path, os.path.join(directory, name))
+        _fsync_directory(directory)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def remove_partial_outputs(output_path):
+    """
+    Delete temporary files atomic_output left for ``output_path`` in a run that was killed.
+
+    Only call this when no other process can be writing the same output,
+    e.g. when resuming that run from its checkpoint.
+    """
+    if not pdf_backend.is_path(output_path):
+        return
+    directory, name = os.path.split(os.path.realpath(output_path))
+    prefix = f".{name}."
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for entry in names:
+        if entry.startswith(prefix) and entry.endswith(".part"):
+            try:
+                os.remove(os.path.join(directory, entry))
+            except OSError:
+                pass
+
+
+def save_pdf(writer, output_pdf):
+    """Write a pypdf writer to a path (atomically, see atomic_output) or a binary file object."""
+    with atomic_output(output_pdf) as output_file:
+        writer.write(output_file)
+
+
+@dataclass
+class BatchResult:
+    """
+    Outcome of one file in a batch run; ``error`` is None on success.
+
+    ``skipped`` marks a job a checkpoint showed was already done.
+    """
+    input_file: str
+    output_file: str
+    error: Exception = None
+    skipped: bool = False
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+# =========================
+# Batch Scheduling
+# =========================
+def run_batch(operation, jobs, workers=None, progress=None, cancel=None, checkpoint=None):
+    """
+    Run ``operation(*job)`` for every job on a process pool.
+
+    Each job is a tuple whose first two items are the input and output
+    paths. At most ``workers`` jobs run at once and only a small window of
+    further jobs is queued, so very long batches do not pile up futures.
+    ``progress(done, total, result)`` is called in the calling thread as
+    each job finishes. Failures never stop the batch; every job gets a
+    BatchResult, returned in job order. Once ``cancel`` is set no further
+    jobs are started; jobs that never ran get a JobCancelled error.
+
+    With a checkpoint.Checkpoint (or the path of its manifest), jobs it
+    records as done with the same input content and parameters are
+    skipped, and every job that succeeds is recorded, so re-running an
+    interrupted batch only does what is left.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    if pdf_backend.is_path(checkpoint):
+        from checkpoint import Checkpoint
+        with Checkpoint(checkpoint) as opened:
+            return run_batch(operation, jobs, workers, progress, cancel, opened)
+    jobs = list(jobs)
+    total = len(jobs)
+    results = [None] * total
+    workers = workers or os.cpu_count() or 1
+    done = 0
+    snapshots = {}
+
+    def params(job):
+        return f"{operation.__name__}{job[2:]!r}"
+
+    def finish(index, error, skipped=False):
+        nonlocal done
+        input_file, output_file = jobs[index][:2]
+        snapshot = snapshots.pop(index, None)
+        if checkpoint is not None and error is None and not skipped:
+            checkpoint.record(snapshot, output_file, params(jobs[index]))
+        results[index] = BatchResult(input_file, output_file, error, skipped)
+        done += 1
+        if progress:
+            progress(done, total, results[index])
+
+    def start(index, job):
+        if checkpoint is not None:
+            snapshots[index] = checkpoint.snapshot(job[:1])
+
+    def cancelled():
+        return cancel is not None and cancel.is_set()
+
+    pending_jobs = list(enumerate(jobs))
+    if checkpoint is not None:
+        pending_jobs = []
+        for index, job in enumerate(jobs):
+            if checkpoint.is_done(job[:1], job[1], params(job)):
+                finish(index, None, skipped=True)
+            else:
+                remove_partial_outputs(job[1])
+                pending_jobs.append((index, job))
+
+    if workers == 1:
+        for index, job in pending_jobs:
+            if cancelled():
+                break
+            try:
+                start(index, job)
+                operation(*job)
+                finish(index, None)
+            except Exception as e:
+                finish(index, e)
+    else:
+        queued = iter(pending_jobs)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+
+            def fill():
+                while len(pending) < workers * 2 and not cancelled():
+                    index, job = next(queued, (None, None))
+                    if job is None:
+                        return
+                    start(index, job)
+                    pending[executor.submit(operation, *job)] = index
+
+            fill()
+            while pending:
+                finished, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finish(pending.pop(future), future.exception())
+                if cancelled():
+                    # Drop queued jobs; ones already running finish normally
+                    for future in [f for f in pending if f.cancel()]:
+                        pending.pop(future)
+                else:
+                    fill()
+
+    for index, result in enumerate(results):
+        if result is None:
+            input_file, output_file = jobs[index][:2]
+            results[index] = BatchResult(input_file, output_file, JobCancelled("Job cancelled."))
+    return results
+
+
+def _to_bytes(operation, source, *args, **kwargs):
+    """Run ``operation(source, <buffer>, ...)`` and return what it wrote."""
+    buffer = io.BytesIO()
+    operation(source, buffer, *args, **kwargs)
+    return buffer.getvalue()
+
+
+def batch_output_path(input_file, output_folder, suffix):
+    """Name a batch output, e.g. ``a.pdf`` -> ``<output_folder>/a_resized.pdf``."""
+    return os.path.join(output_folder, os.path.basename(input_file).replace(".pdf", suffix + ".pdf"))
+
+
+# =========================
+# ODT to PDF Converter
+# =========================
+def convert_odt_to_pdf(odt_file_path, libreoffice="libreoffice", cache=None):
+    """
+    Convert an ODT file with headless LibreOffice and return the PDF path.
+
+    With a ConversionCache, an ODT whose content was converted before is
+    written out from the cache without starting LibreOffice.
+    """
+    import subprocess
+    if not os.path.exists(odt_file_path):
+        raise PdfEngineError(f"The file {odt_file_path} does not exist.")
+    pdf_file_path = os.path.splitext(odt_file_path)[0] + ".pdf"
+    with metrics.operation("convert_odt_to_pdf", [odt_file_path], [pdf_file_path]) as op:
+        if cache is not None:
+            with op.stage("cache"):
+                key = cache.key(odt_file_path, "odt-to-pdf")
+                data = cache.get(key)
+            if data is not None:
+                op.add(cache_hits=1)
+                with atomic_output(pdf_file_path) as pdf_file:
+                    pdf_file.write(data)
+                return pdf_file_path
+        try:
+            with op.stage("libreoffice"):
+                subprocess.run(
+                    [libreoffice, '--headless', '--convert-to', 'pdf',
+                     '--outdir', os.path.dirname(os.path.abspath(odt_file_path)), odt_file_path],
+                    check=True
+                )
+        except subprocess.CalledProcessError as e:
+            raise PdfEngineError(f"An error occurred while converting the file: {e}") from e
+        if cache is not None:
+            with op.stage("cache"), open(pdf_file_path, "rb") as pdf_file:
+                cache.put(key, pdf_file.read())
+        return pdf_file_path
+
+
+# =========================
+# Image to High-Quality PDF Page
+# =========================
+RESIZE_MODES = ("fit", "fill", "stretch")
+
+
+def scale_for_mode(width, height, target_width, target_height, mode="fit"):
+    """
+    Return the ``(x, y)`` scale factors that size content for a target box.
+
+    ``fit`` shows all of the content, centred, keeping its aspect ratio;
+    ``fill`` covers the whole target, keeping the aspect ratio and cropping
+    the overflow; ``stretch`` matches the target exactly, distorting it.
+    """
+    if mode not in RESIZE_MODES:
+        raise PdfEngineError(f"Unknown resize mode: {mode!r}")
+    if mode == "stretch":
+        return target_width / width, target_height / height
+    pick = min if mode == "fit" else max
+    scale = pick(target_width / width, target_height / height)
+    return scale, scale
+
+
+# Pillow modes that JPEG holds as they are, with their PDF colour spaces
+_JPEG_COLOR_SPACES = {"L": "/DeviceGray", "RGB": "/DeviceRGB"}
+
+
+def image_page(image_path, target_width, target_height, dpi=300, quality=95, mode="fit"):
+    """
+    Return a page of the target size showing an image sized by scale_for_mode.
+
+    The image is placed on the page with a transformation, not pasted onto
+    a canvas, and keeps at most ``dpi`` pixels per inch at its displayed
+    size; smaller images are never upscaled. A grayscale or RGB JPEG within
+    that limit is embedded byte for byte, without being decoded. Larger
+    images are downscaled (JPEGs decode straight at a reduced scale in
+    Pillow's draft mode) and, like other formats, encoded as JPEG at
+    ``quality``.
+    """
+    from PIL import Image
+    with Image.open(pdf_backend.as_stream(image_path)) as img:
+        scale_x, scale_y = scale_for_mode(img.width, img.height, target_width, target_height, mode)
+        display_width, display_height = img.width * scale_x, img.height * scale_y
+        size = (min(img.width, max(1, math.ceil(display_width * dpi / 72))),
+                min(img.height, max(1, math.ceil(display_height * dpi / 72))))
+
+        if img.format == "JPEG" and img.mode in _JPEG_COLOR_SPACES and img.size == size:
+            with metrics.stage("read"):
+                jpeg = pdf_backend.read_bytes(image_path)
+            color_space = _JPEG_COLOR_SPACES[img.mode]
+        else:
+            with metrics.stage("decode"):
+                if img.format == "JPEG":
+                    # Decodes at 1/2, 1/4 or 1/8 scale when that still covers ``size``
+                    img.draft(img.mode, size)
+                img = img.convert(img.mode if img.mode in _JPEG_COLOR_SPACES else "RGB")
+            if img.size != size:
+                with metrics.stage("resample"):
+                    img = img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+            with metrics.stage("encode"):
+                buffer = io.BytesIO()
+                img.save(buffer, "JPEG", quality=quality)
+                jpeg = buffer.getvalue()
+            color_space = _JPEG_COLOR_SPACES[img.mode]
+
+    # Centred; with fill the overflow falls outside the page and is cropped
+    matrix = (display_width, 0, 0, display_height,
+              (target_width - display_width) / 2, (target_height - display_height) / 2)
+    return pdf_backend.image_page(jpeg, size[0], size[1], color_space, target_width, target_height, matrix)
+
+
+def _write_page(page, output):
+    from streaming_writer import StreamingPdfWriter
+    with metrics.stage("write"), atomic_output(output) as output_file, StreamingPdfWriter(output_file) as writer:
+        writer.add_pages([page])
+
+
+def image_to_pdf_page_high_quality(image_path, target_width, target_height, temp_pdf_path, dpi=300, quality=95,
+                                   mode="fit"):
+    """Write a one-page PDF showing an image; see image_page for the parameters."""
+    if temp_pdf_path is None:
+        return image_to_pdf_bytes(image_path, target_width, target_height, dpi, quality, mode)
+    with metrics.operation("image_to_pdf_page_high_quality", [image_path], [temp_pdf_path]) as op:
+        _write_page(image_page(image_path, target_width, target_height, dpi, quality, mode), temp_pdf_path)
+        op.add(pages=1)
+
+
+def image_to_pdf_bytes(image_path, target_width, target_height, dpi=300, quality=95, mode="fit"):
+    """Like image_to_pdf_page_high_quality, but return the PDF in memory."""
+    with metrics.operation("image_to_pdf_bytes", [image_path]) as op:
+        buffer = io.BytesIO()
+        _write_page(image_page(image_path, target_width, target_height, dpi, quality, mode), buffer)
+        op.add(pages=1, bytes_written=buffer.tell())
+        return buffer.getvalue()
+
+
+# =========================
+# PDF Resizing
+# =========================
+class InvalidPageSizeError(PdfEngineError, ValueError):
+    """Raised by parse_page_size; also a ValueError, so argparse reports it as a usage error."""
+
+
+def parse_page_size(value):
+    """Return ``(width, height)`` in points from ``[w, h]``, ``"595x842"`` or ``"a4"``."""
+    parts = value
+    if isinstance(value, str):
+        if value.strip().lower() == "a4":
+            return A4_SIZE
+        parts = value.lower().split("x")
+    try:
+        width, height = (float(n) for n in parts)
+    except (TypeError, ValueError) as e:
+        raise InvalidPageSizeError(f"Invalid page size: {value!r}") from e
+    if not (0 < width < math.inf and 0 < height < math.inf):
+        raise InvalidPageSizeError(f"Invalid page size: {value!r}")
+    return width, height
+
+
+def resize_page(page, target_width, target_height, mode="fit", shared=None):
+    """
+    Resize a page in place so it displays at the target size.
+
+    The visible area is scaled as described in scale_for_mode, centred,
+    by wrapping the existing content streams in one transformation; the
+    content itself is neither parsed nor copied, so fonts and images stay
+    shared between pages. Annotation rectangles are moved to match and a
+    /Rotate is kept, with the target measured on the page as displayed.
+    ``shared`` is passed on to pdf_backend.transform_page.
+    """
+    if page.rotation % 180:
+        target_width, target_height = target_height, target_width
+    box = page.cropbox
+    width, height = float(box.width), float(box.height)
+    scale_x, scale_y = scale_for_mode(width, height, target_width, target_height, mode)
+    offset_x = (target_width - width * scale_x) / 2 - float(box.left) * scale_x
+    offset_y = (target_height - height * scale_y) / 2 - float(box.bottom) * scale_y
+    pdf_backend.transform_page(page, (scale_x, 0, 0, scale_y, offset_x, offset_y), shared)
+    page.mediabox = pdf_backend.rectangle(0, 0, target_width, target_height)
+    # Without these boxes every one defaults to the new media box
+    for box_name in ("/CropBox", "/TrimBox", "/BleedBox", "/ArtBox"):
+        page.pop(box_name, None)
+    return page
+
+
+def resize_pdf(input_pdf, output_pdf, target_size, mode="fit"):
+    """
+    Resize every page of a PDF to ``target_size`` (see resize_page).
+
+    Pages are rewritten in place and streamed to the output, so the result
+    holds the source's own content and resources once each and memory does
+    not grow with the page count.
+    """
+    from streaming_writer import StreamingPdfWriter
+    if output_pdf is None:
+        return _to_bytes(resize_pdf, input_pdf, target_size=target_size, mode=mode)
+    target_width, target_height = target_size
+    with metrics.operation("resize_pdf", [input_pdf], [output_pdf]) as op:
+        with op.stage("parse"):
+            reader = pdf_backend.open_pdf(input_pdf)
+        shared = {}
+        with op.stage("transform"):
+            pages = [resize_page(page, target_width, target_height, mode, shared) for page in reader.pages]
+        with op.stage("write"), atomic_output(output_pdf) as output_file, StreamingPdfWriter(output_file) as writer:
+            writer.add_pages(pages)
+        op.add(pages=len(pages))
+
+
+def resize_pdfs(input_files, output_folder, target_size, workers=None, progress=None, cancel=None, mode="fit",
+                checkpoint=None):
+    """Resize many PDFs in parallel; see run_batch for the result format and ``checkpoint``."""
+    jobs = [(f, batch_output_path(f, output_folder, "_resized"), tuple(target_size), mode) for f in input_files]
+    return run_batch(resize_pdf, jobs, workers, progress, cancel, checkpoint)
+
+
+# =========================
+# PDF Trim White Spaces
+# =========================
+def trim_page(page, trim_top=190, trim_bottom=190):
+    """Cut ``trim_top``/``trim_bottom`` points off a page's media and crop boxes in place."""
+    media_box = page.mediabox
+    lower_left_x = media_box.lower_left[0]
+    lower_left_y = media_box.lower_left[1] + trim_bottom
+    upper_right_x = media_box.upper_right[0]
+    upper_right_y = media_box.upper_right[1] - trim_top
+    new_box = pdf_backend.rectangle(lower_left_x, lower_left_y, upper_right_x, upper_right_y)
+    page.mediabox = new_box
+    page.cropbox = new_box
+    return page
+
+
+def trim_whitespace(input_pdf, output_pdf, trim_top=190, trim_bottom=190):
+    if output_pdf is None:
+        return _to_bytes(trim_whitespace, input_pdf, trim_top=trim_top, trim_bottom=trim_bottom)
+    with metrics.operation("trim_whitespace", [input_pdf], [output_pdf]) as op:
+        with op.stage("parse"):
+            reader = pdf_backend.open_pdf(input_pdf)
+            writer = pdf_backend.new_pdf()
+
+        with op.stage("transform"):
+            for page in reader.pages:
+                writer.add_page(trim_page(page, trim_top, trim_bottom))
+
+        with op.stage("write"):
+            save_pdf(writer, output_pdf)
+        op.add(pages=len(writer.pages))
+
+
+def _content_boxes(input_pdf, start, stop, dpi, threshold):
+    """Return the content box of pages ``start``..``stop`` in rotated page points, or None if blank."""
+    import numpy as np
+    fitz = pdf_backend.pymupdf()
+    boxes = []
+    zoom = dpi / 72
+    with pdf_backend.open_document(input_pdf) as doc:
+        for number in range(start, stop):
+            pix = doc[number].get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+            pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+            ink = pixels < threshold
+            # A row or column needs two dark pixels, so lone specks of scan noise are ignored
+            rows = np.flatnonzero(np.count_nonzero(ink, axis=1) >= 2)
+            columns = np.flatnonzero(np.count_nonzero(ink, axis=0) >= 2)
+            if rows.size == 0 or columns.size == 0:
+                boxes.append(None)
+                continue
+            boxes.append((float(columns[0]) / zoom, float(rows[0]) / zoom,
+                          float(columns[-1] + 1) / zoom, float(rows[-1] + 1) / zoom))
+    return boxes
+
+
+def detect_content_boxes(input_pdf, dpi=36, threshold=245, workers=None):
+    """
+    Find the inked area of every page by rendering it at low resolution.
+
+    Each page is rendered in grayscale at ``dpi`` and the rows and columns
+    holding pixels darker than ``threshold`` are found with NumPy. Pages are
+    rendered in batches on ``workers`` processes (default: CPU count). Returns
+    one ``(left, top, right, bottom)`` box per page, in points from the
+    top-left corner of the page as displayed, or None for a blank page.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    with pdf_backend.open_document(input_pdf) as doc:
+        page_count = doc.page_count
+    workers = min(workers or os.cpu_count() or 1, max(1, page_count // 16))
+    if not pdf_backend.is_path(input_pdf):
+        # Each worker task would get its own pickled copy of the document
+        workers = 1
+    if workers == 1:
+        return _content_boxes(input_pdf, 0, page_count, dpi, threshold)
+    chunk = -(-page_count // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_content_boxes, input_pdf, start, min(start + chunk, page_count), dpi, threshold)
+                   for start in range(0, page_count, chunk)]
+        return [box for future in futures for box in future.result()]
+
+
+def auto_trim_pdf(input_pdf, output_pdf, margin=10, dpi=36, threshold=245, workers=None):
+    """
+    Crop every page to its content plus ``margin`` points on each side.
+
+    Unlike trim_whitespace, the amount removed is measured per page (see
+    detect_content_boxes), so content is never cut. Blank pages are left
+    as they are.
+    """
+    if output_pdf is None:
+        return _to_bytes(auto_trim_pdf, input_pdf, margin=margin, dpi=dpi, threshold=threshold, workers=workers)
+    boxes = detect_content_boxes(input_pdf, dpi, threshold, workers)
+    reader = pdf_backend.open_pdf(input_pdf)
+    writer = pdf_backend.new_pdf()
+
+    for page, box in zip(reader.pages, boxes):
+        writer.add_page(crop_to_content(page, box, margin))
+
+    save_pdf(writer, output_pdf)
+
+
+def crop_to_content(page, box, margin=10):
+    """Crop a page in place to ``box``, as found by detect_content_boxes, plus ``margin`` points."""
+    if box is None:
+        return page
+    crop = page.cropbox
+    x0, y0, x1, y1 = float(crop.left), float(crop.bottom), float(crop.right), float(crop.top)
+    width, height = x1 - x0, y1 - y0
+    left, top, right, bottom = box
+    # Map the box from the displayed page back to unrotated page space
+    rotation = page.rotation % 360
+    if rotation == 90:
+        left, top, right, bottom = top, height - right, bottom, height - left
+    elif rotation == 180:
+        left, top, right, bottom = width - right, height - bottom, width - left, height - top
+    elif rotation == 270:
+        left, top, right, bottom = width - bottom, left, width - top, right
+    new_box = pdf_backend.rectangle(
+        max(x0, x0 + left - margin), max(y0, y1 - bottom - margin),
+        min(x1, x0 + right + margin), min(y1, y1 - top + margin),
+    )
+    page.mediabox = new_box
+    page.cropbox = new_box
+    return page
+
+
+def trim_pdfs(input_files, output_folder, trim_top=190, trim_bottom=190, workers=None, progress=None,
+              cancel=None, auto=False, margin=10, checkpoint=None):
+    """
+    Trim many PDFs in parallel; see run_batch for the result format and ``checkpoint``.
+
+    With ``auto`` each page is cropped to its detected content plus
+    ``margin`` (see auto_trim_pdf) instead of by fixed amounts.
+    """
+    if auto:
+        # Files are already spread over the pool, so each renders its pages in-process
+        jobs = [(f, batch_output_path(f, output_folder, "_trimmed"), margin, 36, 245, 1) for f in input_files]
+        return run_batch(auto_trim_pdf, jobs, workers, progress, cancel, checkpoint)
+    jobs = [(f, batch_output_path(f, output_folder, "_trimmed"), trim_top, trim_bottom) for f in input_files]
+    return run_batch(trim_whitespace, jobs, workers, progress, cancel, checkpoint)
+
+
+# =========================
+# Remove Specific Pages & Resize
+# =========================
+_SELECTION_TERM = re.compile(r"^(?P<start>-?\d+)(?P<dash>-(?P<end>-?\d+)?)?(?::(?P<parity>odd|even))?$")
+
+
+def parse_page_selection(expression, page_count):
+    """
+    Compile a 1-based page selection into a sorted list of 0-based indices.
+
+    Terms are comma separated: ``7``, ``1-3``, ``10-`` (to the end),
+    negative numbers counting from the end (``-1`` is the last page, so
+    ``-3--1`` is the last three), ``odd``, ``even`` and ``all``. A range
+    may end in ``:odd`` or ``:even``, e.g. ``1-20:odd``.
+    """
+    def page_number(text):
+        number = int(text)
+        if number < 0:
+            number += page_count + 1
+        if not 1 <= number <= page_count:
+            raise PdfEngineError(f"Page {text} is outside the document's {page_count} pages.")
+        return number
+
+    selected = set()
+    for term in (part.strip().lower() for part in str(expression).split(",")):
+        if term in ("all", "odd", "even"):
+            start, end, parity = 1, page_count, None if term == "all" else term
+        else:
+            match = _SELECTION_TERM.match(term.replace(" ", ""))
+            if not match:
+                raise PdfEngineError(f"Invalid page selection: {term!r}")
+            start = page_number(match["start"])
+            if match["dash"]:
+                end = page_number(match["end"]) if match["end"] else page_count
+            else:
+                end = start
+            parity = match["parity"]
+            if start > end:
+                raise PdfEngineError(f"Invalid page range: {term!r}")
+        step = 1 if parity is None else 2
+        if parity is not None and (start % 2 == 1) != (parity == "odd"):
+            start += 1
+        selected.update(range(start - 1, end, step))
+    return sorted(selected)
+
+
+def selection_indices(selection, page_count):
+    """Return sorted 0-based indices for a selection expression or an iterable of indices."""
+    if isinstance(selection, str):
+        return parse_page_selection(selection, page_count)
+    return sorted(set(selection))
+
+
+def _copy_pages(input_pdf, output_pdf, keep, resize_pages_to=None):
+    def copy(reader):
+        writer = pdf_backend.new_pdf()
+        for _, page in pdf_backend.iter_pages(reader, keep(pdf_backend.page_count(reader))):
+            if resize_pages_to:
+                width, height = resize_pages_to
+                page.mediabox = pdf_backend.rectangle(0, 0, width, height)
+            writer.add_page(page)
+        with atomic_output(output_pdf) as output_file:
+            writer.write(output_file)
+
+    pdf_backend.with_reader(input_pdf, copy)
+
+
+def remove_and_resize_pages(input_pdf, output_pdf, remove_pages, resize_pages_to=None):
+    """
+    Copy every page except ``remove_pages`` to ``output_pdf``.
+
+    ``remove_pages`` is a selection expression (see parse_page_selection)
+    or an iterable of 0-based indices. Only the kept pages are parsed.
+    """
+    if output_pdf is None:
+        return _to_bytes(remove_and_resize_pages, input_pdf, remove_pages=remove_pages,
+                         resize_pages_to=resize_pages_to)
+
+    def keep(page_count):
+        removed = set(selection_indices(remove_pages, page_count))
+        return [n for n in range(page_count) if n not in removed]
+
+    _copy_pages(input_pdf, output_pdf, keep, resize_pages_to)
+
+
+def extract_pages(input_pdf, output_pdf, selection, resize_pages_to=None):
+    """Copy only the pages in ``selection`` to ``output_pdf``, in document order."""
+    if output_pdf is None:
+        return _to_bytes(extract_pages, input_pdf, selection=selection, resize_pages_to=resize_pages_to)
+    _copy_pages(input_pdf, output_pdf, lambda page_count: selection_indices(selection, page_count), resize_pages_to)
+
+
+# =========================
+# Merge PDFs and Images with Consistent Page Layout
+# =========================
+def get_target_dimensions():
+    # A4 size in points: ~8.27 x 11.69 inches at 72 dpi
+    target_width = 595.276
+    target_height = 841.890
+    return target_width, target_height
+
+
+def normalize_page(page, target_width, target_height):
+    """Set a page's mediabox to the target size in place."""
+    page.mediabox.lower_left = (0, 0)
+    page.mediabox.upper_right = (target_width, target_height)
+    return page
+
+
+def pdf_to_pdf_page(pdf_path, target_width, target_height, temp_pdf_path):
+    if temp_pdf_path is None:
+        buffer = io.BytesIO()
+        pdf_to_pdf_page(pdf_path, target_width, target_height, buffer)
+        return buffer.getvalue()
+    with metrics.operation("pdf_to_pdf_page", [pdf_path], [temp_pdf_path]) as op:
+        with op.stage("parse"):
+            reader = pdf_backend.open_pdf(pdf_path)
+            writer = pdf_backend.new_pdf()
+
+        with op.stage("transform"):
+            for page in reader.pages:
+                writer.add_page(normalize_page(page, target_width, target_height))
+
+        with op.stage("write"):
+            save_pdf(writer, temp_pdf_path)
+        op.add(pages=len(writer.pages))
+
+
+def is_pdf(source):
+    """Tell PDFs from images: by extension for paths, by the %PDF header for anything else."""
+    if pdf_backend.is_path(source):
+        return os.fspath(source).lower().endswith(".pdf")
+    return b"%PDF-" in pdf_backend.header(source)
+
+
+def source_key(source):
+    """Key ``source`` in a dict: paths by value, in-memory sources (often unhashable) by identity."""
+    return source if pdf_backend.is_path(source) else id(source)
+
+
+class ImageConversions:
+    """
+    Render the images of a merge to single-page PDFs on a process pool.
+
+    Conversions run at most ``window`` images ahead of the one being
+    merged, and take() hands each result over and drops it once no later
+    input needs it, so memory holds a few converted images however many
+    the merge has. ``workers`` defaults to the CPU count; with one worker
+    (or one image) conversion runs in-process, as each image is taken.
+    With a ConversionCache, previously converted images are not
+    re-rendered. Use it as a context manager so the pool is shut down.
+    """
+
+    def __init__(self, image_paths, target_width, target_height, workers=None, cache=None, window=None):
+        self.target_width = target_width
+        self.target_height = target_height
+        self.cache = cache
+        self._sources = {}
+        self._order = []
+        self._uses = {}
+        for source in image_paths:
+            key = source_key(source)
+            self._sources[key] = source
+            self._order.append(key)
+            self._uses[key] = self._uses.get(key, 0) + 1
+        workers = workers or os.cpu_count() or 1
+        self.window = window or 2 * workers
+        self._executor = None
+        if workers > 1 and len(self._sources) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        # Submitted futures, cached bytes or errors, by source key
+        self._held = {}
+        self._keys = {}
+        self._next = 0
+
+    def __enter__(self):
+        self._fill()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._held.clear()
+
+    def _start(self, key):
+        if key in self._held:
+            return
+        source = self._sources[key]
+        if self.cache is not None:
+            try:
+                self._keys[key] = self.cache.key(source, "image-page", target_width=self.target_width,
+                                                 target_height=self.target_height, dpi=300, quality=95,
+                                                 placement="transform")
+            except OSError as e:
+                self._held[key] = e
+                return
+            data = self.cache.get(self._keys[key])
+            if data is not None:
+                self._held[key] = data
+                return
+        if self._executor is None:
+            self._held[key] = None
+            return
+        # Buffers and file objects cannot be pickled, so workers get bytes
+        self._held[key] = self._executor.submit(
+            image_to_pdf_bytes, source if pdf_backend.is_path(source) else pdf_backend.read_bytes(source),
+            self.target_width, self.target_height,
+        )
+
+    def _fill(self):
+        while self._next < len(self._order) and len(self._held) < self.window:
+            self._start(self._order[self._next])
+            self._next += 1
+
+    def take(self, source):
+        """Return the PDF bytes of image ``source``, or the exception raised while converting it."""
+        key = source_key(source)
+        self._start(key)
+        result = self._held[key]
+        fresh = not isinstance(result, (bytes, Exception))
+        try:
+            if result is None:
+                result = image_to_pdf_bytes(source, self.target_width, self.target_height)
+            elif fresh:
+                result = result.result()
+        except Exception as e:
+            result = e
+        if fresh and self.cache is not None and isinstance(result, bytes):
+            self.cache.put(self._keys[key], result)
+        self._uses[key] -= 1
+        if self._uses[key]:
+            self._held[key] = result
+        else:
+            del self._held[key]
+        self._fill()
+        return result
+
+
+def load_normalized_pages(path, target_width, target_height, image_pdf=None):
+    """
+    Return the pages of a PDF or image, normalized to the target size.
+
+    PDF pages come straight from the source reader and images are rendered
+    to an in-memory PDF, so nothing is written to disk. ``image_pdf`` may
+    hold the image's already converted PDF bytes.
+    """
+    if is_pdf(path):
+        reader = pdf_backend.open_pdf(path)
+        return [normalize_page(page, target_width, target_height) for page in reader.pages]
+    if image_pdf is None:
+        image_pdf = image_to_pdf_bytes(path, target_width, target_height)
+    return list(pdf_backend.open_pdf(io.BytesIO(image_pdf)).pages)
+
+
+def merge_files(file_list, output_file, workers=None, streaming=False, cache=None, progress=None, cancel=None,
+                optimize=False, stats=None, checkpoint=None, validate=False, outline=False, split_pages=None,
+                split_bytes=None, page_map=None):
+    """
+    Merge PDFs and images into one PDF with consistent page dimensions.
+
+    Images are converted on a pool of ``workers`` processes, a few ahead
+    of the input being merged (see ImageConversions), and assembled in
+    ``file_list`` order. With ``streaming`` each input is written out as
+    soon as it is loaded, so peak memory is bounded by the largest input
+    rather than the whole job. ``cache`` is an optional
+    ConversionCache for converted images. Inputs that fail to convert
+    are skipped; they are returned as a list of ``(path, exception)``
+    tuples so the caller decides how to report them. Inputs may also be
+    in memory (see the module docstring); PDF inputs are read in place.
+
+    ``progress(done, total, path)`` is called as each input is started and
+    once more before the output is written. Setting ``cancel`` stops the
+    merge with JobCancelled; the output is written atomically, so an
+    existing file at ``output_file`` is left untouched.
+
+    ``optimize`` deduplicates identical streams across inputs and
+    compresses unfiltered ones while writing (this implies ``streaming``);
+    the savings are added to the ``stats`` dict when one is given.
+
+    With a checkpoint.Checkpoint (or the path of its manifest) the merge
+    is skipped when it already produced ``output_file`` from the same
+    inputs, unchanged, and is recorded when every input made it in. Give
+    a ``cache`` too so that a merge interrupted halfway reuses the images
+    it had converted.
+
+    With ``validate`` every input is checked first (see validate_inputs)
+    and InvalidInputsError is raised, before anything is converted or
+    written, if any of them cannot be merged.
+
+    In the same pass, ``outline`` adds a bookmark for each input's first
+    page, ``split_pages`` and/or ``split_bytes`` also write the result as
+    parts of limited size next to ``output_file``, and ``page_map`` (a
+    path or binary file object) receives a JSON map of which pages came
+    from which input and went to which part; see merge_outputs.
+    """
+    from merge_outputs import MergeOutputs
+    if not file_list:
+        raise PdfEngineError("No files selected.")
+    if pdf_backend.is_path(checkpoint):
+        from checkpoint import Checkpoint
+        with Checkpoint(checkpoint) as opened:
+            return merge_files(file_list, output_file, workers, streaming, cache, progress, cancel, optimize,
+                               stats, opened, validate, outline, split_pages, split_bytes, page_map)
+    params = (f"merge_files(streaming={streaming}, optimize={optimize}, outline={outline}, "
+              f"split_pages={split_pages}, split_bytes={split_bytes}, page_map={page_map!r})")
+    if checkpoint is not None and checkpoint.is_done(file_list, output_file, params):
+        return []
+    snapshot = None
+    if checkpoint is not None:
+        remove_partial_outputs(output_file)
+        snapshot = checkpoint.snapshot(file_list)
+    if validate:
+        check_inputs(file_list, workers, cancel)
+
+    target_width, target_height = get_target_dimensions()
+    check_cancelled(cancel)
+    with metrics.operation("merge_files", file_list, [output_file]) as op:
+        failures = []
+        images = ImageConversions([f for f in file_list if not is_pdf(f)], target_width, target_height,
+                                  workers, cache)
+        with images, MergeOutputs(output_file, streaming, optimize, outline, split_pages, split_bytes,
+                                  page_map) as outputs:
+            for done, f in enumerate(file_list):
+                check_cancelled(cancel)
+                if progress:
+                    progress(done, len(file_list), f)
+                try:
+                    image_pdf = None
+                    if not is_pdf(f):
+                        with op.stage("convert_images"):
+                            image_pdf = images.take(f)
+                        if isinstance(image_pdf, Exception):
+                            raise image_pdf
+                    # Load every page before adding any so a bad file adds nothing
+                    with op.stage("load"):
+                        pages = load_normalized_pages(f, target_width, target_height, image_pdf)
+                except Exception as e:
+                    failures.append((f, e))
+                    outputs.fail(f, e)
+                    continue
+                op.add(pages=len(pages))
+                with op.stage("write" if outputs.streaming else "assemble"):
+                    outputs.add(f, pages)
+                if outputs.streaming and pages:
+                    # Written already; free the source now, not at the next full GC
+                    pdf_backend.close_pdf(pages[0].pdf)
+
+            check_cancelled(cancel)
+            if progress:
+                progress(len(file_list), len(file_list), output_file)
+            with op.stage("write"):
+                outputs.close()
+        op.add(failed_inputs=len(failures))
+        if outputs.parts:
+            op.add(parts=len(outputs.parts))
+
+    if checkpoint is not None and not failures:
+        checkpoint.record(snapshot, output_file, params)
+    if optimize and stats is not None:
+        stats.update(outputs.writer.stats, bytes_saved=outputs.writer.bytes_saved)
+    return failures
+
+
+def merge_pdfs(pdf_list, output_file, streaming=False, progress=None, cancel=None, optimize=False, stats=None,
+               validate=False, outline=False, split_pages=None, split_bytes=None, page_map=None):
+    """
+    Concatenate PDFs without changing their layout.
+
+    By default the sources (and their outlines) are appended to one output
+    document that is written at the end; ``streaming`` writes each PDF out
+    as soon as it is read instead, keeping memory bounded by the largest
+    input. Missing files are skipped and returned so the caller can report
+    them. ``progress``, ``cancel``, ``optimize``, ``stats``, ``validate``,
+    ``outline``, ``split_pages``, ``split_bytes`` and ``page_map`` behave
+    as in merge_files; with ``outline`` the sources' own outlines are kept
+    under their new items, except when streaming.
+    """
+    from merge_outputs import MergeOutputs
+    if not pdf_list:
+        raise PdfEngineError("No PDFs selected.")
+    if validate:
+        check_inputs(pdf_list, cancel=cancel)
+
+    missing = []
+    with metrics.operation("merge_pdfs", pdf_list, [output_file]) as op, \
+            MergeOutputs(output_file, streaming, optimize, outline, split_pages, split_bytes, page_map) as outputs:
+        for done, pdf in enumerate(pdf_list):
+            check_cancelled(cancel)
+            if progress:
+                progress(done, len(pdf_list), pdf)
+            try:
+                with op.stage("parse"):
+                    reader = pdf_backend.open_pdf(pdf)
+            except FileNotFoundError as e:
+                missing.append(pdf)
+                outputs.fail(pdf, e)
+                continue
+            op.add(pages=pdf_backend.page_count(reader))
+            with op.stage("write" if outputs.streaming else "assemble"):
+                outputs.add(pdf, reader.pages, reader)
+            if outputs.streaming:
+                # Written already; free the source now, not at the next full GC
+                pdf_backend.close_pdf(reader)
+
+        check_cancelled(cancel)
+        if progress:
+            progress(len(pdf_list), len(pdf_list), output_file)
+        with op.stage("write"):
+            outputs.close()
+        if outputs.parts:
+            op.add(parts=len(outputs.parts))
+
+    if optimize and stats is not None:
+        stats.update(outputs.writer.stats, bytes_saved=outputs.writer.bytes_saved)
+    return missing
+
+
+# =========================
+# Pre-flight Validation
+# =========================
+@dataclass
+class InputInfo:
+    """
+    What validate_inputs found out about one merge input.
+
+    ``page_sizes`` holds the (width, height) of each PDF page in points, as
+    displayed; ``image_size`` is an image's size in pixels. ``error`` is None
+    when the input can be merged.
+    """
+    source: object
+    kind: str = "pdf"
+    file_size: int = 0
+    pages: int = 0
+    page_sizes: list = field(default_factory=list)
+    image_size: tuple = None
+    encrypted: bool = False
+    error: Exception = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def describe(self):
+        """One line for a list of inputs, e.g. ``scan.pdf - 12 pages, 595x842 pt, 1.3 MB``."""
+        name = os.path.basename(os.fspath(self.source)) if pdf_backend.is_path(self.source) else "(in memory)"
+        if self.error is not None:
+            return f"{name} - ERROR: {self.error or type(self.error).__name__}"
+        if self.kind == "image":
+            parts = [f"image, {self.image_size[0]}x{self.image_size[1]} px"]
+        else:
+            parts = [f"{self.pages} page{'s' if self.pages != 1 else ''}"]
+            sizes = set(self.page_sizes)
+            if len(sizes) == 1:
+                width, height = sizes.pop()
+                parts.append(f"{width:.0f}x{height:.0f} pt")
+            elif sizes:
+                parts.append("mixed page sizes")
+            if self.encrypted:
+                parts.append("encrypted")
+        parts.append(f"{self.file_size / (1024 * 1024):.1f} MB")
+        return f"{name} - {', '.join(parts)}"
+
+
+class InvalidInputsError(PdfEngineError):
+    """Raised before a merge starts when validate_inputs found inputs that cannot be merged."""
+
+    def __init__(self, infos):
+        self.infos = infos
+        super().__init__(f"{len(infos)} of the inputs cannot be merged:\n"
+                         + "\n".join(info.describe() for info in infos))
+
+
+def _inspect_pdf(reader, info):
+    from pypdf.errors import FileNotDecryptedError
+    info.encrypted = reader.is_encrypted
+    try:
+        info.pages = pdf_backend.page_count(reader)
+        try:
+            pages = [page for _, page in pdf_backend.iter_pages(reader, range(info.pages))]
+        except (IndexError, ValueError):
+            # /Count disagrees with the tree; count the pages the way a merge reads them
+            pages = list(reader.pages)
+            info.pages = len(pages)
+    except FileNotDecryptedError:
+        raise PdfEngineError("Encrypted with a password.") from None
+    sizes = []
+    for page in pages:
+        box = page.cropbox
+        width, height = float(box.width), float(box.height)
+        sizes.append((height, width) if page.rotation % 180 else (width, height))
+    info.page_sizes = sizes
+
+
+def inspect_input(source):
+    """
+    Return an InputInfo for one PDF or image, reading as little of it as possible.
+
+    For a PDF only the trailer, xref table and page tree are parsed, never
+    page contents; for an image only its header. Errors are recorded in the
+    InputInfo rather than raised.
+    """
+    info = InputInfo(source, "pdf" if is_pdf(source) else "image")
+    position = source.tell() if hasattr(source, "tell") and not pdf_backend.is_path(source) else None
+    try:
+        if pdf_backend.is_path(source):
+            info.file_size = os.path.getsize(source)
+        else:
+            try:
+                info.file_size = memoryview(source).nbytes
+            except TypeError:
+                info.file_size = source.seek(0, io.SEEK_END)
+        if info.kind == "pdf":
+            from pypdf.errors import PyPdfError
+            try:
+                pdf_backend.with_reader(source, lambda reader: _inspect_pdf(reader, info))
+            except PyPdfError as e:
+                raise PdfEngineError(f"Damaged or not a PDF ({e}).") from e
+        else:
+            from PIL import Image
+            with Image.open(pdf_backend.as_stream(source)) as img:
+                info.image_size = img.size
+            info.pages = 1
+    except Exception as e:
+        info.error = e
+    finally:
+        if position is not None:
+            source.seek(position)
+    return info
+
+
+def _inspect_inputs(sources):
+    return [inspect_input(source) for source in sources]
+
+
+def validate_inputs(sources, workers=None, progress=None, cancel=None):
+    """
+    Check every merge input concurrently and return their InputInfos, in order.
+
+    See inspect_input for what is read; a thousand-file job is checked in
+    seconds. Paths are checked in chunks on a pool of ``workers``
+    processes (default: CPU count); in-memory sources are checked in this
+    process. ``progress(done, total, info)`` is called as inputs are
+    checked, and setting ``cancel`` raises JobCancelled.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    sources = list(sources)
+    infos = [None] * len(sources)
+    workers = workers or os.cpu_count() or 1
+    done = 0
+
+    def finish(index, info):
+        nonlocal done
+        infos[index] = info
+        done += 1
+        if progress:
+            progress(done, len(sources), info)
+
+    with metrics.operation("validate_inputs", sources) as op:
+        paths = [index for index, source in enumerate(sources) if pdf_backend.is_path(source)]
+        for index, source in enumerate(sources):
+            if not pdf_backend.is_path(source):
+                check_cancelled(cancel)
+                finish(index, inspect_input(source))
+
+        if workers == 1 or len(paths) < 2:
+            for index in paths:
+                check_cancelled(cancel)
+                finish(index, inspect_input(sources[index]))
+        else:
+            # Small chunks keep every worker busy without a round trip per file
+            size = max(1, min(64, len(paths) // (workers * 4)))
+            chunks = [paths[start:start + size] for start in range(0, len(paths), size)]
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                futures = {
+                    executor.submit(_inspect_inputs, [sources[index] for index in chunk]): chunk for chunk in chunks
+                }
+                try:
+                    for future in as_completed(futures):
+                        for index, info in zip(futures[future], future.result()):
+                            finish(index, info)
+                        check_cancelled(cancel)
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        op.add(pages=sum(info.pages for info in infos), invalid_inputs=sum(not info.ok for info in infos))
+    return infos
+
+
+def page_offsets(infos):
+    """
+    Plan a merge from validate_inputs' results.
+
+    Returns the 0-based output page each input starts on (None for inputs
+    that cannot be merged) and the total page count.
+    """
+    offsets = []
+    total = 0
+    for info in infos:
+        offsets.append(total if info.ok else None)
+        if info.ok:
+            total += info.pages
+    return offsets, total
+
+
+def check_inputs(sources, workers=None, cancel=None):
+    """Validate ``sources`` and raise InvalidInputsError if any cannot be merged."""
+    invalid = [info for info in validate_inputs(sources, workers, cancel=cancel) if not info.ok]
+    if invalid:
+        raise InvalidInputsError(invalid)
+
+
+# =========================
+# Rotate PDFs
+# =========================
+def rotate_pdf(input_pdf, output_pdf, rotation_angle):
+    """
+    Rotate all pages in a PDF by the specified angle.
+
+    Parameters:
+    - input_pdf: Path to the input PDF file.
+    - output_pdf: Path to save the rotated PDF.
+    - rotation_angle: Angle to rotate pages (90 for right, -90 for left).
+    """
+    if output_pdf is None:
+        return _to_bytes(rotate_pdf, input_pdf, rotation_angle=rotation_angle)
+    with metrics.operation("rotate_pdf", [input_pdf], [output_pdf]) as op:
+        with op.stage("parse"):
+            reader = pdf_backend.open_pdf(input_pdf)
+            writer = pdf_backend.new_pdf()
+
+        with op.stage("transform"):
+            for page in reader.pages:
+                # Rotate the page by the specified angle
+                page.rotate(rotation_angle)
+                writer.add_page(page)
+
+        with op.stage("write"):
+            save_pdf(writer, output_pdf)
+        op.add(pages=len(writer.pages))
+
+
+# =========================
+# Command Line Interface
+# =========================
+def _byte_size(value):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmg]?)i?b?", value.strip().lower())
+    if not match:
+        raise ValueError(value)
+    return int(float(match.group(1)) * 1024 ** " kmg".index(match.group(2) or " "))
+
+
+def _add_merge_output_arguments(parser):
+    parser.add_argument("--outline", action="store_true", help="Add a bookmark for the first page of each input.")
+    parser.add_argument("--split-pages", type=int, metavar="N",
+                        help="Also write the result as parts of at most N pages (OUTPUT_part001.pdf, ...).")
+    parser.add_argument("--split-size", type=_byte_size, metavar="SIZE",
+                        help="Also write the result as parts of at most SIZE bytes, e.g. 10M.")
+    parser.add_argument("--page-map", metavar="FILE",
+                        help="Write a JSON map of the pages each input and part holds to FILE.")
+
+
+def _add_cache_arguments(parser):
+    parser.add_argument("--cache-dir", help="Reuse conversions cached in this directory.")
+    parser.add_argument("--cache-size", type=int, default=512, help="Cache size limit in MB (default: 512).")
+
+
+def _open_cache(args):
+    if not args.cache_dir:
+        return None
+    from conversion_cache import ConversionCache
+    return ConversionCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+
+def _add_checkpoint_argument(parser):
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="Record finished work in FILE and skip it when run again with unchanged inputs.")
+
+
+def _add_validate_argument(parser):
+    parser.add_argument("--validate", action="store_true",
+                        help="Check every input first and stop before writing anything if one is unusable.")
+
+
+def _print_index(infos, as_json):
+    offsets, total = page_offsets(infos)
+    for info, offset in zip(infos, offsets):
+        if as_json:
+            import json
+            print(json.dumps({
+                "source": os.fspath(info.source), "kind": info.kind, "file_size": info.file_size,
+                "pages": info.pages, "first_page": offset, "page_sizes": info.page_sizes,
+                "image_size": info.image_size, "encrypted": info.encrypted,
+                "error": None if info.ok else str(info.error) or type(info.error).__name__,
+            }))
+        elif info.ok:
+            print(info.describe())
+    if not as_json:
+        size = sum(info.file_size for info in infos) / (1024 * 1024)
+        print(f"{len(infos)} inputs, {total} pages, {size:.1f} MB.")
+
+
+def _print_skipped(results):
+    skipped = sum(r.skipped for r in results)
+    if skipped:
+        print(f"Skipped {skipped} of {len(results)} files already done.")
+
+
+def _print_optimize_stats(stats):
+    if stats:
+        print(f"Optimized: {stats['streams_deduplicated']} duplicate streams shared, "
+              f"{stats['streams_compressed']} streams compressed, {stats['bytes_saved']} bytes saved.")
+
+
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(description="Headless PDF & ODT utility.")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="Append per-operation timings, sizes and peak memory to FILE as JSON lines.")
+    parser.add_argument("--profile-dir", metavar="DIR", help="Save a cProfile dump of each operation in DIR.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("odt", help="Convert ODT files (or directories of them) to PDF with LibreOffice.")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("-o", "--output-dir", help="Folder for the PDFs (default: next to each ODT).")
+    p.add_argument("--libreoffice", default="libreoffice", help="LibreOffice command to run.")
+    p.add_argument("--instances", type=int, default=2, help="LibreOffice instances run in parallel.")
+    p.add_argument("--timeout", type=int, default=120, help="Seconds allowed per file.")
+    _add_cache_arguments(p)
+
+    p = sub.add_parser("image", help="Convert an image to a single high-quality PDF page.")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--size", type=parse_page_size, default=A4_SIZE, help="Page size in points, e.g. 595x842.")
+    p.add_argument("--dpi", type=int, default=300,
+                   help="Most pixels per inch kept; JPEGs within it are embedded without re-encoding.")
+    p.add_argument("--quality", type=int, default=95, help="JPEG quality for images that are re-encoded.")
+    p.add_argument("--mode", choices=RESIZE_MODES, default="fit", help="How the image is sized to the page.")
+
+    p = sub.add_parser("resize", help="Resize PDFs to a target page size.")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("-o", "--output-dir", required=True)
+    p.add_argument("--size", type=parse_page_size, default=A4_SIZE, help="Page size in points, e.g. 595x842.")
+    p.add_argument("--mode", choices=RESIZE_MODES, default="fit",
+                   help="fit keeps all content, fill covers the page and crops, stretch distorts.")
+    p.add_argument("--workers", type=int, default=None, help="Parallel jobs (default: CPU count).")
+    _add_checkpoint_argument(p)
+
+    p = sub.add_parser("trim", help="Trim white space from the top and bottom of PDF pages.")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("-o", "--output-dir", required=True)
+    p.add_argument("--top", type=int, default=190)
+    p.add_argument("--bottom", type=int, default=190)
+    p.add_argument("--auto", action="store_true",
+                   help="Crop each page to its detected content instead of --top/--bottom.")
+    p.add_argument("--margin", type=float, default=10, help="Points kept around detected content with --auto.")
+    p.add_argument("--workers", type=int, default=None, help="Parallel jobs (default: CPU count).")
+    _add_checkpoint_argument(p)
+
+    p = sub.add_parser("remove", help="Remove pages and optionally resize to A4.")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--pages", required=True, help="1-based pages to remove, e.g. 9-25 or 1-3,7,10-,even.")
+    p.add_argument("--resize-a4", action="store_true")
+
+    p = sub.add_parser("extract", help="Copy selected pages to a new PDF.")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--pages", required=True, help="1-based pages to keep, e.g. 1-3,7,-2-,1-20:odd.")
+    p.add_argument("--resize-a4", action="store_true")
+
+    p = sub.add_parser("pipeline", help="Run a multi-step JSON/YAML pipeline, writing the output once.")
+    p.add_argument("spec")
+    p.add_argument("inputs", nargs="*", help="Inputs to use instead of the spec's.")
+    p.add_argument("-o", "--output", help="Output to use instead of the spec's.")
+
+    p = sub.add_parser("merge", help="Merge PDFs and images with a consistent A4 layout.")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--workers", type=int, default=None,
+                   help="Processes used to convert images (default: CPU count).")
+    p.add_argument("--streaming", action="store_true",
+                   help="Write each input as it is read to bound memory use.")
+    p.add_argument("--optimize", action="store_true",
+                   help="Share identical streams across inputs and compress unfiltered ones.")
+    _add_validate_argument(p)
+    _add_merge_output_arguments(p)
+    _add_cache_arguments(p)
+    _add_checkpoint_argument(p)
+
+    p = sub.add_parser("merge-pdfs", help="Concatenate PDFs without changing their layout.")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--streaming", action="store_true",
+                   help="Write each input as it is read to bound memory use.")
+    p.add_argument("--optimize", action="store_true",
+                   help="Share identical streams across inputs and compress unfiltered ones.")
+    _add_validate_argument(p)
+    _add_merge_output_arguments(p)
+
+    p = sub.add_parser("validate", help="Check merge inputs and list their page counts, sizes and errors.")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("--workers", type=int, default=None, help="Parallel processes (default: CPU count).")
+    p.add_argument("--json", action="store_true", help="Print one JSON object per input.")
+
+    p = sub.add_parser("rotate", help="Rotate all pages of a PDF.")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--angle", type=int, default=90, help="90 for right, -90 for left.")
+
+    p = sub.add_parser("metrics", help="Convert a --metrics file to the Prometheus text format.")
+    p.add_argument("events")
+    p.add_argument("-o", "--output", help="File to write (atomically) instead of printing.")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    errors = []
+    if args.metrics or args.profile_dir:
+        metrics.enable(args.metrics, args.profile_dir)
+
+    try:
+        if args.command == "odt":
+            from odt_converter import OdtBatchConverter
+            odt_files = []
+            for path in args.inputs:
+                if os.path.isdir(path):
+                    odt_files.extend(sorted(
+                        os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".odt")
+                    ))
+                else:
+                    odt_files.append(path)
+            with OdtBatchConverter(args.libreoffice, args.instances, timeout=args.timeout,
+                                   cache=_open_cache(args)) as converter:
+                results = converter.convert(odt_files, args.output_dir)
+            for r in results:
+                if r.ok:
+                    print(r.output_file)
+            errors = [(r.input_file, r.error) for r in results if not r.ok]
+        elif args.command == "image":
+            image_to_pdf_page_high_quality(args.input, args.size[0], args.size[1], args.output, dpi=args.dpi,
+                                           quality=args.quality, mode=args.mode)
+        elif args.command == "resize":
+            os.makedirs(args.output_dir, exist_ok=True)
+            results = resize_pdfs(args.inputs, args.output_dir, args.size, args.workers, mode=args.mode,
+                                  checkpoint=args.checkpoint)
+            _print_skipped(results)
+            errors = [(r.input_file, r.error) for r in results if not r.ok]
+        elif args.command == "trim":
+            os.makedirs(args.output_dir, exist_ok=True)
+            results = trim_pdfs(args.inputs, args.output_dir, args.top, args.bottom, args.workers,
+                                auto=args.auto, margin=args.margin, checkpoint=args.checkpoint)
+            _print_skipped(results)
+            errors = [(r.input_file, r.error) for r in results if not r.ok]
+        elif args.command == "remove":
+            remove_and_resize_pages(args.input, args.output, args.pages, A4_SIZE if args.resize_a4 else None)
+        elif args.command == "extract":
+            extract_pages(args.input, args.output, args.pages, A4_SIZE if args.resize_a4 else None)
+        elif args.command == "pipeline":
+            from pipeline import load_pipeline
+            pipe, spec = load_pipeline(args.spec)
+            if args.inputs:
+                pipe.inputs = args.inputs
+            output = args.output or spec.get("output")
+            if not output:
+                raise PdfEngineError("No output given in the spec or with -o.")
+            stats = {}
+            errors = pipe.run(output, stats=stats)
+            _print_optimize_stats(stats)
+        elif args.command == "merge":
+            stats = {}
+            errors = merge_files(args.inputs, args.output, workers=args.workers, streaming=args.streaming,
+                                 cache=_open_cache(args), optimize=args.optimize, stats=stats,
+                                 checkpoint=args.checkpoint, validate=args.validate, outline=args.outline,
+                                 split_pages=args.split_pages, split_bytes=args.split_size, page_map=args.page_map)
+            _print_optimize_stats(stats)
+        elif args.command == "merge-pdfs":
+            stats = {}
+            missing = merge_pdfs(args.inputs, args.output, args.streaming, optimize=args.optimize, stats=stats,
+                                 validate=args.validate, outline=args.outline, split_pages=args.split_pages,
+                                 split_bytes=args.split_size, page_map=args.page_map)
+            errors = [(pdf, "not found") for pdf in missing]
+            _print_optimize_stats(stats)
+        elif args.command == "rotate":
+            rotate_pdf(args.input, args.output, args.angle)
+        elif args.command == "validate":
+            infos = validate_inputs(args.inputs, args.workers)
+            _print_index(infos, args.json)
+            errors = [(info.source, info.error) for info in infos if not info.ok]
+        elif args.command == "metrics":
+            if args.output:
+                metrics.write_prometheus(metrics.read_events(args.events), args.output)
+            else:
+                print(metrics.prometheus_text(metrics.read_events(args.events)), end="")
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    for path, error in errors:
+        print(f"Error: {path}: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
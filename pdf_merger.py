@@ -1,6 +1,7 @@
 from tkinter import Tk
 from tkinter.filedialog import askopenfilenames
-from PyPDF2 import PdfMerger
+
+from pdf_engine import merge_pdfs
 
 # Create a Tkinter root window (hidden)
 root = Tk()
@@ -16,20 +17,13 @@ pdfs = list(pdf_files)
 if not pdfs:
     print("No files selected. Exiting.")
 else:
-    # Create the PdfMerger object
-    merger = PdfMerger()
-
-    # Append the PDFs to the merger
-    for pdf in pdfs:
-        merger.append(pdf)
-
     # Prompt the user for the output filename
     output_filename = input("Enter the filename for the merged PDF: ")
 
-    # Write the merged PDF to a new file
-    merger.write(output_filename)
-
-    # Close the PdfMerger object
-    merger.close()
+    # Merge the PDFs into the new file
+    missing = merge_pdfs(pdfs, output_filename)
+    for pdf in missing:
+        print(f"File {pdf} not found. Skipped.")
 
-    print(f"PDFs merged successfully into {output_filename}.")
+    if not missing:
+        print(f"PDFs merged successfully into {output_filename}.")
@@ -0,0 +1,219 @@
+"""
+Multi-step jobs that read every input once and write the output once.
+
+Chaining the single-purpose engine functions (remove pages, then trim,
+then rotate, then resize, then merge) parses and serializes the whole
+document at every step. A Pipeline instead holds each input's pages in
+memory, applies every step to them and streams the result into a single
+output file, so intermediate documents are never written.
+
+Pipelines are built in Python:
+
+    Pipeline(["scan.pdf", "logo.png"]).remove("1-2").trim(190, 190).rotate(90).resize().run("out.pdf")
+
+or loaded from a JSON (or, with PyYAML installed, YAML) spec:
+
+    {
+        "inputs": ["scan.pdf", "logo.png"],
+        "output": "out.pdf",
+        "optimize": false,
+        "steps": [
+            {"remove": "1-2"},
+            {"trim": {"top": 190, "bottom": 190}},
+            {"rotate": 90},
+            {"resize": {"size": "595x842", "mode": "fit"}}
+        ]
+    }
+
+Steps apply to each input separately (page selections count from each
+input's first page) and the results are concatenated, images first being
+rendered to A4 pages as in merge_files. ``select`` and ``remove`` are
+resolved before any page is loaded, so pages that are dropped are never
+parsed. ``autotrim`` finds each page's content by rendering the pages as
+the earlier steps left them, from a copy held in memory.
+"""
+import io
+import json
+import os
+
+import pdf_backend
+from pdf_engine import (
+    A4_SIZE,
+    PdfEngineError,
+    atomic_output,
+    check_cancelled,
+    crop_to_content,
+    detect_content_boxes,
+    get_target_dimensions,
+    is_pdf,
+    load_normalized_pages,
+    normalize_page,
+    parse_page_size,
+    resize_page,
+    selection_indices,
+    trim_page,
+)
+
+STEPS = ("select", "remove", "trim", "autotrim", "rotate", "resize", "normalize")
+
+
+class Pipeline:
+    def __init__(self, inputs=(), optimize=False):
+        self.inputs = list(inputs)
+        self.optimize = optimize
+        self.steps = []
+
+    def add_input(self, *paths):
+        self.inputs.extend(paths)
+        return self
+
+    def select(self, pages):
+        """Keep only ``pages`` (a selection expression or 0-based indices)."""
+        self.steps.append(("select", {"pages": pages}))
+        return self
+
+    def remove(self, pages):
+        self.steps.append(("remove", {"pages": pages}))
+        return self
+
+    def trim(self, top=190, bottom=190):
+        self.steps.append(("trim", {"top": top, "bottom": bottom}))
+        return self
+
+    def autotrim(self, margin=10, dpi=36, threshold=245):
+        """Crop each page to its content plus ``margin`` points, as auto_trim_pdf does."""
+        self.steps.append(("autotrim", {"margin": margin, "dpi": dpi, "threshold": threshold}))
+        return self
+
+    def rotate(self, angle):
+        self.steps.append(("rotate", {"angle": angle}))
+        return self
+
+    def resize(self, size=A4_SIZE, mode="fit"):
+        """Scale each page's content to ``size``; ``mode`` is fit, fill or stretch (see scale_for_mode)."""
+        self.steps.append(("resize", {"size": parse_page_size(size), "mode": mode}))
+        return self
+
+    def normalize(self, size=None):
+        """Set each page's media box to ``size`` without scaling, as merge_files does."""
+        self.steps.append(("normalize", {"size": parse_page_size(size) if size else get_target_dimensions()}))
+        return self
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Build a pipeline from a parsed spec; see the module docstring."""
+        pipeline = cls(spec.get("inputs", ()), spec.get("optimize", False))
+        arguments = {"select": "pages", "remove": "pages", "autotrim": "margin", "rotate": "angle", "resize": "size",
+                     "normalize": "size"}
+        for step in spec.get("steps", ()):
+            if not isinstance(step, dict) or len(step) != 1:
+                raise PdfEngineError(f"Each step must be a single-key object, got {step!r}")
+            (name, value), = step.items()
+            if name not in STEPS:
+                raise PdfEngineError(f"Unknown pipeline step: {name!r}")
+            if isinstance(value, dict):
+                getattr(pipeline, name)(**value)
+            elif value is None:
+                getattr(pipeline, name)()
+            elif name == "trim":
+                pipeline.trim(value, value)
+            else:
+                getattr(pipeline, name)(**{arguments[name]: value})
+        return pipeline
+
+    def _indices(self, page_count):
+        """Apply the select/remove steps in order and return the surviving page indices."""
+        kept = list(range(page_count))
+        for name, options in self.steps:
+            if name not in ("select", "remove"):
+                continue
+            chosen = set(selection_indices(options["pages"], len(kept)))
+            if name == "select":
+                kept = [index for position, index in enumerate(kept) if position in chosen]
+            else:
+                kept = [index for position, index in enumerate(kept) if position not in chosen]
+        return kept
+
+    def _transform(self, pages, shared):
+        for name, options in self.steps:
+            if name == "autotrim":
+                self._autotrim(pages, **options)
+            for page in pages:
+                if name == "trim":
+                    trim_page(page, options["top"], options["bottom"])
+                elif name == "rotate":
+                    page.rotate(options["angle"])
+                elif name == "resize":
+                    resize_page(page, *options["size"], options["mode"], shared)
+                elif name == "normalize":
+                    normalize_page(page, *options["size"])
+        return pages
+
+    @staticmethod
+    def _autotrim(pages, margin, dpi, threshold):
+        from streaming_writer import StreamingPdfWriter
+        snapshot = io.BytesIO()
+        with StreamingPdfWriter(snapshot) as writer:
+            writer.add_pages(pages)
+        for page, box in zip(pages, detect_content_boxes(snapshot.getvalue(), dpi, threshold, workers=1)):
+            crop_to_content(page, box, margin)
+
+    def _load(self, path):
+        if is_pdf(path):
+            reader = pdf_backend.open_pdf(path)
+            indices = self._indices(pdf_backend.page_count(reader))
+            return [page for _, page in pdf_backend.iter_pages(reader, indices)]
+        pages = load_normalized_pages(path, *get_target_dimensions())
+        return [pages[index] for index in self._indices(len(pages))]
+
+    def run(self, output_file, progress=None, cancel=None, stats=None):
+        """
+        Run every step and write the combined result to ``output_file``.
+
+        Returns the inputs that failed as ``(path, exception)`` tuples, which
+        are left out of the output, like merge_files. ``progress``,
+        ``cancel`` and ``stats`` behave as in merge_files.
+        """
+        from streaming_writer import StreamingPdfWriter
+        if not self.inputs:
+            raise PdfEngineError("No files selected.")
+        failures = []
+        with atomic_output(output_file) as output_pdf:
+            writer = StreamingPdfWriter(output_pdf, self.optimize)
+            shared = {}
+            for done, path in enumerate(self.inputs):
+                check_cancelled(cancel)
+                if progress:
+                    progress(done, len(self.inputs), path)
+                try:
+                    pages = self._transform(self._load(path), shared)
+                except Exception as e:
+                    failures.append((path, e))
+                    continue
+                writer.add_pages(pages)
+                if pages:
+                    # Written already; free the source now, not at the next full GC
+                    pdf_backend.close_pdf(pages[0].pdf)
+            check_cancelled(cancel)
+            if progress:
+                progress(len(self.inputs), len(self.inputs), output_file)
+            writer.close()
+        if self.optimize and stats is not None:
+            stats.update(writer.stats, bytes_saved=writer.bytes_saved)
+        return failures
+
+
+def load_pipeline(path):
+    """Read a pipeline spec from a JSON or YAML file and return ``(pipeline, spec)``."""
+    with open(path, encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yml", ".yaml"):
+            try:
+                import yaml
+            except ImportError as e:
+                raise PdfEngineError("Reading YAML pipelines requires PyYAML (pip install pyyaml).") from e
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    if not isinstance(spec, dict):
+        raise PdfEngineError(f"{path} does not contain a pipeline spec.")
+    return Pipeline.from_spec(spec), spec
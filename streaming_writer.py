@@ -0,0 +1,545 @@
+"""
+Streaming PDF writer whose memory use is bounded by the largest input.
+
+pypdf's PdfWriter (and PdfMerger) hold every page object until write().
+StreamingPdfWriter instead serializes a source document's pages, and every
+object they reference, as soon as they are added, so the source reader can
+be dropped straight away. Only the xref offsets and the page object numbers
+are kept until close(). Since only objects reachable from the added pages
+are ever written, orphaned objects in the sources never reach the output.
+
+With ``optimize=True`` the writer also shrinks the output as it goes:
+streams (font files, images, ICC profiles, ...) with the same content,
+including everything they reference such as a color space or soft mask,
+are written once and shared across all inputs, and streams stored without
+a filter are Flate-compressed when that makes them smaller. Savings are
+tallied in ``stats``.
+
+Objects other than streams are collected into compressed object streams,
+OBJECTS_PER_STREAM at a time, and the cross-reference table is written as
+a compressed xref stream (both PDF 1.5), so page dictionaries and other
+small objects cost a few bytes each instead of a hundred or so.
+
+Given the ``state`` of a file it wrote earlier, a writer appends pages to
+that file as an incremental update instead: only the new pages, one page
+tree node holding them and a new root node for the page tree are written
+after the existing bytes, so appending costs the same however large the
+file has grown.
+
+Source objects are never modified, so the same pages can be written to
+several writers, e.g. a merged document and the split parts made from it
+in the same pass.
+"""
+import hashlib
+import io
+import zlib
+
+from pypdf.generic import (
+    ArrayObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    IndirectObject,
+    NameObject,
+    NullObject,
+    NumberObject,
+    StreamObject,
+    TextStringObject,
+)
+
+# Bytes per object beyond its value: "n 0 obj", "endobj" and its xref entry
+_OBJECT_OVERHEAD = 48
+
+# Objects held back and written together as one object stream
+OBJECTS_PER_STREAM = 200
+
+
+def _is_page(obj):
+    return isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page"
+
+
+class _ByteCounter:
+    def __init__(self):
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+
+
+class _Hasher:
+    """A file-like SHA-256, so objects can write_to_stream() into it."""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+
+    def write(self, data):
+        self._hash.update(data)
+
+    def digest(self):
+        return self._hash.digest()
+
+
+def _raw_data(stream):
+    """Return a stream's bytes as they would be written, without decoding."""
+    if isinstance(stream, EncodedStreamObject):
+        return stream._data
+    return stream.get_data()
+
+
+class StreamingPdfWriter:
+    def __init__(self, stream, optimize=False, append_to=None):
+        """
+        Write a new PDF to the binary file ``stream``.
+
+        With ``append_to``, the ``state`` of a file written by an earlier
+        writer, ``stream`` must be that file positioned at its end, and the
+        pages are appended to it. Outline items cannot be added then.
+        """
+        self._stream = stream
+        self._append_to = append_to
+        self._position = 0 if append_to is None else append_to["length"]
+        self.optimize = optimize
+        self.stats = {
+            "streams_deduplicated": 0,
+            "bytes_deduplicated": 0,
+            "streams_compressed": 0,
+            "bytes_compressed": 0,
+        }
+        # Content digest -> object number of streams already written
+        self._stream_numbers = {}
+        # (number, generation) -> (digest, stream bytes) of source objects
+        # hashed by the current add_pages() call; None if never shared
+        self._digests = {}
+        # id() -> (stream, object number) of direct streams written by the
+        # current add_pages() call; the stream is kept so its id() cannot be
+        # reused, and the map is cleared when the call returns
+        self._direct_numbers = {}
+        # Object numbers start at 1. An entry is the object's byte offset,
+        # (object stream number, index) for an object inside an object
+        # stream, or None for a reserved but unwritten object, emitted as a
+        # free xref entry.
+        self._offsets = [None] if append_to is None else [None] * append_to["size"]
+        self._first_num = len(self._offsets)
+        # (number, serialized value) of objects waiting for their object stream
+        self._held = []
+        self._held_size = 0
+        self._kids = []
+        # (title, page index) of each outline item, written by close()
+        self._outline = []
+        # How to append to the finished file; see close()
+        self.state = None
+        if append_to is None:
+            self._write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        # The page tree root, or when appending the node for the new pages
+        self._pages_num = self._reserve()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    @property
+    def page_count(self):
+        return len(self._kids)
+
+    @property
+    def size(self):
+        """Bytes written so far, counting objects not yet in an object stream at their uncompressed size."""
+        return self._position + self._held_size
+
+    @property
+    def bytes_saved(self):
+        return self.stats["bytes_deduplicated"] + self.stats["bytes_compressed"]
+
+    def _write(self, data):
+        self._stream.write(data)
+        self._position += len(data)
+
+    # write_to_stream() only needs a write() method, so the writer passes
+    # itself to keep the byte position in step without calling tell().
+    write = _write
+
+    def _reserve(self):
+        self._offsets.append(None)
+        return len(self._offsets) - 1
+
+    def _digest(self, obj):
+        """
+        Return (digest, stream bytes) of ``obj``'s content, following its references.
+
+        Objects with the same digest are the same down to every object they
+        reference, whatever those are numbered, so one copy can be shared.
+        Content that reaches a page or refers back to itself gets None and
+        is never shared.
+        """
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in self._digests:
+                # Stays None for a reference back to an object being hashed
+                self._digests[key] = None
+                target = obj.get_object()
+                self._digests[key] = None if _is_page(target) else self._digest(target)
+            return self._digests[key]
+        hasher = _Hasher()
+        size = 0
+        if isinstance(obj, StreamObject):
+            data = _raw_data(obj)
+            hasher.write(b"stream %d\n" % len(data))
+            hasher.write(data)
+            size = len(data)
+            obj = DictionaryObject({k: v for k, v in obj.items() if k != "/Length"})
+        if isinstance(obj, (DictionaryObject, ArrayObject)):
+            hasher.write(b"<<" if isinstance(obj, DictionaryObject) else b"[")
+            for key, value in sorted(obj.items()) if isinstance(obj, DictionaryObject) else enumerate(obj):
+                part = self._digest(value)
+                if part is None:
+                    return None
+                if isinstance(key, NameObject):
+                    key.write_to_stream(hasher)
+                hasher.write(part[0])
+                size += part[1]
+        elif obj is not None:
+            obj.write_to_stream(hasher)
+        return hasher.digest(), size
+
+    def _compress(self, obj):
+        """Flate-encode an unfiltered stream if that makes it smaller."""
+        if "/Filter" in obj or obj.get("/Type") == "/Metadata":
+            return obj
+        data = obj.get_data()
+        encoded = obj.flate_encode()
+        saved = len(data) - len(encoded._data)
+        if saved <= 0:
+            return obj
+        self.stats["streams_compressed"] += 1
+        self.stats["bytes_compressed"] += saved
+        return encoded
+
+    def _write_value(self, obj, out=None):
+        """Serialize ``obj`` to ``out`` (the output by default) without the whitespace pypdf puts inside dictionaries."""
+        out = self if out is None else out
+        if isinstance(obj, StreamObject):
+            data = obj._data
+            obj[NameObject("/Length")] = NumberObject(len(data))
+            self._write_value(DictionaryObject(obj), out)
+            out.write(b"\nstream\n")
+            out.write(data)
+            out.write(b"\nendstream")
+        elif isinstance(obj, DictionaryObject):
+            out.write(b"<<")
+            for key, value in obj.items():
+                key.write_to_stream(out)
+                if not isinstance(value, (NameObject, DictionaryObject, ArrayObject)):
+                    out.write(b" ")
+                self._write_value(value, out)
+            out.write(b">>")
+        elif isinstance(obj, ArrayObject):
+            out.write(b"[")
+            for n, value in enumerate(obj):
+                if n:
+                    out.write(b" ")
+                self._write_value(value, out)
+            out.write(b"]")
+        else:
+            obj.write_to_stream(out)
+
+    def _write_object(self, num, obj):
+        if not isinstance(obj, StreamObject):
+            data = io.BytesIO()
+            self._write_value(obj, data)
+            self._held.append((num, data.getvalue()))
+            # Its value, and its number and offset in the stream's header
+            self._held_size += len(self._held[-1][1]) + 16
+            if len(self._held) >= OBJECTS_PER_STREAM:
+                self._write_object_stream()
+            return
+        if self.optimize:
+            obj = self._compress(obj)
+        self._offsets[num] = self._position
+        self._write(f"{num} 0 obj\n".encode())
+        self._write_value(obj)
+        self._write(b"\nendobj\n")
+
+    def _write_object_stream(self):
+        """Write the held objects as one compressed object stream."""
+        if not self._held:
+            return
+        stream_num = self._reserve()
+        header = []
+        offset = 0
+        for index, (num, data) in enumerate(self._held):
+            header.append(f"{num} {offset}")
+            offset += len(data) + 1
+            self._offsets[num] = (stream_num, index)
+        header = " ".join(header).encode() + b"\n"
+        stream = StreamObject()
+        stream._data = zlib.compress(header + b"\n".join(data for _, data in self._held))
+        stream.update({
+            NameObject("/Type"): NameObject("/ObjStm"),
+            NameObject("/N"): NumberObject(len(self._held)),
+            NameObject("/First"): NumberObject(len(header)),
+            NameObject("/Filter"): NameObject("/FlateDecode"),
+        })
+        self._held = []
+        self._held_size = 0
+        self._offsets[stream_num] = self._position
+        self._write(f"{stream_num} 0 obj\n".encode())
+        self._write_value(stream)
+        self._write(b"\nendobj\n")
+
+    def _remap(self, obj, mapping, queue):
+        """Copy ``obj`` with every indirect reference renumbered for the output."""
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in mapping and _is_page(obj.get_object()):
+                # A link or /P to a page that is not part of this output;
+                # following it would pull in the source's whole page tree
+                return NullObject()
+            if key not in mapping:
+                digest = None
+                if self.optimize and isinstance(obj.get_object(), StreamObject):
+                    digest = self._digest(obj)
+                if digest is not None and digest[0] in self._stream_numbers:
+                    mapping[key] = self._stream_numbers[digest[0]]
+                    self.stats["streams_deduplicated"] += 1
+                    self.stats["bytes_deduplicated"] += digest[1]
+                else:
+                    mapping[key] = self._reserve()
+                    queue.append((mapping[key], obj))
+                    if digest is not None:
+                        self._stream_numbers[digest[0]] = mapping[key]
+            return IndirectObject(mapping[key], 0, None)
+        if isinstance(obj, StreamObject):
+            # The copy shares the source's data rather than duplicating it
+            copy = type(obj)()
+            copy._data = obj._data
+            for key, value in obj.items():
+                copy[key] = self._remap(value, mapping, queue)
+            return copy
+        if isinstance(obj, DictionaryObject):
+            copy = DictionaryObject()
+            for key, value in obj.items():
+                copy[key] = self._remap_value(value, mapping, queue)
+            return copy
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._remap_value(value, mapping, queue) for value in obj)
+        return obj
+
+    def _remap_value(self, value, mapping, queue):
+        if isinstance(value, StreamObject):
+            # A stream held directly, e.g. page contents rewritten in memory;
+            # streams may only be written as indirect objects. One object
+            # shared by pages of the same add_pages() call is written once.
+            if id(value) not in self._direct_numbers:
+                num = self._reserve()
+                self._direct_numbers[id(value)] = (value, num)
+                queue.append((num, value))
+            return IndirectObject(self._direct_numbers[id(value)][1], 0, None)
+        return self._remap(value, mapping, queue)
+
+    def add_pages(self, pages):
+        """
+        Write ``pages`` and everything they reference to the output.
+
+        All pages in one call must come from the same source document;
+        objects they share are written once. Inherited attributes must
+        already be on the page, which is the case for ``PdfReader.pages``.
+        """
+        mapping = {}
+        queue = []
+        written = []
+        for page in pages:
+            num = self._reserve()
+            ref = page.indirect_reference
+            if ref is not None:
+                # Annotations point back at their page through /P
+                mapping[(ref.idnum, ref.generation)] = num
+            self._kids.append(num)
+            written.append((num, page))
+
+        for num, page in written:
+            copy = DictionaryObject()
+            for key, value in page.items():
+                if key != "/Parent":
+                    copy[key] = self._remap_value(value, mapping, queue)
+            copy[NameObject("/Parent")] = IndirectObject(self._pages_num, 0, None)
+            self._write_object(num, copy)
+
+        while queue:
+            num, source = queue.pop()
+            obj = source.get_object()
+            if obj is None:
+                obj = NullObject()
+            self._write_object(num, self._remap(obj, mapping, queue))
+        # Everything is written; let the source's rewritten streams go
+        self._direct_numbers.clear()
+        self._digests.clear()
+
+    def estimate_size(self, pages, seen=None):
+        """
+        Return about how many bytes add_pages(pages) would add to the finished file.
+
+        Objects are counted at their size in the source. Pass the same
+        ``seen`` set for pages that will go into one add_pages() call, so
+        objects they share are counted once. Sharing and compression with
+        ``optimize`` only make the real size smaller.
+        """
+        seen = set() if seen is None else seen
+        counter = _ByteCounter()
+        stack = []
+        for page in pages:
+            ref = page.indirect_reference
+            if ref is not None:
+                seen.add((ref.idnum, ref.generation))
+            # The page dictionary, plus its entry in the page tree's /Kids
+            counter.count += _OBJECT_OVERHEAD + 12
+            stack.append(DictionaryObject({key: value for key, value in page.items() if key != "/Parent"}))
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, IndirectObject):
+                counter.count += 8
+                key = (obj.idnum, obj.generation)
+                if key in seen:
+                    continue
+                seen.add(key)
+                obj = obj.get_object()
+                if _is_page(obj):
+                    continue
+                counter.count += _OBJECT_OVERHEAD
+            if isinstance(obj, StreamObject):
+                counter.count += len(_raw_data(obj)) + 32
+            if isinstance(obj, DictionaryObject):
+                counter.count += 4 + sum(len(key) + 2 for key in obj)
+                stack.extend(obj.values())
+            elif isinstance(obj, ArrayObject):
+                counter.count += 2 + len(obj)
+                stack.extend(obj)
+            elif obj is not None:
+                obj.write_to_stream(counter)
+        return counter.count
+
+    def closing_size(self):
+        """Return about how many bytes close() will add: page tree, outline, catalog, xref stream and trailer."""
+        objects = len(self._offsets) + 3 + (len(self._outline) + 1 if self._outline else 0)
+        kids = sum(len(str(num)) + 5 for num in self._kids)
+        outline = sum(len(title.encode("utf-16")) + 160 for title, _ in self._outline)
+        return 8 * objects + kids + outline + 512
+
+    def add_outline_item(self, title, page_index):
+        """Add a top-level outline item (bookmark) titled ``title`` for output page ``page_index``."""
+        if self._append_to is not None:
+            raise ValueError("Outline items cannot be added to an appended file.")
+        self._outline.append((title, page_index))
+
+    def _write_outline(self):
+        """Write the outline items and return the number of their root object."""
+        root_num = self._reserve()
+        nums = [self._reserve() for _ in self._outline]
+        for n, (title, page_index) in enumerate(self._outline):
+            item = DictionaryObject({
+                NameObject("/Title"): TextStringObject(title),
+                NameObject("/Parent"): IndirectObject(root_num, 0, None),
+                NameObject("/Dest"): ArrayObject([
+                    IndirectObject(self._kids[page_index], 0, None), NameObject("/Fit"),
+                ]),
+            })
+            if n:
+                item[NameObject("/Prev")] = IndirectObject(nums[n - 1], 0, None)
+            if n + 1 < len(nums):
+                item[NameObject("/Next")] = IndirectObject(nums[n + 1], 0, None)
+            self._write_object(nums[n], item)
+        self._write_object(root_num, DictionaryObject({
+            NameObject("/Type"): NameObject("/Outlines"),
+            NameObject("/First"): IndirectObject(nums[0], 0, None),
+            NameObject("/Last"): IndirectObject(nums[-1], 0, None),
+            NameObject("/Count"): NumberObject(len(nums)),
+        }))
+        return root_num
+
+    def close(self):
+        """
+        Write the page tree, outline, catalog and the cross-reference stream.
+
+        Afterwards ``state`` holds what a later writer needs to append to
+        the file: its length, the offset of its cross-reference stream, its
+        object count, the catalog and page tree root numbers, the root's
+        kids and the page count.
+        """
+        kids = ArrayObject(IndirectObject(num, 0, None) for num in self._kids)
+        if self._append_to is None:
+            pages_root, root_kids, count = self._pages_num, self._kids, len(self._kids)
+            self._write_object(pages_root, DictionaryObject({
+                NameObject("/Type"): NameObject("/Pages"),
+                NameObject("/Kids"): kids,
+                NameObject("/Count"): NumberObject(count),
+            }))
+            catalog = DictionaryObject({
+                NameObject("/Type"): NameObject("/Catalog"),
+                NameObject("/Pages"): IndirectObject(pages_root, 0, None),
+            })
+            if self._outline:
+                catalog[NameObject("/Outlines")] = IndirectObject(self._write_outline(), 0, None)
+                catalog[NameObject("/PageMode")] = NameObject("/UseOutlines")
+            root_num = self._reserve()
+            self._write_object(root_num, catalog)
+            sections = [(0, None)]
+        else:
+            # The new pages hang off one node, and only the root of the page
+            # tree is replaced, so earlier pages are not written again
+            previous = self._append_to
+            pages_root, root_num = previous["pages"], previous["root"]
+            root_kids = previous["kids"] + [self._pages_num]
+            count = previous["count"] + len(self._kids)
+            self._write_object(self._pages_num, DictionaryObject({
+                NameObject("/Type"): NameObject("/Pages"),
+                NameObject("/Kids"): kids,
+                NameObject("/Count"): NumberObject(len(self._kids)),
+                NameObject("/Parent"): IndirectObject(pages_root, 0, None),
+            }))
+            self._write_object(pages_root, DictionaryObject({
+                NameObject("/Type"): NameObject("/Pages"),
+                NameObject("/Kids"): ArrayObject(IndirectObject(num, 0, None) for num in root_kids),
+                NameObject("/Count"): NumberObject(count),
+            }))
+            sections = [(pages_root, pages_root + 1), (self._first_num, None)]
+
+        self._write_object_stream()
+
+        # Each entry: type, offset or object stream number, generation or index
+        xref_num = self._reserve()
+        self._offsets[xref_num] = xref_position = self._position
+        sections = [(start, end or len(self._offsets)) for start, end in sections]
+        numbers = [num for start, end in sections for num in range(start, end)]
+        width = max(1, (max(max(entry) if isinstance(entry, tuple) else entry or 0
+                            for entry in (self._offsets[num] for num in numbers)).bit_length() + 7) // 8)
+        entries = bytearray()
+        for num in numbers:
+            entry = self._offsets[num]
+            if entry is None:
+                entries += b"\x00" + bytes(width) + b"\xff\xff"
+            elif isinstance(entry, tuple):
+                entries += b"\x02" + entry[0].to_bytes(width, "big") + entry[1].to_bytes(2, "big")
+            else:
+                entries += b"\x01" + entry.to_bytes(width, "big") + b"\x00\x00"
+        xref = StreamObject()
+        xref._data = zlib.compress(bytes(entries))
+        xref.update({
+            NameObject("/Type"): NameObject("/XRef"),
+            NameObject("/Size"): NumberObject(len(self._offsets)),
+            NameObject("/W"): ArrayObject(NumberObject(n) for n in (1, width, 2)),
+            NameObject("/Root"): IndirectObject(root_num, 0, None),
+            NameObject("/Filter"): NameObject("/FlateDecode"),
+        })
+        if self._append_to is not None:
+            xref[NameObject("/Index")] = ArrayObject(
+                NumberObject(n) for start, end in sections for n in (start, end - start)
+            )
+            xref[NameObject("/Prev")] = NumberObject(self._append_to["startxref"])
+        self._write(f"{xref_num} 0 obj\n".encode())
+        self._write_value(xref)
+        self._write(f"\nendobj\nstartxref\n{xref_position}\n%%EOF\n".encode())
+        self.state = {
+            "length": self._position, "startxref": xref_position, "size": len(self._offsets),
+            "root": root_num, "pages": pages_root, "kids": list(root_kids), "count": count,
+        }
@@ -0,0 +1,69 @@
+"""atomic_output: outputs replaced only on success, and never a device or pipe."""
+import io
+import os
+import stat
+import threading
+
+import pytest
+
+import pdf_engine
+
+
+def test_failure_leaves_existing_output_and_no_temporary_file(tmp_path):
+    output = tmp_path / "out.pdf"
+    output.write_bytes(b"old")
+    with pytest.raises(RuntimeError):
+        with pdf_engine.atomic_output(str(output)) as f:
+            f.write(b"partial")
+            raise RuntimeError("failed halfway")
+    assert output.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["out.pdf"]
+
+
+def test_success_replaces_output(tmp_path):
+    output = tmp_path / "out.pdf"
+    output.write_bytes(b"old")
+    with pdf_engine.atomic_output(str(output)) as f:
+        f.write(b"new")
+    assert output.read_bytes() == b"new"
+    assert os.listdir(tmp_path) == ["out.pdf"]
+
+
+def test_file_object_is_used_as_it_is():
+    buffer = io.BytesIO()
+    with pdf_engine.atomic_output(buffer) as f:
+        assert f is buffer
+        f.write(b"data")
+    assert buffer.getvalue() == b"data"
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="needs symbolic links")
+def test_symbolic_link_is_kept(tmp_path):
+    target, link = tmp_path / "target.pdf", tmp_path / "link.pdf"
+    target.write_bytes(b"old")
+    os.symlink(target, link)
+    with pdf_engine.atomic_output(str(link)) as f:
+        f.write(b"new")
+    assert os.path.islink(link)
+    assert target.read_bytes() == b"new"
+
+
+def _image(folder):
+    from PIL import Image
+    path = str(folder / "image.png")
+    Image.new("RGB", (40, 30), "red").save(path)
+    return path
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+def test_fifo_is_written_to_not_replaced(tmp_path):
+    fifo = str(tmp_path / "out.pdf")
+    os.mkfifo(fifo)
+    received = []
+    reader = threading.Thread(target=lambda: received.append(open(fifo, "rb").read()), daemon=True)
+    reader.start()
+    pdf_engine.merge_pdfs([pdf_engine.image_to_pdf_bytes(_image(tmp_path), 595, 842)], fifo)
+    assert stat.S_ISFIFO(os.stat(fifo).st_mode)
+    reader.join(30)
+    assert received and received[0].startswith(b"%PDF-")
+    assert sorted(os.listdir(tmp_path)) == ["image.png", "out.pdf"]
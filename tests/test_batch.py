@@ -0,0 +1,36 @@
+"""run_batch: results, cancellation and checkpoints."""
+import threading
+
+import pdf_engine
+
+
+def copy(input_file, output_file):
+    with open(input_file, "rb") as source, open(output_file, "wb") as output:
+        output.write(source.read())
+
+
+def make_jobs(folder, count):
+    jobs = []
+    for n in range(count):
+        source = folder / f"in{n}.txt"
+        source.write_text(f"file {n}")
+        jobs.append((str(source), str(folder / f"out{n}.txt")))
+    return jobs
+
+
+def test_every_job_gets_a_result_in_order(tmp_path):
+    jobs = make_jobs(tmp_path, 6)
+    results = pdf_engine.run_batch(copy, jobs, workers=2)
+    assert [(r.input_file, r.output_file) for r in results] == jobs
+    assert all(r.ok for r in results)
+    assert (tmp_path / "out5.txt").read_text() == "file 5"
+
+
+def test_no_job_starts_once_cancelled(tmp_path):
+    jobs = make_jobs(tmp_path, 6)
+    cancel = threading.Event()
+    cancel.set()
+    for workers in (1, 2):
+        results = pdf_engine.run_batch(copy, jobs, workers=workers, cancel=cancel)
+        assert all(isinstance(r.error, pdf_engine.JobCancelled) for r in results)
+        assert not list(tmp_path.glob("out*"))
@@ -0,0 +1,90 @@
+"""Checkpoint manifests: resuming batches and merges, and re-running what changed."""
+import os
+
+import pytest
+
+import pdf_engine
+from checkpoint import Checkpoint
+from pypdf import PdfWriter
+
+
+def blank_pdf(path, width=612):
+    writer = PdfWriter()
+    writer.add_blank_page(width, 792)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+@pytest.fixture
+def batch(tmp_path):
+    inputs = [blank_pdf(tmp_path / f"in{n}.pdf", 300 + n) for n in range(3)]
+    output = tmp_path / "out"
+    output.mkdir()
+    return inputs, str(output), str(tmp_path / "checkpoint.jsonl")
+
+
+def skipped(results):
+    assert all(r.ok for r in results)
+    return [r.skipped for r in results]
+
+
+def test_finished_jobs_are_skipped_on_rerun(batch):
+    inputs, output, manifest = batch
+    assert skipped(pdf_engine.resize_pdfs(inputs, output, (400, 400), workers=1, checkpoint=manifest)) == [False] * 3
+    assert skipped(pdf_engine.resize_pdfs(inputs, output, (400, 400), workers=1, checkpoint=manifest)) == [True] * 3
+
+
+def test_changed_parameters_run_again(batch):
+    inputs, output, manifest = batch
+    pdf_engine.resize_pdfs(inputs, output, (400, 400), workers=1, checkpoint=manifest)
+    assert skipped(pdf_engine.resize_pdfs(inputs, output, (500, 500), workers=1, checkpoint=manifest)) == [False] * 3
+    assert skipped(pdf_engine.resize_pdfs(inputs, output, (500, 500), workers=1, mode="fill",
+                                          checkpoint=manifest)) == [False] * 3
+
+
+def test_only_changed_or_missing_work_runs_again(batch):
+    inputs, output, manifest = batch
+    results = pdf_engine.resize_pdfs(inputs, output, (400, 400), workers=1, checkpoint=manifest)
+    blank_pdf(inputs[0], 999)                 # new content
+    os.remove(results[1].output_file)         # output gone
+    stat = os.stat(inputs[2])                 # touched, same content
+    os.utime(inputs[2], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert skipped(pdf_engine.resize_pdfs(inputs, output, (400, 400), workers=1,
+                                          checkpoint=manifest)) == [False, False, True]
+
+
+def test_resume_removes_leftover_temporary_outputs(batch):
+    inputs, output, manifest = batch
+    leftover = os.path.join(output, ".in0_resized.pdf.0123abcd.part")
+    with open(leftover, "wb") as f:
+        f.write(b"half a file")
+    pdf_engine.resize_pdfs(inputs[:1], output, (400, 400), workers=1, checkpoint=manifest)
+    assert not os.path.exists(leftover)
+
+
+def test_torn_last_line_is_ignored(batch):
+    inputs, output, manifest = batch
+    pdf_engine.resize_pdfs(inputs, output, (400, 400), workers=1, checkpoint=manifest)
+    with open(manifest, "a", encoding="utf-8") as f:
+        f.write('{"output": "/trunc')
+    with Checkpoint(manifest) as checkpoint:
+        assert len(checkpoint.entries) == 3
+    assert skipped(pdf_engine.resize_pdfs(inputs, output, (400, 400), workers=1, checkpoint=manifest)) == [True] * 3
+
+
+def test_merge_is_skipped_until_an_input_or_option_changes(batch, tmp_path):
+    inputs, _, manifest = batch
+    output = str(tmp_path / "merged.pdf")
+    assert pdf_engine.merge_files(inputs, output, workers=1, checkpoint=manifest) == []
+    written = os.stat(output).st_ino
+    pdf_engine.merge_files(inputs, output, workers=1, checkpoint=manifest)
+    # Not written again: atomic_output would have put a new file in its place
+    assert os.stat(output).st_ino == written
+
+    pdf_engine.merge_files(inputs, output, workers=1, outline=True, checkpoint=manifest)
+    assert os.stat(output).st_ino != written
+    written = os.stat(output).st_ino
+    blank_pdf(inputs[1], 777)
+    pdf_engine.merge_files(inputs, output, workers=1, outline=True, checkpoint=manifest)
+    assert os.stat(output).st_ino != written
@@ -0,0 +1,84 @@
+"""In-memory and memory-mapped inputs and outputs."""
+import io
+import mmap
+
+import pytest
+from PIL import Image
+
+import pdf_backend
+import pdf_engine
+from pypdf import PdfReader, PdfWriter
+
+
+@pytest.fixture
+def pdf_bytes():
+    writer = PdfWriter()
+    for n in range(1, 4):
+        writer.add_blank_page(100 * n, 500)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (120, 80), "orange").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def pages(data):
+    return PdfReader(io.BytesIO(data), strict=True).pages
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview, io.BytesIO])
+def test_single_document_operations_return_bytes(pdf_bytes, wrap):
+    assert len(pages(pdf_engine.resize_pdf(wrap(pdf_bytes), None, pdf_engine.A4_SIZE))) == 3
+    assert len(pages(pdf_engine.trim_whitespace(wrap(pdf_bytes), None, 10, 10))) == 3
+    assert pages(pdf_engine.rotate_pdf(wrap(pdf_bytes), None, 90))[0].rotation == 90
+    assert len(pages(pdf_engine.extract_pages(wrap(pdf_bytes), None, "2-"))) == 2
+    assert len(pages(pdf_engine.remove_and_resize_pages(wrap(pdf_bytes), None, "1"))) == 2
+
+
+def test_outputs_can_be_file_objects(pdf_bytes):
+    output = io.BytesIO()
+    pdf_engine.resize_pdf(pdf_bytes, output, (300, 300))
+    assert [float(n) for n in pages(output.getvalue())[0].mediabox] == [0, 0, 300, 300]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_merge_mixes_paths_buffers_and_images(pdf_bytes, png_bytes, tmp_path, streaming):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(pdf_bytes)
+    output = io.BytesIO()
+    failures = pdf_engine.merge_files([str(path), io.BytesIO(pdf_bytes), memoryview(png_bytes), bytearray(pdf_bytes)],
+                                      output, workers=1, streaming=streaming)
+    assert failures == []
+    assert len(pages(output.getvalue())) == 10
+
+
+def test_merge_pdfs_from_mmap(pdf_bytes, tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(pdf_bytes)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        output = io.BytesIO()
+        pdf_engine.merge_pdfs([mapped, mapped], output, streaming=True)
+        # A caller's own mmap is left open for them
+        assert not mapped.closed
+    assert len(pages(output.getvalue())) == 6
+
+
+def test_large_files_are_memory_mapped_and_closed_with_the_reader(pdf_bytes, tmp_path, monkeypatch):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(pdf_bytes)
+    monkeypatch.setattr(pdf_backend, "MMAP_THRESHOLD", 1)
+    reader = pdf_backend.open_pdf(str(path))
+    assert isinstance(reader.stream, mmap.mmap)
+    assert len(reader.pages) == 3
+    pdf_backend.close_pdf(reader)
+    assert reader.stream.closed
+
+
+def test_image_bytes_to_pdf(png_bytes):
+    page, = pages(pdf_engine.image_to_pdf_bytes(io.BytesIO(png_bytes), 595, 842))
+    assert [round(float(n)) for n in page.mediabox] == [0, 0, 595, 842]
@@ -0,0 +1,77 @@
+"""merge_files / merge_pdfs: streaming memory use and the merged output."""
+import os
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+import pdf_engine
+from pdf_backend import pymupdf
+from pypdf import PdfReader
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PEAK_RSS = """
+import resource, sys
+sys.path.insert(0, {root!r})
+import pdf_engine
+getattr(pdf_engine, sys.argv[1])([sys.argv[2]] * int(sys.argv[3]), sys.argv[4], streaming=True)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+@pytest.fixture(scope="module")
+def scan(tmp_path_factory):
+    """A PDF of 5 pages, each an incompressible 1.5 MB image."""
+    fitz = pymupdf()
+    document = fitz.open()
+    for n in range(5):
+        page = document.new_page(width=595, height=842)
+        page.insert_image(page.rect, pixmap=fitz.Pixmap(fitz.csRGB, 1000, 500, os.urandom(1000 * 500 * 3), False))
+        page.insert_text((72, 72), f"Scan page {n + 1}")
+    path = tmp_path_factory.mktemp("merge") / "scan.pdf"
+    document.save(str(path))
+    return str(path)
+
+
+def peak_rss(function, source, count, output):
+    """Return the peak RSS, in bytes, of a fresh process merging ``count`` copies of ``source``."""
+    result = subprocess.run([sys.executable, "-c", PEAK_RSS.format(root=ROOT), function, source, str(count), output],
+                            check=True, capture_output=True, text=True)
+    return int(result.stdout.split()[-1]) * 1024
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="ru_maxrss is in kilobytes on Linux only")
+@pytest.mark.parametrize("function", ["merge_files", "merge_pdfs"])
+def test_streaming_merge_memory_does_not_grow_with_inputs(scan, tmp_path, function):
+    output = str(tmp_path / "merged.pdf")
+    few = peak_rss(function, scan, 2, output)
+    many = peak_rss(function, scan, 20, output)
+    assert len(PdfReader(output).pages) == 100
+    # Holding on to each source would add about its size per input
+    assert many - few < os.path.getsize(scan)
+
+
+def test_streaming_merge_matches_the_in_memory_merge(scan, tmp_path):
+    image = str(tmp_path / "logo.png")
+    Image.new("RGB", (300, 100), "green").save(image)
+    inputs = [scan, image, scan]
+    outputs = []
+    for streaming in (False, True):
+        output = str(tmp_path / f"merged_{streaming}.pdf")
+        assert pdf_engine.merge_files(inputs, output, workers=1, streaming=streaming) == []
+        outputs.append(PdfReader(output, strict=True))
+    for reader in outputs:
+        assert len(reader.pages) == 11
+        assert {tuple(round(float(n)) for n in page.mediabox) for page in reader.pages} == {(0, 0, 595, 842)}
+    assert [page.extract_text() for page in outputs[0].pages] == [page.extract_text() for page in outputs[1].pages]
+
+
+def test_streaming_merge_skips_unreadable_inputs(scan, tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"%PDF-1.7 not really")
+    output = str(tmp_path / "merged.pdf")
+    failures = pdf_engine.merge_files([scan, str(broken)], output, workers=1, streaming=True)
+    assert [path for path, _ in failures] == [str(broken)]
+    assert len(PdfReader(output, strict=True).pages) == 5
@@ -0,0 +1,104 @@
+"""Outlines, split parts and page maps written in the merge pass."""
+import io
+import json
+import os
+import threading
+
+import pytest
+
+import pdf_engine
+from pdf_backend import pymupdf
+from pypdf import PdfReader, PdfWriter
+
+
+def pdf(path, pages):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(595, 842)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    return [pdf(tmp_path / "a.pdf", 3), pdf(tmp_path / "b.pdf", 1), pdf(tmp_path / "c.pdf", 2)]
+
+
+def outline_titles(path):
+    return [(item.title, PdfReader(path).get_destination_page_number(item)) for item in PdfReader(path).outline]
+
+
+@pytest.mark.parametrize("merge", ["merge_files", "merge_pdfs"])
+def test_split_pages_parts_and_page_map(inputs, tmp_path, merge):
+    output = str(tmp_path / "pack.pdf")
+    page_map = str(tmp_path / "map.json")
+    broken = tmp_path / "broken.pdf" if merge == "merge_files" else tmp_path / "missing.pdf"
+    if merge == "merge_files":
+        broken.write_bytes(b"not a PDF")
+    kwargs = {"workers": 1} if merge == "merge_files" else {}
+    getattr(pdf_engine, merge)(inputs + [str(broken)], output, outline=True, split_pages=2, page_map=page_map,
+                               **kwargs)
+
+    assert len(PdfReader(output, strict=True).pages) == 6
+    assert outline_titles(output) == [("a", 0), ("b", 3), ("c", 4)]
+    parts = [str(tmp_path / f"pack_part00{n}.pdf") for n in (1, 2, 3)]
+    assert [len(PdfReader(part, strict=True).pages) for part in parts] == [2, 2, 2]
+    assert outline_titles(parts[1]) == [("a", 0), ("b", 1)]
+    assert not os.path.exists(tmp_path / "pack_part004.pdf")
+
+    with open(page_map, encoding="utf-8") as f:
+        mapping = json.load(f)
+    assert mapping["output"] == output and mapping["page_count"] == 6
+    assert [(s["title"], s["first_page"], s["page_count"], s["parts"]) for s in mapping["sources"]] == [
+        ("a", 1, 3, [1, 2]), ("b", 4, 1, [2]), ("c", 5, 2, [3]),
+    ]
+    assert [(p["path"], p["first_page"], p["page_count"]) for p in mapping["parts"]] == [
+        (parts[0], 1, 2), (parts[1], 3, 2), (parts[2], 5, 2),
+    ]
+    assert [p["file_size"] for p in mapping["parts"]] == [os.path.getsize(part) for part in parts]
+    assert [f["source"] for f in mapping["failures"]] == [str(broken)]
+
+
+def test_split_size_keeps_parts_under_the_limit(tmp_path):
+    fitz = pymupdf()
+    document = fitz.open()
+    for n in range(12):
+        page = document.new_page(width=595, height=842)
+        page.insert_image(page.rect, pixmap=fitz.Pixmap(fitz.csRGB, 100, 100, os.urandom(100 * 100 * 3), False))
+    source = str(tmp_path / "scans.pdf")
+    document.save(source)
+    output = str(tmp_path / "pack.pdf")
+    limit = 100 * 1024
+    pdf_engine.merge_pdfs([source, source], output, streaming=True, outline=True, split_bytes=limit)
+
+    parts = sorted(name for name in os.listdir(tmp_path) if name.startswith("pack_part"))
+    assert len(parts) > 2
+    sizes = [os.path.getsize(tmp_path / name) for name in parts]
+    assert max(sizes) <= limit
+    assert sum(len(PdfReader(str(tmp_path / name), strict=True).pages) for name in parts) == 24
+
+
+def test_cancelled_merge_removes_finished_parts(inputs, tmp_path):
+    output = str(tmp_path / "pack.pdf")
+    cancel = threading.Event()
+
+    def progress(done, total, item):
+        if done == 2:
+            cancel.set()
+
+    with pytest.raises(pdf_engine.JobCancelled):
+        pdf_engine.merge_pdfs(inputs, output, split_pages=1, progress=progress, cancel=cancel,
+                              page_map=str(tmp_path / "map.json"))
+    assert sorted(os.listdir(tmp_path)) == ["a.pdf", "b.pdf", "c.pdf"]
+
+
+def test_split_requires_a_path_output(inputs):
+    with pytest.raises(pdf_engine.PdfEngineError, match="must be a path"):
+        pdf_engine.merge_pdfs(inputs, io.BytesIO(), split_pages=2)
+
+
+@pytest.mark.parametrize("text, size", [("512", 512), ("10k", 10240), ("10M", 10 * 1024 ** 2), ("1.5GB", 3 * 1024 ** 3 // 2),
+                                        ("2 MiB", 2 * 1024 ** 2)])
+def test_split_size_argument(text, size):
+    assert pdf_engine._byte_size(text) == size
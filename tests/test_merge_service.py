@@ -0,0 +1,164 @@
+"""The local HTTP service, driven over real HTTP on an ephemeral port."""
+import asyncio
+import http.client
+import io
+import json
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+from merge_service import MergeService
+from pypdf import PdfReader, PdfWriter
+
+
+def blank_pdf(path, pages=1):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(612, 792)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+class Running:
+    """A MergeService running on its own event loop in a background thread."""
+
+    def __init__(self, service):
+        self.service = service
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self.call(service.start())
+
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(60)
+
+    def request(self, method, path, body=None, headers=None):
+        connection = http.client.HTTPConnection("127.0.0.1", self.service.port, timeout=60)
+        try:
+            connection.request(method, path, body, headers or {})
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def close(self):
+        self.call(self.service.close())
+        self.stop()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(10)
+        self.loop.close()
+
+
+@pytest.fixture
+def running(tmp_path):
+    (tmp_path / "allowed").mkdir()
+    service = MergeService(port=0, workers=1, queue_depth=2, allowed_paths=[str(tmp_path / "allowed")],
+                           work_dir=str(tmp_path / "work"))
+    running = Running(service)
+    yield running
+    if not running.loop.is_closed():
+        running.close()
+
+
+def multipart(files, fields=()):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields:
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for filename, data in files:
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+                   f"Content-Type: application/octet-stream\r\n\r\n".encode())
+        body.write(data + b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def test_health(running):
+    status, body = running.request("GET", "/health")
+    assert status == 200
+    assert json.loads(body) == {"running": 0, "queued": 0, "workers": 1, "queue_depth": 2}
+
+
+def test_merge_uploads_and_discard_result_once_sent(running, tmp_path):
+    first, second = blank_pdf(tmp_path / "a.pdf", 2), blank_pdf(tmp_path / "b.pdf", 3)
+    with open(first, "rb") as a, open(second, "rb") as b:
+        body, headers = multipart([("a.pdf", a.read()), ("b.pdf", b.read())])
+    status, pdf = running.request("POST", "/jobs/merge-pdfs?wait=1", body, headers)
+    assert status == 200
+    assert len(PdfReader(io.BytesIO(pdf)).pages) == 5
+    # The job is discarded right after its last byte is sent
+    deadline = time.monotonic() + 10
+    while (running.service.jobs or os.listdir(running.service.work_dir)) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert running.service.jobs == {}
+    assert os.listdir(running.service.work_dir) == []
+
+
+def test_merge_server_side_paths(running, tmp_path):
+    source = blank_pdf(tmp_path / "allowed" / "a.pdf", 2)
+    body = json.dumps({"paths": [source, source]}).encode()
+    status, pdf = running.request("POST", "/jobs/merge?wait=1", body, {"Content-Type": "application/json"})
+    assert status == 200
+    reader = PdfReader(io.BytesIO(pdf))
+    assert len(reader.pages) == 4
+    assert [float(n) for n in reader.pages[0].mediabox] == pytest.approx([0, 0, 595, 842], abs=1)
+
+
+def test_path_outside_allowed_folders_is_forbidden(running, tmp_path):
+    outside = blank_pdf(tmp_path / "outside.pdf")
+    body = json.dumps({"paths": [outside]}).encode()
+    status, response = running.request("POST", "/jobs/merge", body, {"Content-Type": "application/json"})
+    assert status == 403
+    assert "not under an allowed folder" in json.loads(response)["error"]
+
+
+def test_invalid_page_size_fails_the_job(running, tmp_path):
+    source = blank_pdf(tmp_path / "allowed" / "a.pdf")
+    body = json.dumps({"paths": [source], "size": "abc"}).encode()
+    status, response = running.request("POST", "/jobs/resize?wait=1", body, {"Content-Type": "application/json"})
+    assert status == 422
+    job = json.loads(response)
+    assert job["status"] == "failed"
+    assert "Invalid page size" in job["error"]
+
+
+def test_invalid_content_length_is_rejected(running):
+    status, _ = running.request("POST", "/jobs/merge", b"{}", {"Content-Type": "application/json",
+                                                                "Content-Length": "1e3"})
+    assert status == 400
+
+
+def test_deleting_a_queued_job_reports_it_cancelled(running, tmp_path):
+    source = blank_pdf(tmp_path / "allowed" / "a.pdf")
+    body = json.dumps({"paths": [source]}).encode()
+    # Take the only worker slot so the job stays queued
+    running.call(running.service._slots.acquire())
+    status, response = running.request("POST", "/jobs/merge", body, {"Content-Type": "application/json"})
+    assert status == 202
+    job = json.loads(response)
+    assert job["status"] == "queued"
+    status, response = running.request("DELETE", job["status_url"])
+    assert status == 200
+    assert json.loads(response)["status"] == "cancelled"
+    running.loop.call_soon_threadsafe(running.service._slots.release)
+    status, response = running.request("GET", job["status_url"])
+    assert json.loads(response)["status"] == "cancelled"
+
+
+def test_close_leaves_no_task_pending(running):
+    expire = running.service._expire_task
+    running.call(running.service.close())
+    assert expire.cancelled()
+    assert not os.path.exists(running.service.work_dir)
+    assert running.call(_other_tasks()) == []
+    running.stop()
+
+
+async def _other_tasks():
+    return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
@@ -0,0 +1,106 @@
+"""OdtBatchConverter against a stub converter instead of LibreOffice."""
+import os
+import stat
+import sys
+import threading
+
+import pytest
+
+from odt_converter import OdtBatchConverter
+
+# Accepts LibreOffice's arguments and writes a PDF for every input, unless an
+# input's name asks it to crash (the whole invocation fails, writing nothing)
+# or to hang
+STUB = """#!{python}
+import os, sys, time
+args = sys.argv[1:]
+output_dir = args[args.index("--outdir") + 1]
+files = args[args.index("--outdir") + 2:]
+if any("hang" in os.path.basename(f) for f in files):
+    time.sleep(60)
+if any("crash" in os.path.basename(f) for f in files):
+    sys.exit(3)
+for f in files:
+    name = os.path.splitext(os.path.basename(f))[0] + ".pdf"
+    with open(os.path.join(output_dir, name), "wb") as pdf:
+        pdf.write(b"%PDF-1.4 stub")
+"""
+
+
+@pytest.fixture
+def stub(tmp_path):
+    path = tmp_path / "fake-libreoffice"
+    path.write_text(STUB.format(python=sys.executable))
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+def odt_files(folder, *names):
+    paths = []
+    for name in names:
+        path = folder / f"{name}.odt"
+        path.write_bytes(b"odt")
+        paths.append(str(path))
+    return paths
+
+
+def convert(converter, files, **kwargs):
+    """Run converter.convert(), failing the test instead of hanging."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["results"] = converter.convert(files, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(60)
+    assert not thread.is_alive(), "convert() did not return"
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["results"]
+
+
+def test_converts_every_file(stub, tmp_path):
+    files = odt_files(tmp_path, "a", "b", "c")
+    out = tmp_path / "out"
+    with OdtBatchConverter(stub, instances=2, files_per_call=2) as converter:
+        results = convert(converter, files, output_dir=str(out))
+    assert [r.ok for r in results] == [True, True, True]
+    assert sorted(os.listdir(out)) == ["a.pdf", "b.pdf", "c.pdf"]
+
+
+def test_crash_only_fails_its_own_file(stub, tmp_path):
+    files = odt_files(tmp_path, "a", "crash", "b")
+    with OdtBatchConverter(stub, instances=1, files_per_call=3) as converter:
+        results = convert(converter, files)
+    assert [r.ok for r in results] == [True, False, True]
+    assert "status 3" in str(results[1].error)
+
+
+def test_hang_is_killed_and_only_fails_its_own_file(stub, tmp_path):
+    files = odt_files(tmp_path, "a", "hang")
+    with OdtBatchConverter(stub, instances=1, files_per_call=2, timeout=1) as converter:
+        results = convert(converter, files)
+    assert [r.ok for r in results] == [True, False]
+    assert "timed out" in str(results[1].error)
+
+
+def test_missing_command_fails_every_file(tmp_path):
+    files = odt_files(tmp_path, "a", "b")
+    with OdtBatchConverter(str(tmp_path / "no-such-libreoffice"), files_per_call=1) as converter:
+        results = convert(converter, files)
+    assert not any(r.ok for r in results)
+    assert all(isinstance(r.error, RuntimeError) for r in results)
+    assert "Could not run" in str(results[0].error)
+
+
+def test_cancel_fails_remaining_files(stub, tmp_path):
+    files = odt_files(tmp_path, "a", "b")
+    cancel = threading.Event()
+    cancel.set()
+    with OdtBatchConverter(stub, instances=1, files_per_call=1) as converter:
+        results = convert(converter, files, cancel=cancel)
+    assert not any(r.ok for r in results)
@@ -0,0 +1,73 @@
+"""Page selection expressions and the extract/remove operations built on them."""
+import pytest
+
+import pdf_engine
+from pdf_engine import PdfEngineError, parse_page_selection
+from pypdf import PdfReader, PdfWriter
+
+
+@pytest.mark.parametrize("expression, indices", [
+    ("7", [6]),
+    ("1-3,7", [0, 1, 2, 6]),
+    ("8-", [7, 8, 9]),
+    ("-3--1", [7, 8, 9]),
+    ("-1", [9]),
+    ("odd", [0, 2, 4, 6, 8]),
+    ("even", [1, 3, 5, 7, 9]),
+    ("all", list(range(10))),
+    ("2-7:odd", [2, 4, 6]),
+    ("1-4:even", [1, 3]),
+    ("3, 1-2 ,3", [0, 1, 2]),
+    ("EVEN", [1, 3, 5, 7, 9]),
+])
+def test_selections(expression, indices):
+    assert parse_page_selection(expression, 10) == indices
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("0", "outside"),
+    ("11", "outside"),
+    ("-11", "outside"),
+    ("5-3", "Invalid page range"),
+    ("1-3:prime", "Invalid page selection"),
+    ("abc", "Invalid page selection"),
+    ("1,,2", "Invalid page selection"),
+    ("", "Invalid page selection"),
+])
+def test_invalid_selections(expression, message):
+    with pytest.raises(PdfEngineError, match=message):
+        parse_page_selection(expression, 10)
+
+
+@pytest.fixture
+def numbered(tmp_path):
+    """A 10-page PDF whose page n is n points wide."""
+    writer = PdfWriter()
+    for n in range(1, 11):
+        writer.add_blank_page(n, 100)
+    path = str(tmp_path / "numbered.pdf")
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def widths(path):
+    return [round(float(page.mediabox.width)) for page in PdfReader(path, strict=True).pages]
+
+
+def test_extract_pages(numbered, tmp_path):
+    output = str(tmp_path / "out.pdf")
+    pdf_engine.extract_pages(numbered, output, "-2-,1")
+    assert widths(output) == [1, 9, 10]
+
+
+def test_remove_pages(numbered, tmp_path):
+    output = str(tmp_path / "out.pdf")
+    pdf_engine.remove_and_resize_pages(numbered, output, "odd")
+    assert widths(output) == [2, 4, 6, 8, 10]
+
+
+def test_remove_pages_by_index_and_resize(numbered, tmp_path):
+    output = str(tmp_path / "out.pdf")
+    pdf_engine.remove_and_resize_pages(numbered, output, [0, 1], resize_pages_to=(595, 842))
+    assert widths(output) == [595] * 8
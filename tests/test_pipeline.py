@@ -0,0 +1,102 @@
+"""Pipelines: building them from specs and running them in one pass."""
+import json
+
+import pytest
+from PIL import Image
+
+import pdf_engine
+from pdf_engine import PdfEngineError
+from pipeline import Pipeline, load_pipeline
+from pypdf import PdfReader, PdfWriter
+
+
+@pytest.fixture
+def numbered(tmp_path):
+    """A 6-page PDF whose page n is 100 * n points wide."""
+    writer = PdfWriter()
+    for n in range(1, 7):
+        writer.add_blank_page(100 * n, 1000)
+    path = str(tmp_path / "numbered.pdf")
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def test_from_spec_reads_every_step_form():
+    pipeline = Pipeline.from_spec({
+        "inputs": ["a.pdf"],
+        "optimize": True,
+        "steps": [
+            {"remove": "1-2"},
+            {"select": "odd"},
+            {"trim": 50},
+            {"trim": {"top": 10, "bottom": 20}},
+            {"autotrim": 5},
+            {"rotate": 90},
+            {"resize": "400x600"},
+            {"resize": {"size": "a4", "mode": "fill"}},
+            {"normalize": None},
+        ],
+    })
+    assert pipeline.inputs == ["a.pdf"] and pipeline.optimize
+    assert [name for name, _ in pipeline.steps] == ["remove", "select", "trim", "trim", "autotrim", "rotate",
+                                                     "resize", "resize", "normalize"]
+    assert pipeline.steps[2][1] == {"top": 50, "bottom": 50}
+    assert pipeline.steps[4][1]["margin"] == 5
+    assert pipeline.steps[6][1] == {"size": (400.0, 600.0), "mode": "fit"}
+    assert pipeline.steps[7][1] == {"size": pdf_engine.A4_SIZE, "mode": "fill"}
+
+
+@pytest.mark.parametrize("step, message", [
+    ({"shrink": 2}, "Unknown pipeline step"),
+    ({"rotate": 90, "trim": 10}, "single-key"),
+    ("rotate", "single-key"),
+    ({"resize": "big"}, "Invalid page size"),
+])
+def test_from_spec_rejects_bad_steps(step, message):
+    with pytest.raises(PdfEngineError, match=message):
+        Pipeline.from_spec({"inputs": ["a.pdf"], "steps": [step]})
+
+
+def test_run_applies_steps_in_order_to_each_input(numbered, tmp_path):
+    output = str(tmp_path / "out.pdf")
+    failures = Pipeline([numbered, numbered]).remove("1-2").select("odd").rotate(90).run(output)
+    assert failures == []
+    reader = PdfReader(output, strict=True)
+    # Pages 3 and 5 of each input: select counts from what remove left
+    assert [round(float(page.mediabox.width)) for page in reader.pages] == [300, 500, 300, 500]
+    assert {page.rotation for page in reader.pages} == {90}
+
+
+def test_run_resizes_images_and_pdfs_and_reports_failures(numbered, tmp_path):
+    image = str(tmp_path / "logo.png")
+    Image.new("RGB", (200, 100), "red").save(image)
+    missing = str(tmp_path / "missing.pdf")
+    output = str(tmp_path / "out.pdf")
+    failures = Pipeline([image, missing, numbered]).select("1").resize("300x400").run(output)
+    assert [path for path, _ in failures] == [missing]
+    reader = PdfReader(output, strict=True)
+    assert [[round(float(n)) for n in page.mediabox] for page in reader.pages] == [[0, 0, 300, 400]] * 2
+
+
+def test_run_without_inputs_fails(tmp_path):
+    with pytest.raises(PdfEngineError):
+        Pipeline().rotate(90).run(str(tmp_path / "out.pdf"))
+
+
+def test_load_pipeline_from_json(numbered, tmp_path):
+    spec_path = tmp_path / "job.json"
+    output = str(tmp_path / "out.pdf")
+    spec_path.write_text(json.dumps({"inputs": [numbered], "output": output, "steps": [{"select": "-1"}]}))
+    pipeline, spec = load_pipeline(str(spec_path))
+    assert spec["output"] == output
+    pipeline.run(output)
+    assert len(PdfReader(output, strict=True).pages) == 1
+
+
+def test_pipeline_command(numbered, tmp_path):
+    spec_path = tmp_path / "job.json"
+    output = str(tmp_path / "out.pdf")
+    spec_path.write_text(json.dumps({"inputs": [numbered], "output": output, "steps": [{"remove": "odd"}]}))
+    assert pdf_engine.main(["pipeline", str(spec_path)]) == 0
+    assert len(PdfReader(output, strict=True).pages) == 3
@@ -0,0 +1,33 @@
+"""resize_pdf output size and validity."""
+import os
+
+import pytest
+
+import pdf_engine
+from pdf_backend import pymupdf
+from pypdf import PdfReader
+
+
+@pytest.fixture(scope="module", params=["object-streams", "xref-table"])
+def report(request, tmp_path_factory):
+    fitz = pymupdf()
+    document = fitz.open()
+    for n in range(500):
+        page = document.new_page(width=612, height=792)
+        page.insert_text((72, 72), f"Page {n + 1} of a long report", fontsize=14)
+        page.insert_text((72, 100), "Lorem ipsum dolor sit amet, consectetur adipiscing elit.", fontsize=10)
+    path = tmp_path_factory.mktemp("resize") / f"{request.param}.pdf"
+    document.save(str(path), use_objstms=int(request.param == "object-streams"), garbage=3, deflate=True)
+    return str(path)
+
+
+@pytest.mark.parametrize("mode", pdf_engine.RESIZE_MODES)
+def test_resized_output_is_not_larger_than_input(report, tmp_path, mode):
+    output = str(tmp_path / "resized.pdf")
+    pdf_engine.resize_pdf(report, output, pdf_engine.A4_SIZE, mode)
+    assert os.path.getsize(output) <= os.path.getsize(report)
+
+    reader = PdfReader(output, strict=True)
+    assert len(reader.pages) == 500
+    assert [float(n) for n in reader.pages[0].mediabox] == [0, 0, 595, 842]
+    assert "Page 500 of a long report" in reader.pages[499].extract_text()
@@ -0,0 +1,60 @@
+"""StreamingPdfWriter: optimize deduplication and its stats."""
+import io
+import os
+
+import pytest
+from PIL import Image, ImageCms
+
+import pdf_engine
+from pdf_backend import pymupdf
+from pypdf import PdfReader
+
+
+@pytest.fixture(scope="module")
+def logo(tmp_path_factory):
+    """A one-page PDF showing an image with a soft mask and an ICCBased color space."""
+    image = Image.frombytes("RGBA", (200, 100), os.urandom(200 * 100 * 4))
+    png = io.BytesIO()
+    image.save(png, "PNG", icc_profile=ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes())
+    document = pymupdf().open()
+    page = document.new_page(width=595, height=842)
+    page.insert_image(page.rect, stream=png.getvalue())
+    path = tmp_path_factory.mktemp("writer") / "logo.pdf"
+    document.save(str(path))
+    return str(path)
+
+
+def objects(path):
+    reader = PdfReader(path, strict=True)
+    return [reader.get_object(num) for num in range(1, reader.trailer["/Size"])]
+
+
+def test_duplicate_image_with_references_is_written_once(logo, tmp_path):
+    image = PdfReader(logo).pages[0]["/Resources"]["/XObject"]["/fzImg0"]
+    assert "/SMask" in image and image["/ColorSpace"][0] == "/ICCBased"
+
+    output = str(tmp_path / "merged.pdf")
+    stats = {}
+    pdf_engine.merge_pdfs([logo, logo, logo], output, optimize=True, stats=stats)
+
+    streams = [obj for obj in objects(output) if hasattr(obj, "get_data")]
+    images = [obj for obj in streams if obj.get("/Subtype") == "/Image"]
+    profiles = [obj for obj in streams if "/N" in obj and obj.get("/Type") != "/ObjStm"]
+    assert len(images) == 2  # the image and its soft mask
+    assert len(profiles) == 1
+    assert stats["streams_deduplicated"] >= 2
+    assert stats["bytes_deduplicated"] >= 2 * len(images[0].get_data())
+    assert stats["bytes_saved"] == stats["bytes_deduplicated"] + stats["bytes_compressed"]
+
+    reader = PdfReader(output, strict=True)
+    assert len(reader.pages) == 3
+    assert len({page["/Resources"]["/XObject"].raw_get("/fzImg0").idnum for page in reader.pages}) == 1
+
+
+def test_optimize_only_shrinks_the_output(logo, tmp_path):
+    plain, optimized = str(tmp_path / "plain.pdf"), str(tmp_path / "optimized.pdf")
+    pdf_engine.merge_pdfs([logo, logo], plain, streaming=True)
+    stats = {}
+    pdf_engine.merge_pdfs([logo, logo], optimized, optimize=True, stats=stats)
+    assert os.path.getsize(plain) - os.path.getsize(optimized) >= stats["bytes_deduplicated"] > 0
+    assert len(PdfReader(optimized, strict=True).pages) == 2
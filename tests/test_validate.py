@@ -0,0 +1,90 @@
+"""validate_inputs and the pre-flight check of merges."""
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import pdf_engine
+from pdf_engine import InvalidInputsError
+from pypdf import PdfWriter
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    writer = PdfWriter()
+    writer.add_blank_page(595, 842)
+    writer.add_blank_page(595, 842).rotate(90)
+    good = str(tmp_path / "good.pdf")
+    with open(good, "wb") as f:
+        writer.write(f)
+
+    writer = PdfWriter()
+    writer.add_blank_page(100, 100)
+    writer.encrypt("secret")
+    locked = str(tmp_path / "locked.pdf")
+    with open(locked, "wb") as f:
+        writer.write(f)
+
+    damaged = tmp_path / "damaged.pdf"
+    damaged.write_bytes(b"%PDF-1.7\nnot really a PDF")
+    image = str(tmp_path / "photo.png")
+    Image.new("RGB", (64, 48), "white").save(image)
+    not_image = tmp_path / "notes.png"
+    not_image.write_text("just text")
+    return {"good": good, "locked": locked, "damaged": str(damaged), "image": image,
+            "not_image": str(not_image), "missing": str(tmp_path / "missing.pdf")}
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_reports_every_input_in_order(inputs, workers):
+    order = ["good", "locked", "damaged", "image", "not_image", "missing", "good"]
+    infos = pdf_engine.validate_inputs([inputs[name] for name in order], workers=workers)
+    assert [info.source for info in infos] == [inputs[name] for name in order]
+    assert [info.ok for info in infos] == [True, False, False, True, False, False, True]
+
+    good = infos[0]
+    assert good.kind == "pdf" and good.pages == 2
+    assert good.page_sizes == [(595, 842), (842, 595)]
+    assert good.file_size == os.path.getsize(inputs["good"])
+    assert "2 pages, mixed page sizes" in good.describe()
+    assert "password" in str(infos[1].error)
+    assert "Damaged or not a PDF" in str(infos[2].error)
+    assert infos[3].kind == "image" and infos[3].image_size == (64, 48) and infos[3].pages == 1
+    assert isinstance(infos[5].error, FileNotFoundError)
+
+
+def test_in_memory_inputs_are_checked_and_left_where_they_were(inputs):
+    with open(inputs["good"], "rb") as f:
+        data = f.read()
+    stream = io.BytesIO(data)
+    stream.seek(5)
+    infos = pdf_engine.validate_inputs([data, stream])
+    assert [info.pages for info in infos] == [2, 2]
+    assert infos[0].file_size == len(data)
+    assert stream.tell() == 5
+
+
+def test_page_offsets_skip_invalid_inputs(inputs):
+    infos = pdf_engine.validate_inputs([inputs["good"], inputs["missing"], inputs["image"], inputs["good"]])
+    assert pdf_engine.page_offsets(infos) == ([0, None, 2, 3], 5)
+
+
+def test_merge_with_validate_writes_nothing_when_an_input_is_bad(inputs, tmp_path):
+    output = tmp_path / "merged.pdf"
+    with pytest.raises(InvalidInputsError) as raised:
+        pdf_engine.merge_files([inputs["good"], inputs["damaged"], inputs["missing"]], str(output), workers=1,
+                               validate=True)
+    assert [info.source for info in raised.value.infos] == [inputs["damaged"], inputs["missing"]]
+    assert "2 of the inputs cannot be merged" in str(raised.value)
+    assert not output.exists()
+
+    with pytest.raises(InvalidInputsError):
+        pdf_engine.merge_pdfs([inputs["good"], inputs["locked"]], str(output), validate=True)
+    assert not output.exists()
+
+
+def test_validate_command(inputs, capsys):
+    assert pdf_engine.main(["validate", inputs["good"], inputs["image"]]) == 0
+    assert pdf_engine.main(["validate", inputs["good"], inputs["damaged"]]) != 0
+    assert "damaged.pdf: Damaged or not a PDF" in capsys.readouterr().err
@@ -0,0 +1,153 @@
+"""Watch folder: per-file pipeline, journal and the incrementally appended merge."""
+import json
+import os
+
+import pytest
+from PIL import Image
+
+import watch_folder
+from pdf_backend import pymupdf
+from pypdf import PdfReader, PdfWriter
+from watch_folder import FolderWatcher, Journal
+
+
+def blank_pdf(path, pages=1):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(612, 792)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+@pytest.fixture
+def folders(tmp_path):
+    incoming, output = tmp_path / "incoming", tmp_path / "output"
+    incoming.mkdir()
+    return incoming, output
+
+
+def watch(incoming, output, **options):
+    watcher = FolderWatcher([str(incoming)], str(output), workers=1, settle=0, poll_interval=0.05, **options)
+    watcher.run(once=True)
+    return watcher
+
+
+def test_process_file_runs_all_steps_in_one_write(tmp_path):
+    source = blank_pdf(tmp_path / "scan.pdf", 2)
+    output = str(tmp_path / "out" / "scan.pdf")
+    os.mkdir(tmp_path / "out")
+    watch_folder.process_file(source, output, ["normalize", "trim", "resize"], size=(400, 600),
+                              trim_top=100, trim_bottom=100)
+    reader = PdfReader(output, strict=True)
+    assert len(reader.pages) == 2
+    assert [round(float(n)) for n in reader.pages[0].mediabox] == [0, 0, 400, 600]
+    assert os.listdir(tmp_path / "out") == ["scan.pdf"]
+
+
+def test_process_file_autotrim_crops_to_content(tmp_path):
+    fitz = pymupdf()
+    document = fitz.open()
+    page = document.new_page(width=612, height=792)
+    page.draw_rect(fitz.Rect(100, 100, 300, 200), color=(0, 0, 0), fill=(0, 0, 0))
+    source = str(tmp_path / "scan.pdf")
+    document.save(source)
+    output = str(tmp_path / "trimmed.pdf")
+    watch_folder.process_file(source, output, ["autotrim"])
+    box = PdfReader(output, strict=True).pages[0].mediabox
+    assert 200 < float(box.width) < 240 and 100 < float(box.height) < 140
+
+
+def test_process_file_renders_images(tmp_path):
+    source = str(tmp_path / "photo.png")
+    Image.new("RGB", (300, 200), "blue").save(source)
+    output = str(tmp_path / "photo.pdf")
+    watch_folder.process_file(source, output, ["trim"], trim_top=10, trim_bottom=10)
+    page = PdfReader(output, strict=True).pages[0]
+    assert round(float(page.mediabox.height)) == 842 - 20
+
+
+def test_journal_keeps_the_latest_record_and_survives_a_torn_line(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path)
+    journal.record(("a.pdf", 1, 1), "started", output="a_out.pdf")
+    journal.record(("a.pdf", 1, 1), "done", output="a_out.pdf")
+    journal.record(("a.pdf", 2, 2), "failed", output="a_out.pdf", error="boom")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"source": "b.pdf", "si')
+
+    journal = Journal(path)
+    journal.close()
+    assert journal.status(("a.pdf", 2, 2)) == "failed"
+    assert journal.status(("a.pdf", 1, 1)) is None  # compacted away: same source, older content
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["status"] for line in f] == ["failed"]
+
+
+def test_finished_files_are_skipped_after_a_restart(folders):
+    incoming, output = folders
+    blank_pdf(incoming / "a.pdf")
+    results = []
+    watch(incoming, output, on_result=results.append)
+    watch(incoming, output, on_result=results.append)
+    assert [r.ok for r in results] == [True]
+
+
+def test_merge_appends_only_new_outputs(folders, tmp_path):
+    incoming, output = folders
+    merged = str(tmp_path / "all.pdf")
+    blank_pdf(incoming / "a.pdf", 2)
+    blank_pdf(incoming / "b.pdf", 3)
+    watch(incoming, output, merge_output=merged)
+    assert len(PdfReader(merged, strict=True).pages) == 5
+    with open(merged, "rb") as f:
+        before = f.read()
+
+    blank_pdf(incoming / "c.pdf", 1)
+    watch(incoming, output, merge_output=merged)
+    with open(merged, "rb") as f:
+        after = f.read()
+    assert after.startswith(before)
+    # Only the new page, its page tree node and the new xref stream
+    assert len(after) - len(before) < 2000
+    assert len(PdfReader(merged, strict=True).pages) == 6
+
+
+def test_interrupted_append_is_undone_on_restart(folders, tmp_path):
+    incoming, output = folders
+    merged = str(tmp_path / "all.pdf")
+    blank_pdf(incoming / "a.pdf", 2)
+    watch(incoming, output, merge_output=merged)
+    with open(merged, "rb") as f:
+        good = f.read()
+    with open(merged, "ab") as f:
+        f.write(b"half an append")
+
+    watch(incoming, output, merge_output=merged)
+    with open(merged, "rb") as f:
+        assert f.read() == good
+
+
+def test_missing_merge_file_is_rebuilt(folders, tmp_path):
+    incoming, output = folders
+    merged = str(tmp_path / "all.pdf")
+    blank_pdf(incoming / "a.pdf", 2)
+    blank_pdf(incoming / "b.pdf", 1)
+    watch(incoming, output, merge_output=merged)
+    os.remove(merged)
+    watch(incoming, output, merge_output=merged)
+    assert len(PdfReader(merged, strict=True).pages) == 3
+
+
+def test_failed_file_is_retried_at_restart(folders):
+    incoming, output = folders
+    (incoming / "bad.pdf").write_bytes(b"not a PDF")
+    results = []
+    watch(incoming, output, on_result=results.append, retry_delay=3600)
+    watch(incoming, output, on_result=results.append, retry_delay=3600)
+    assert [r.ok for r in results] == [False, False]
+    journal = Journal(str(output / watch_folder.JOURNAL_NAME))
+    journal.close()
+    record, = journal.entries.values()
+    assert record["status"] == "failed" and record["attempts"] == 2
@@ -0,0 +1,470 @@
+"""
+Watch-folder service: normalize scans as soon as they land.
+
+FolderWatcher watches one or more folders for new PDFs and images and runs
+each file through a pipeline of engine steps on a process pool:
+
+    normalize   A4 layout, as merge_files gives (images become pages)
+    trim        as trim_whitespace
+    autotrim    as auto_trim_pdf (crop each page to its detected content)
+    resize      as resize_pdf
+
+The steps run as a pipeline.Pipeline, so each file is parsed once and its
+output written once, with no intermediate files.
+
+A file is picked up once its size and modification time have not changed
+for ``settle`` seconds, so scanners that are still writing are left alone.
+On Linux the watcher sleeps on inotify and wakes as soon as a folder
+changes; elsewhere it polls every ``poll_interval`` seconds.
+
+Every file is recorded in a JSON-lines journal (``.watch-journal.jsonl`` in
+the output folder by default) when it is started and when it finishes.
+Files are identified by path, size and modification time, so after a
+restart finished files are skipped, files that were in flight are run
+again, and a file that is replaced with new content is processed anew.
+Failed files are tried again after ``retry_delay`` seconds, doubling up to
+``max_retry_delay``, and once more whenever the service restarts.
+Outputs are written atomically, so an interrupted run never leaves a
+truncated PDF behind. Run ``python watch_folder.py --help`` for the CLI.
+
+With ``merge_output``, finished outputs are also appended to one merged
+PDF as incremental updates, so each batch only writes its own pages. The
+journal records how long the merged file is after every append; an append
+cut short is truncated away on restart and written again, and a merged
+file that went missing is rebuilt from every output.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+import pdf_backend
+from pdf_engine import A4_SIZE, BatchResult, PdfEngineError, atomic_output, parse_page_size
+from pipeline import Pipeline
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tiff")
+STEPS = ("normalize", "trim", "autotrim", "resize")
+JOURNAL_NAME = ".watch-journal.jsonl"
+
+# Files being written by other tools under a temporary name
+_PARTIAL_SUFFIXES = (".part", ".tmp", ".crdownload", ".partial")
+
+
+# =========================
+# Pipeline
+# =========================
+def process_file(source, output_file, steps, size=A4_SIZE, trim_top=190, trim_bottom=190):
+    """
+    Run ``source`` through ``steps`` and atomically write the result to ``output_file``.
+
+    The steps run as one Pipeline, so the file is parsed once and written
+    once; images are rendered to A4 pages when they are loaded.
+    """
+    pipeline = Pipeline([source])
+    for step in steps or ["normalize"]:
+        if step == "normalize":
+            pipeline.normalize()
+        elif step == "trim":
+            pipeline.trim(trim_top, trim_bottom)
+        elif step == "autotrim":
+            pipeline.autotrim()
+        elif step == "resize":
+            pipeline.resize(size)
+        else:
+            raise PdfEngineError(f"Unknown pipeline step: {step!r}")
+    failures = pipeline.run(output_file)
+    if failures:
+        raise PdfEngineError(f"Could not process {source}: {failures[0][1]}")
+    return output_file
+
+
+# =========================
+# Journal
+# =========================
+class Journal:
+    """
+    Append-only JSON-lines record of every file the watcher has handled.
+
+    Each line holds a file's key (path, size and modification time), its
+    status (``started``, ``done`` or ``failed``) and its output; the last
+    line for a key wins. Lines are flushed and fsynced as they are written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash
+                    self.entries[self.key(record["source"], record["size"], record["mtime_ns"])] = record
+        self.compact()
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def key(source, size, mtime_ns):
+        return source, size, mtime_ns
+
+    def status(self, key):
+        record = self.entries.get(key)
+        return record["status"] if record else None
+
+    def record(self, key, status, **fields):
+        source, size, mtime_ns = key
+        record = {"source": source, "size": size, "mtime_ns": mtime_ns, "status": status,
+                  "time": round(time.time(), 3), **fields}
+        self.entries.pop(key, None)
+        self.entries[key] = record
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def compact(self):
+        """Rewrite the journal with only the latest line per source path."""
+        latest = {record["source"]: key for key, record in self.entries.items()}
+        self.entries = {key: self.entries[key] for key in self.entries if latest[key[0]] == key}
+        with atomic_output(self.path) as f:
+            for record in self.entries.values():
+                f.write((json.dumps(record) + "\n").encode("utf-8"))
+
+    def close(self):
+        self._file.close()
+
+
+# =========================
+# Change Notification
+# =========================
+_IN_MODIFY, _IN_CLOSE_WRITE, _IN_MOVED_TO, _IN_CREATE = 0x2, 0x8, 0x80, 0x100
+
+
+def _inotify_fd(folders):
+    """Return an inotify descriptor watching ``folders``, or None where inotify is unavailable."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+    for folder in folders:
+        if libc.inotify_add_watch(fd, os.fsencode(folder), mask) < 0:
+            os.close(fd)
+            return None
+    return fd
+
+
+def _drain(fd):
+    """Discard pending inotify events; the next scan finds what changed."""
+    while True:
+        try:
+            os.read(fd, 65536)
+        except BlockingIOError:
+            return
+
+
+# =========================
+# Watcher
+# =========================
+def _ignore_interrupts():
+    # Ctrl+C reaches the whole process group; let the parent stop workers cleanly
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class FolderWatcher:
+    def __init__(self, folders, output_dir, steps=("normalize",), journal_path=None, workers=None,
+                 settle=2.0, poll_interval=1.0, size=A4_SIZE, trim_top=190, trim_bottom=190,
+                 merge_output=None, on_result=None, retry_delay=30.0, max_retry_delay=3600.0):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.output_dir = os.path.abspath(output_dir)
+        if self.output_dir in self.folders:
+            raise PdfEngineError("The output folder must not be one of the watched folders.")
+        for step in steps:
+            if step not in STEPS:
+                raise PdfEngineError(f"Unknown pipeline step: {step!r}")
+        self.steps = list(steps)
+        self.workers = workers or os.cpu_count() or 1
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.options = {"size": size, "trim_top": trim_top, "trim_bottom": trim_bottom}
+        self.merge_output = merge_output and os.path.abspath(merge_output)
+        self.on_result = on_result
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._started = time.time()
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.journal = Journal(journal_path or os.path.join(self.output_dir, JOURNAL_NAME))
+        self._candidates = {}  # path -> (size, mtime_ns, unchanged since)
+        self._pending = {}     # future -> journal key
+        self._to_merge = []    # journal keys of outputs not yet in merge_output
+        self._merge_state = None
+        if self.merge_output:
+            self._recover_merge()
+
+    def _scan(self):
+        """Yield ``(path, stat)`` for every PDF or image in the watched folders."""
+        for folder in self.folders:
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                name = entry.name.lower()
+                if name.startswith(".") or name.endswith(_PARTIAL_SUFFIXES):
+                    continue
+                if not name.endswith((".pdf",) + IMAGE_EXTENSIONS):
+                    continue
+                try:
+                    if entry.is_file():
+                        yield entry.path, entry.stat()
+                except FileNotFoundError:
+                    continue
+
+    def _output_for(self, source):
+        stem = os.path.splitext(os.path.basename(source))[0]
+        taken = {record["output"] for record in self.journal.entries.values()
+                 if record["source"] != source and "output" in record}
+        output_file = os.path.join(self.output_dir, stem + ".pdf")
+        n = 1
+        while output_file in taken:
+            output_file = os.path.join(self.output_dir, f"{stem}_{n}.pdf")
+            n += 1
+        return output_file
+
+    def _ready(self, now):
+        """Return journal keys of files that have stopped changing and still need work."""
+        in_flight = set(self._pending.values())
+        seen = set()
+        ready = []
+        for path, stat in self._scan():
+            seen.add(path)
+            key = Journal.key(path, stat.st_size, stat.st_mtime_ns)
+            status = self.journal.status(key)
+            if key in in_flight or status == "done" or (status == "failed" and not self._retry_due(key)):
+                self._candidates.pop(path, None)
+                continue
+            previous = self._candidates.get(path)
+            if previous is None or previous[:2] != (stat.st_size, stat.st_mtime_ns):
+                self._candidates[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - previous[2] >= self.settle:
+                ready.append(key)
+        for path in set(self._candidates) - seen:
+            del self._candidates[path]
+        return ready
+
+    def _retry_due(self, key):
+        """Tell whether a failed file has waited long enough to be tried again."""
+        record = self.journal.entries[key]
+        if record["time"] < self._started:
+            return True
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** (record.get("attempts", 1) - 1))
+        return time.time() - record["time"] >= delay
+
+    def _submit(self, executor, key):
+        source = key[0]
+        output_file = self._output_for(source)
+        attempts = self.journal.entries[key].get("attempts", 0) if self.journal.status(key) == "failed" else 0
+        self.journal.record(key, "started", output=output_file, attempts=attempts)
+        del self._candidates[source]
+        future = executor.submit(process_file, source, output_file, self.steps, **self.options)
+        self._pending[future] = key
+
+    def _collect(self, finished):
+        for future in finished:
+            key = self._pending.pop(future)
+            output_file = self.journal.entries[key]["output"]
+            attempts = self.journal.entries[key].get("attempts", 0) + 1
+            error = future.exception()
+            if error is None:
+                self.journal.record(key, "done", output=output_file)
+                if self.merge_output:
+                    self._to_merge.append(key)
+            else:
+                self.journal.record(key, "failed", output=output_file, error=str(error), attempts=attempts)
+            if self.on_result:
+                self.on_result(BatchResult(key[0], output_file, error))
+
+    # =========================
+    # Merged Output
+    # =========================
+    @property
+    def _merge_key(self):
+        return Journal.key(self.merge_output, 0, 0)
+
+    def _mark_merged(self, key, generation):
+        record = self.journal.entries[key]
+        fields = {name: value for name, value in record.items()
+                  if name not in ("source", "size", "mtime_ns", "status", "time")}
+        self.journal.record(key, "done", **dict(fields, merged=generation))
+
+    def _recover_merge(self):
+        """Find where the merged PDF left off and which outputs still have to be appended to it."""
+        record = self.journal.entries.get(self._merge_key)
+        try:
+            size = os.path.getsize(self.merge_output)
+        except OSError:
+            size = None
+        generation, last_batch = None, set()
+        if record is not None and size is not None and size >= record["state"]["length"]:
+            if size > record["state"]["length"]:
+                # An append was cut short; drop what it wrote
+                with open(self.merge_output, "r+b") as f:
+                    f.truncate(record["state"]["length"])
+            self._merge_state = record["state"]
+            generation = record["generation"]
+            last_batch = {tuple(key) for key in record["batch"]}
+        for key, entry in list(self.journal.entries.items()):
+            if entry["status"] != "done" or (generation and entry.get("merged") == generation):
+                continue
+            if key in last_batch:
+                # Appended, but the restart came before the journal was told
+                self._mark_merged(key, generation)
+            else:
+                self._to_merge.append(key)
+
+    def _merge(self):
+        """Append the outputs finished since the last merge to ``merge_output``."""
+        from pypdf.errors import PyPdfError
+        from streaming_writer import StreamingPdfWriter
+        keys = self._to_merge
+        generation = self.journal.entries[self._merge_key]["generation"] if self._merge_state else uuid.uuid4().hex
+
+        def add_outputs(writer):
+            for key in keys:
+                # Outputs deleted since they were written are left out
+                try:
+                    reader = pdf_backend.open_pdf(self.journal.entries[key]["output"])
+                    pages = list(reader.pages)
+                except (OSError, PyPdfError) as e:
+                    if self.on_result:
+                        self.on_result(BatchResult(key[0], self.merge_output, e))
+                    continue
+                writer.add_pages(pages)
+                pdf_backend.close_pdf(reader)
+            writer.close()
+
+        if self._merge_state is None:
+            with atomic_output(self.merge_output) as f:
+                writer = StreamingPdfWriter(f)
+                add_outputs(writer)
+        else:
+            with open(self.merge_output, "r+b") as f:
+                f.truncate(self._merge_state["length"])
+                f.seek(self._merge_state["length"])
+                writer = StreamingPdfWriter(f, append_to=self._merge_state)
+                add_outputs(writer)
+                f.flush()
+                os.fsync(f.fileno())
+        self.journal.record(self._merge_key, "merged", generation=generation, state=writer.state,
+                            batch=[list(key) for key in keys])
+        self._merge_state = writer.state
+        for key in keys:
+            self._mark_merged(key, generation)
+        self._to_merge = []
+
+    def run(self, stop=None, once=False):
+        """
+        Watch until ``stop`` (a threading.Event) is set.
+
+        With ``once``, process the files present now (after they settle) and
+        return. Files still running when ``stop`` is set are finished first.
+        """
+        import select
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        stop = stop or threading.Event()
+        fd = None if once else _inotify_fd(self.folders)
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_interrupts) as executor:
+                while not stop.is_set():
+                    for key in self._ready(time.monotonic()):
+                        if len(self._pending) >= self.workers * 2:
+                            break
+                        self._submit(executor, key)
+                    if not self._pending and self._to_merge:
+                        self._merge()
+                    if once and not self._pending and not self._candidates:
+                        break
+
+                    # Wake often while files settle or run; otherwise wait for a folder to change
+                    timeout = min(self.poll_interval, self.settle / 2) if self._candidates else self.poll_interval
+                    if self._pending:
+                        finished, _ = wait(self._pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                        self._collect(finished)
+                    elif fd is not None and not self._candidates:
+                        if select.select([fd], [], [], timeout)[0]:
+                            _drain(fd)
+                    else:
+                        stop.wait(timeout)
+
+                if self._pending:
+                    finished, _ = wait(self._pending)
+                    self._collect(finished)
+                if self._to_merge:
+                    self._merge()
+        finally:
+            if fd is not None:
+                os.close(fd)
+            self.journal.close()
+
+
+# =========================
+# Command Line Interface
+# =========================
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(description="Normalize PDFs and images as they arrive in watched folders.")
+    parser.add_argument("folders", nargs="+", help="Folders to watch.")
+    parser.add_argument("-o", "--output-dir", required=True)
+    parser.add_argument("--steps", nargs="+", choices=STEPS, default=["normalize"],
+                        help="Pipeline steps, run in order (default: normalize).")
+    parser.add_argument("--size", type=parse_page_size, default=A4_SIZE, help="Page size for resize, e.g. 595x842.")
+    parser.add_argument("--top", type=float, default=190, help="Points trimmed from the top by trim.")
+    parser.add_argument("--bottom", type=float, default=190, help="Points trimmed from the bottom by trim.")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel jobs (default: CPU count).")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="Seconds a file must stay unchanged before it is processed.")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--journal", help=f"Journal file (default: <output-dir>/{JOURNAL_NAME}).")
+    parser.add_argument("--merge", help="Also keep one merged PDF of every output, in arrival order.")
+    parser.add_argument("--retry-delay", type=float, default=30.0,
+                        help="Seconds before a failed file is tried again; doubles on each failure, up to an hour.")
+    parser.add_argument("--once", action="store_true", help="Process the files present now and exit.")
+    return parser
+
+
+def main(argv=None):
+    import signal
+    args = build_parser().parse_args(argv)
+
+    def report(result):
+        if result.ok:
+            print(result.output_file, flush=True)
+        else:
+            print(f"Error: {result.input_file}: {result.error}", file=sys.stderr, flush=True)
+
+    try:
+        watcher = FolderWatcher(args.folders, args.output_dir, args.steps, args.journal, args.workers,
+                                args.settle, args.poll_interval, args.size, args.top, args.bottom,
+                                args.merge, report, args.retry_delay)
+    except PdfEngineError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    watcher.run(stop, once=args.once)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())